@@ -90,19 +90,22 @@ def plot_top_5_agent_wealth(wealth_log_df):
     plt.tight_layout()
     plt.show()
 
-def plot_evolving_strategy_transitions(log_path="/Users/dinakarmurthy/Desktop/Job Work/Projects/Stock_Market_Sim_ABM/strategy_switch_log.csv"):
+def plot_evolving_strategy_transitions(switch_log="strategy_switch_log.csv"):
     """
     Visualizes strategy transitions of evolving agents over time.
+    `switch_log` is a DataFrame (e.g. from modules.output.read_table) or a CSV path.
     """
     import pandas as pd
     import matplotlib.pyplot as plt
     import seaborn as sns
 
-    if not os.path.exists(log_path):
+    if isinstance(switch_log, pd.DataFrame):
+        df = switch_log
+    elif switch_log is None or not os.path.exists(switch_log):
         print("⚠️ Strategy switch log not found.")
         return
-
-    df = pd.read_csv(log_path)
+    else:
+        df = pd.read_csv(switch_log)
     if df.empty:
         print("⚠️ No data in strategy switch log.")
         return
@@ -110,7 +113,7 @@ def plot_evolving_strategy_transitions(log_path="/Users/dinakarmurthy/Desktop/Jo
     plt.figure(figsize=(14, 6))
     for agent_id in df['agent_id'].unique():
         agent_df = df[df['agent_id'] == agent_id].sort_values("day")
-        plt.plot(agent_df["day"], agent_df["to"], marker="o", label=f"Agent {agent_id}")
+        plt.plot(agent_df["day"], agent_df["to"].astype(str), marker="o", label=f"Agent {agent_id}")
 
     plt.title("🧬 Strategy Transitions Over Time (Evolving Agents)")
     plt.xlabel("Day")
@@ -0,0 +1,112 @@
+# Column-oriented encodings for the ingest and query endpoints
+#
+# Column JSON:  {"columns": {"day": [0, 0, ...], "stock": ["AAPL", ...], ...}}
+# Arrow IPC:    body is an Arrow IPC stream (content type ARROW_STREAM)
+# NDJSON:       one JSON row per line, streamed in chunks
+
+import io
+import json
+import numpy as np
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+
+WEALTH_SCHEMA = {
+    'agent_id': np.int64,
+    'strategy': str,
+    'day': np.int64,
+    'cash': np.float64,
+    'wealth': np.float64,
+    'is_market_maker': np.bool_
+}
+
+SENTIMENT_SCHEMA = {
+    'day': np.int64,
+    'minute': np.int64,
+    'stock': str,
+    'sentiment': np.float64
+}
+
+class ColumnarError(ValueError):
+    pass
+
+def validate_columns(columns, schema):
+    '''
+    Checks a whole batch at once: every schema column must be present, all
+    columns must have the same length, and each schema column must cast to
+    its dtype. Extra columns (e.g. per-stock holdings) are kept as-is.
+    '''
+    missing = [name for name in schema if name not in columns]
+    if missing:
+        raise ColumnarError(f"Missing columns: {missing}")
+
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ColumnarError("Columns have different lengths")
+
+    validated = {}
+    for name, values in columns.items():
+        dtype = schema.get(name)
+        try:
+            if dtype is str:
+                array = np.asarray(values, dtype = object)
+                if not all(isinstance(v, str) for v in array):
+                    raise TypeError
+            elif dtype is not None:
+                array = np.asarray(values).astype(dtype, casting = 'same_kind')
+            else:
+                array = np.asarray(values)
+        except (TypeError, ValueError):
+            raise ColumnarError(f"Column '{name}' has the wrong type")
+        validated[name] = array
+    return validated
+
+def columns_from_json(payload, schema):
+    if not isinstance(payload, dict) or not isinstance(payload.get('columns'), dict):
+        raise ColumnarError("Expected {'columns': {name: [values]}}")
+    return validate_columns(payload['columns'], schema)
+
+def columns_from_arrow(body, schema):
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ColumnarError("Arrow payloads require pyarrow on the server") from e
+    table = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+    return validate_columns({name: table.column(name).to_numpy(zero_copy_only = False)
+                             for name in table.column_names}, schema)
+
+def columns_to_rows(columns):
+    names = list(columns)
+    values = [columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def rows_to_columns(rows):
+    if not rows:
+        return {}
+    return {name: [row.get(name) for row in rows] for name in rows[0]}
+
+def iter_ndjson(rows, chunk_size = 10_000):
+    for start in range(0, len(rows), chunk_size):
+        yield "".join(json.dumps(row) + "\n" for row in rows[start:start + chunk_size])
+
+def iter_arrow(rows, chunk_size = 50_000):
+    '''
+    Arrow IPC stream written one record batch per chunk, each built from its
+    slice of `rows` as it is sent; every batch uses the first one's schema.
+    '''
+    import pyarrow as pa
+    sink = io.BytesIO()
+    schema = writer = None
+    for start in range(0, len(rows), chunk_size):
+        batch = pa.RecordBatch.from_pylist(rows[start:start + chunk_size], schema = schema)
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.schema([]))
+    writer.close()
+    yield sink.getvalue()
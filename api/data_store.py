@@ -1,26 +1,159 @@
+import bisect
+import heapq
+from itertools import islice
+
 class DataStore:
+    '''
+    Rows are keyed so the simulator can push only what changed since its last
+    update: a row whose key is already stored replaces the old one instead of
+    being appended again.
+    - ohlc: (stock, day)
+    - wealth: (agent_id, day), also indexed by day and (strategy, day)
+    - sentiment: (day, minute, stock), also indexed by day and (stock, day)
+    Queries walk these indexes, so their cost scales with the size of the
+    result rather than with the whole history.
+    '''
     def __init__(self):
         self.ohlc_data = {}         # key: stock symbol → list of dicts
         self.wealth_data = []       # list of dicts
         self.sentiment_data = []    # list of dicts
 
+        # key → position in the matching list
+        self.ohlc_index = {}
+        self.wealth_index = {}
+        self.sentiment_index = {}
+
+        # Secondary indexes: key → positions, plus the sorted days seen so far
+        self.ohlc_days = {}
+        self.wealth_by_day = {}
+        self.wealth_by_agent = {}
+        self.wealth_by_strategy_day = {}
+        self.wealth_days = []
+        self.sentiment_by_day = {}
+        self.sentiment_by_stock_day = {}
+        self.sentiment_days = []
+
+        # Cached aggregates, dropped when their day is updated
+        self.top_wealth_cache = {}
+
+    @staticmethod
+    def _upsert(rows, index, key, entry):
+        '''Returns (position, replaced row or None).'''
+        pos = index.get(key)
+        if pos is None:
+            index[key] = len(rows)
+            rows.append(entry)
+            return index[key], None
+        old = rows[pos]
+        rows[pos] = entry
+        return pos, old
+
+    @staticmethod
+    def _add_day(days, day):
+        i = bisect.bisect_left(days, day)
+        if i == len(days) or days[i] != day:
+            days.insert(i, day)
+
+    @staticmethod
+    def _days_in_range(days, day_from, day_to):
+        lo = 0 if day_from is None else bisect.bisect_left(days, day_from)
+        hi = len(days) if day_to is None else bisect.bisect_right(days, day_to)
+        return days[lo:hi]
+
+    @staticmethod
+    def _page(rows, limit, offset):
+        return list(islice(rows, offset, None if limit is None else offset + limit))
+
     def update_ohlc(self, new_ohlc):
         for stock, entries in new_ohlc.items():
             if stock not in self.ohlc_data:
                 self.ohlc_data[stock] = []
-            self.ohlc_data[stock].extend(entries)
+                self.ohlc_index[stock] = {}
+                self.ohlc_days[stock] = []
+            rows, index = self.ohlc_data[stock], self.ohlc_index[stock]
+            for entry in entries:
+                self._upsert(rows, index, entry['day'], entry)
+                self._add_day(self.ohlc_days[stock], entry['day'])
 
     def update_wealth(self, entries):
-        self.wealth_data.extend(entries)
+        for entry in entries:
+            day = entry['day']
+            pos, old = self._upsert(self.wealth_data, self.wealth_index,
+                                    (entry['agent_id'], day), entry)
+            if old is None:
+                self.wealth_by_day.setdefault(day, []).append(pos)
+                self.wealth_by_agent.setdefault(entry['agent_id'], {})[day] = pos
+                self.wealth_by_strategy_day.setdefault((entry['strategy'], day), []).append(pos)
+                self._add_day(self.wealth_days, day)
+            elif old['strategy'] != entry['strategy']:
+                self.wealth_by_strategy_day[(old['strategy'], day)].remove(pos)
+                self.wealth_by_strategy_day.setdefault((entry['strategy'], day), []).append(pos)
+            self.top_wealth_cache.pop(day, None)
 
     def update_sentiment(self, entries):
-        self.sentiment_data.extend(entries)
+        for entry in entries:
+            day = entry['day']
+            pos, old = self._upsert(self.sentiment_data, self.sentiment_index,
+                                    (day, entry['minute'], entry['stock']), entry)
+            if old is None:
+                self.sentiment_by_day.setdefault(day, []).append(pos)
+                self.sentiment_by_stock_day.setdefault((entry['stock'], day), []).append(pos)
+                self._add_day(self.sentiment_days, day)
+
+    def get_ohlc(self, stock = None, day_from = None, day_to = None):
+        stocks = [stock] if stock is not None else list(self.ohlc_data)
+        result = {}
+        for s in stocks:
+            if s not in self.ohlc_data:
+                continue
+            rows, index = self.ohlc_data[s], self.ohlc_index[s]
+            result[s] = [rows[index[d]] for d in self._days_in_range(self.ohlc_days[s], day_from, day_to)]
+        return result
+
+    def get_wealth(self, agent_id = None, strategy = None, day_from = None, day_to = None,
+                   limit = None, offset = 0):
+        days = self._days_in_range(self.wealth_days, day_from, day_to)
+        rows = self.wealth_data
+
+        if agent_id is not None:
+            by_day = self.wealth_by_agent.get(agent_id, {})
+            matches = (rows[by_day[d]] for d in days if d in by_day)
+            if strategy is not None:
+                matches = (r for r in matches if r['strategy'] == strategy)
+        elif strategy is not None:
+            matches = (rows[pos] for d in days
+                       for pos in self.wealth_by_strategy_day.get((strategy, d), []))
+        else:
+            matches = (rows[pos] for d in days for pos in self.wealth_by_day.get(d, []))
+        return self._page(matches, limit, offset)
+
+    def get_sentiment(self, stock = None, day_from = None, day_to = None, limit = None, offset = 0):
+        days = self._days_in_range(self.sentiment_days, day_from, day_to)
+        rows = self.sentiment_data
+
+        if stock is not None:
+            matches = (rows[pos] for d in days
+                       for pos in self.sentiment_by_stock_day.get((stock, d), []))
+        else:
+            matches = (rows[pos] for d in days for pos in self.sentiment_by_day.get(d, []))
+        return self._page(matches, limit, offset)
 
-    def get_ohlc(self):
-        return self.ohlc_data
+    def latest_wealth_day(self):
+        return self.wealth_days[-1] if self.wealth_days else None
 
-    def get_wealth(self):
-        return self.wealth_data
+    def top_wealth(self, day = None, n = 5, exclude_market_maker = True):
+        '''Top-n agents by wealth on `day` (default: latest day), cached per day.'''
+        if day is None:
+            day = self.latest_wealth_day()
+        if day is None:
+            return []
 
-    def get_sentiment(self):
-        return self.sentiment_data
\ No newline at end of file
+        key = (n, exclude_market_maker)
+        cached = self.top_wealth_cache.get(day, {})
+        if key not in cached:
+            rows = (self.wealth_data[pos] for pos in self.wealth_by_day.get(day, []))
+            if exclude_market_maker:
+                rows = (r for r in rows if not r['is_market_maker'])
+            cached[key] = heapq.nlargest(n, rows, key = lambda r: r['wealth'])
+            self.top_wealth_cache[day] = cached
+        return cached[key]
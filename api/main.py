@@ -1,10 +1,42 @@
-from fastapi import FastAPI, Body
+import gzip
+import json
+import zlib
+from fastapi import FastAPI, Body, Query, Request, HTTPException
+from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import RootModel, BaseModel
-from typing import Dict, List
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import RootModel, BaseModel, TypeAdapter, ValidationError
+from typing import Dict, List, Optional
 from api.data_store import DataStore
+from api.columnar import (
+    ARROW_STREAM, NDJSON, WEALTH_SCHEMA, SENTIMENT_SCHEMA, ColumnarError,
+    columns_from_json, columns_from_arrow, columns_to_rows, rows_to_columns,
+    iter_ndjson, iter_arrow
+)
+
+class GzipRequest(Request):
+    '''Request whose body is gunzipped when it was sent with Content-Encoding: gzip.'''
+    async def body(self):
+        if not hasattr(self, '_body'):
+            body = await super().body()
+            if 'gzip' in self.headers.get('content-encoding', '').lower():
+                try:
+                    body = gzip.decompress(body)
+                except (OSError, EOFError, zlib.error):
+                    raise HTTPException(status_code = 400, detail = "Body is not valid gzip")
+            self._body = body
+        return self._body
+
+class GzipRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        async def gzip_handler(request: Request):
+            return await handler(GzipRequest(request.scope, request.receive))
+        return gzip_handler
 
 app = FastAPI()
+#The simulation gzips large update bodies (modules/publisher.py)
+app.router.route_class = GzipRoute
 store = DataStore()
 
 app.add_middleware(
@@ -22,6 +54,9 @@ class OHLCEntry(BaseModel):
     low: float
     close: float
     volume: int
+    #Sent by the simulation since bars are built per fill; optional for older payloads
+    vwap: Optional[float] = None
+    trades: Optional[int] = None
 
 class OHLCUpdate(RootModel[Dict[str, List[OHLCEntry]]]):
     pass
@@ -43,35 +78,97 @@ class SentimentEntry(BaseModel):
     stock: str
     sentiment: float
 
+async def read_rows(request, entry_model, schema):
+    '''
+    Decodes an ingest body into row dicts. Arrow IPC streams and
+    {"columns": {...}} bodies are validated once per batch; a plain JSON list
+    is still validated row by row against `entry_model`.
+    '''
+    body = await request.body()
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    try:
+        if content_type == ARROW_STREAM:
+            return columns_to_rows(columns_from_arrow(body, schema))
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            return columns_to_rows(columns_from_json(payload, schema))
+        entries = TypeAdapter(List[entry_model]).validate_python(payload)
+        return [entry.model_dump() for entry in entries]
+    except json.JSONDecodeError:
+        raise HTTPException(status_code = 400, detail = "Body is not valid JSON")
+    except ColumnarError as e:
+        raise HTTPException(status_code = 422, detail = str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code = 422, detail = e.errors(include_url = False))
+
+def respond(rows, format):
+    if format == 'columns':
+        return JSONResponse({'columns': rows_to_columns(rows)})
+    if format == 'ndjson':
+        return StreamingResponse(iter_ndjson(rows), media_type = NDJSON)
+    if format == 'arrow':
+        return StreamingResponse(iter_arrow(rows), media_type = ARROW_STREAM)
+    return JSONResponse(rows)
+
 # POST Endpoints
+# /update/wealth and /update/sentiment accept a JSON list of rows, column JSON
+# ({"columns": {...}}) or an Arrow IPC stream (Content-Type: ARROW_STREAM).
 
 @app.post('/update/ohlc')
 def update_ohlc(data: OHLCUpdate):
-    store.update_ohlc(data.root)
+    entries = {stock: [entry.model_dump(exclude_none = True) for entry in rows] for stock, rows in data.root.items()}
+    store.update_ohlc(entries)
     return {"status": "ok"}
 
 @app.post('/update/wealth')
-def update_wealth(data: List[WealthEntry]):
-    entries = [entry.model_dump() for entry in data]
+async def update_wealth(request: Request):
+    entries = await read_rows(request, WealthEntry, WEALTH_SCHEMA)
     store.update_wealth(entries)
     return {"status": "ok"}
 
 @app.post('/update/sentiment')
-def update_sentiment(data: List[SentimentEntry]):
-    entries = [entry.model_dump() for entry in data]
+async def update_sentiment(request: Request):
+    entries = await read_rows(request, SentimentEntry, SENTIMENT_SCHEMA)
     store.update_sentiment(entries)
     return {"status": "ok"}
 
 # GET Endpoints
+# Every filter is optional; without any the full history is returned.
+# `format` picks the encoding of the large GETs: json (default), columns,
+# ndjson (streamed) or arrow (streamed Arrow IPC).
+
+FORMAT = Query('json', pattern = '^(json|columns|ndjson|arrow)$')
 
 @app.get('/data/ohlc')
-def get_ohlc():
-    return store.get_ohlc()
+def get_ohlc(stock: Optional[str] = None,
+             day_from: Optional[int] = None,
+             day_to: Optional[int] = None):
+    return store.get_ohlc(stock = stock, day_from = day_from, day_to = day_to)
 
 @app.get('/data/wealth')
-def get_wealth():
-    return store.get_wealth()
+def get_wealth(agent_id: Optional[int] = None,
+               strategy: Optional[str] = None,
+               day_from: Optional[int] = None,
+               day_to: Optional[int] = None,
+               limit: Optional[int] = Query(None, ge = 1),
+               offset: int = Query(0, ge = 0),
+               format: str = FORMAT):
+    return respond(store.get_wealth(agent_id = agent_id, strategy = strategy,
+                                    day_from = day_from, day_to = day_to,
+                                    limit = limit, offset = offset), format)
+
+@app.get('/data/wealth/top')
+def get_top_wealth(day: Optional[int] = None,
+                   n: int = Query(5, ge = 1),
+                   exclude_market_maker: bool = True):
+    return store.top_wealth(day = day, n = n, exclude_market_maker = exclude_market_maker)
 
 @app.get('/data/sentiment')
-def get_sentiment():
-    return store.get_sentiment()
+def get_sentiment(stock: Optional[str] = None,
+                  day_from: Optional[int] = None,
+                  day_to: Optional[int] = None,
+                  limit: Optional[int] = Query(None, ge = 1),
+                  offset: int = Query(0, ge = 0),
+                  format: str = FORMAT):
+    return respond(store.get_sentiment(stock = stock, day_from = day_from, day_to = day_to,
+                                       limit = limit, offset = offset), format)
@@ -0,0 +1 @@
+# Scaling benchmarks for the simulation core (run with `python -m benchmarks`)
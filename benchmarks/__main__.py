@@ -0,0 +1,36 @@
+from benchmarks.harness import build_cases, run_benchmarks, environment, compare
+import argparse
+import json
+import os
+import yaml
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the simulation core over a grid of sizes")
+    parser.add_argument("--config", default = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yml"))
+    parser.add_argument("--agents", type = int, nargs = "+", default = [1_000, 10_000, 100_000])
+    parser.add_argument("--symbols", type = int, nargs = "+", default = [4, 16])
+    parser.add_argument("--minutes", type = int, nargs = "+", default = [60])
+    parser.add_argument("--days", type = int, default = 2)
+    parser.add_argument("--output", default = None, help = "Result JSON (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", default = None, help = "Earlier result JSON to compare throughput against")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        base_config = yaml.safe_load(f)
+
+    env = environment()
+    results = run_benchmarks(build_cases(args.agents, args.symbols, args.minutes, args.days), base_config)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"{env['commit'] or 'unknown'}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+    with open(output, 'w') as f:
+        json.dump({'environment': env, 'results': results}, f, indent = 2)
+    print(f"✅ Wrote benchmark results to {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Times the simulation entry points over a grid of population and market sizes
+
+import contextlib
+import copy
+import itertools
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from modules.agent_factory import create_agent
+from modules.exchange import Exchange
+from modules.news import NewsGenerator
+from modules.rng import spawn_rngs
+from modules.simulation import Simulation
+
+#Throughput metrics compared against a baseline file (higher is better)
+THROUGHPUT_KEYS = ('decisions_per_sec', 'orders_per_sec', 'trades_per_sec')
+
+class Probe:
+    '''
+    Replaces a method on one instance with a wrapper that accumulates its wall
+    time and call count. `count(*args)` adds to `items` (e.g. orders submitted).
+    '''
+    def __init__(self, owner, name, count = None):
+        self.method = getattr(owner, name)
+        self.count = count
+        self.seconds = 0.0
+        self.calls = 0
+        self.items = 0
+        setattr(owner, name, self)
+
+    def __call__(self, *args, **kwargs):
+        if self.count is not None:
+            self.items += self.count(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self.method(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+def make_config(base_config, num_agents, num_symbols, minutes_per_day, num_days):
+    '''
+    Copy of the base config resized to the case. Extra symbols reuse the
+    float/price of the configured stocks; news events on dropped symbols are
+    removed.
+    '''
+    config = copy.deepcopy(base_config)
+    stocks = config['stocks']
+    config['stocks'] = [stocks[i] if i < len(stocks) else {**stocks[i % len(stocks)], 'symbol': f"SYM{i:03d}"}
+                        for i in range(num_symbols)]
+    symbols = {s['symbol'] for s in config['stocks']}
+    news = config['news']
+    news['breaking_events'] = [e for e in news.get('breaking_events', []) if e['stock'] in symbols]
+    news['market_events'] = [e for e in news.get('market_events', []) if e.get('stock', next(iter(symbols))) in symbols]
+
+    config.update(num_agents = num_agents, minutes_per_day = minutes_per_day, num_days = num_days)
+    config['logging']['keep_trade_log'] = False
+    return config
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def run_case(case, base_config):
+    '''Builds and runs one simulation of the grid, returning its timings and throughput.'''
+    config = make_config(base_config, case['agents'], case['symbols'], case['minutes'], case['days'])
+    rngs = spawn_rngs(config.get('seed'))
+    seconds = {}
+
+    start = time.perf_counter()
+    agents = create_agent(config['num_agents'], config_override = config,
+                          rng = rngs['agents'], strategy_rng = rngs['strategies'])
+    seconds['create_agent'] = time.perf_counter() - start
+
+    news_generator = NewsGenerator(config['num_days'], config_override = config, rng = rngs['news'])
+    start = time.perf_counter()
+    for day in range(config['num_days']):
+        news_generator._generate_day(day)
+    seconds['generate_sentiment'] = time.perf_counter() - start
+
+    exchange = Exchange(stock_config = config['stocks'],
+                        transaction_cost_rate = config['transaction_cost']['rate'],
+                        keep_trade_log = False,
+                        rng = rngs['exchange'])
+
+    with tempfile.TemporaryDirectory() as output_dir, open(os.devnull, 'w') as devnull, \
+         contextlib.redirect_stdout(devnull):
+        sim = Simulation(agent = agents, exchange = exchange, news_generator = news_generator,
+                         num_days = config['num_days'], minutes_per_day = config['minutes_per_day'],
+                         api_url = None, output_dir = output_dir, rng = rngs['simulation'])
+
+        collect = Probe(sim, 'collect_orders', count = lambda active_agents, market_obs: len(active_agents))
+        submit = Probe(exchange, 'submit_orders', count = len)
+        match = Probe(exchange, 'match_all')
+        day_close = Probe(exchange, 'log_day_close')
+
+        trades = 0
+        seconds['run_day'] = 0.0
+        for day in range(config['num_days']):
+            start = time.perf_counter()
+            sim.run_day(day)
+            seconds['run_day'] += time.perf_counter() - start
+            exchange.log_day_close(day)
+            trades += len(exchange.trades)
+            exchange.reset_day()
+        exchange.close_trade_log()
+
+    seconds.update(collect_orders = collect.seconds, submit_orders = submit.seconds,
+                   match_all = match.seconds, log_day_close = day_close.seconds)
+    matching = submit.seconds + match.seconds
+    return {
+        **case,
+        'seconds': seconds,
+        'decisions': collect.items,
+        'orders': submit.items,
+        'trades': trades,
+        'decisions_per_sec': collect.items / collect.seconds if collect.seconds else None,
+        'orders_per_sec': submit.items / matching if matching else None,
+        'trades_per_sec': trades / matching if matching else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def build_cases(agents, symbols, minutes, days):
+    return [{'agents': a, 'symbols': s, 'minutes': m, 'days': days}
+            for a, s, m in itertools.product(agents, symbols, minutes)]
+
+def run_benchmarks(cases, base_config):
+    '''
+    Runs every case in a fresh worker process so peak RSS is per case, not
+    the high-water mark of the whole grid.
+    '''
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers = 1) as pool:
+            result = pool.submit(run_case, case, base_config).result()
+        print(f"agents={case['agents']:>7} symbols={case['symbols']:>3} minutes={case['minutes']:>4}  "
+              f"run_day {result['seconds']['run_day']:8.2f}s  "
+              f"{result['decisions_per_sec'] or 0:12,.0f} decisions/s  "
+              f"{result['orders_per_sec'] or 0:12,.0f} orders/s  "
+              f"peak RSS {result['peak_rss_mb']:8.1f} MB")
+        results.append(result)
+    return results
+
+def environment():
+    '''Identifies the code and machine a result file was produced on.'''
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = root,
+                                capture_output = True, text = True, check = True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd = root,
+                                    capture_output = True, text = True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec = 'seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def case_key(result):
+    return (result['agents'], result['symbols'], result['minutes'], result['days'])
+
+def compare(baseline, results):
+    '''Prints current/baseline throughput ratios for the cases both files share.'''
+    previous = {case_key(r): r for r in baseline['results']}
+    print(f"\nvs baseline {baseline['environment'].get('commit')} (ratio > 1 is faster):")
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        ratios = [f"{key} {result[key] / old[key]:.2f}x" for key in THROUGHPUT_KEYS if result[key] and old.get(key)]
+        rss = result['peak_rss_mb'] / old['peak_rss_mb']
+        print(f"agents={result['agents']:>7} symbols={result['symbols']:>3} minutes={result['minutes']:>4}  "
+              f"{'  '.join(ratios)}  peak RSS {rss:.2f}x")
@@ -30,13 +30,20 @@ def fetch_ohlc():
     
     return pd.DataFrame(records)
 
-# Fetch and Flatten Wealth Data
-def fetch_wealth():
-    response = requests.get(f"{API_URL}/data/wealth")
+# Fetch the top agents on the latest day, then only their wealth history
+def fetch_wealth(n = 5):
+    response = requests.get(f"{API_URL}/data/wealth/top", params = {"n": n})
     if response.status_code != 200:
         st.error("Failed to fetch wealth data")
-        return pd.DataFrame()
-    return pd.DataFrame(response.json())
+        return pd.DataFrame(), pd.DataFrame()
+    top_agents = pd.DataFrame(response.json())
+
+    history = []
+    for agent_id in top_agents.get("agent_id", []):
+        response = requests.get(f"{API_URL}/data/wealth", params = {"agent_id": int(agent_id)})
+        if response.status_code == 200:
+            history.extend(response.json())
+    return top_agents, pd.DataFrame(history)
 
 #Sidebar Settings
 st.sidebar.header("Options")
@@ -45,7 +52,7 @@ refresh_interval = st.sidebar.slider("Auto-refresh every N seconds", 5, 60, 10)
 
 # Initial Load
 ohlc_data = fetch_ohlc()
-wealth_data = fetch_wealth()
+top_agents, wealth_data = fetch_wealth()
 
 # Auto Refresh
 if refresh:
@@ -84,16 +91,11 @@ st.plotly_chart(fig, use_container_width = True)
 
 # Wealth Plot for Top 5 Agents
 st.subheader("💰 Top 5 Agent Wealth Over Time (Excl. Market Makers)")
-if wealth_data.empty or "is_market_maker" not in wealth_data.columns:
+if wealth_data.empty or top_agents.empty:
     st.warning("Wealth data not available.")
     st.stop()
 
-non_mm_df = wealth_data.query("is_market_maker == False")
-last_day = non_mm_df["day"].max()
-top_agents = (
-    non_mm_df[non_mm_df["day"] == last_day]
-    .nlargest(5, "wealth")[["agent_id", "strategy", "wealth"]]
-)
+non_mm_df = wealth_data
 top_ids = top_agents["agent_id"].tolist()
 
 fig2, ax = plt.subplots(figsize=(12, 5))
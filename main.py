@@ -1,45 +1,44 @@
-from modules.agent_factory import create_agent
-from modules.exchange import Exchange
-from modules.news import NewsGenerator
-from modules.simulation import Simulation
+from modules.runner import run_simulation
+from modules.output import has_table, read_table
 from analysis.visualization import plot_individual_candlestick_charts, plot_top_5_agent_wealth, plot_evolving_strategy_transitions
+import argparse
+import os
 import yaml
-import pandas as pd
+
 def main():
+    parser = argparse.ArgumentParser(description = "Run the stock market simulation")
+    parser.add_argument("--config", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yml"))
+    parser.add_argument("--output-dir", default = None, help = "Defaults to logging.output_dir in the config")
+    parser.add_argument("--profile", action = "store_true", help = "Print per-phase timings each day")
+    parser.add_argument("--resume-from", default = None, help = "Checkpoint file to continue from")
+    args = parser.parse_args()
+
     # Load configuration
-    with open('/Users/dinakarmurthy/Desktop/Job Work/Projects/Stock_Market_Sim_ABM/config.yml', 'r') as f:
+    with open(args.config, 'r') as f:
         config = yaml.safe_load(f)
-    
-    num_agents = config["num_agents"]
-    num_days = config["num_days"]
-    minutes_per_day = config["minutes_per_day"]
-    stocks = config["stocks"]
-
-    #setup
-    agents = create_agent(num_agents, config_override = config)
-    exchange = Exchange(stock_config = stocks, transaction_cost_rate = 0.0005)
-    news_generator = NewsGenerator(num_days, config_override = config)
+    if args.profile:
+        config.setdefault('profiling', {})['enabled'] = True
+    if args.resume_from:
+        config.setdefault('checkpoint', {})['resume_from'] = args.resume_from
 
-    sim = Simulation(
-        agent = agents,
-        exchange = exchange,
-        news_generator = news_generator,
-        num_days = num_days,
-        minutes_per_day = minutes_per_day
-    )
+    sim = run_simulation(config, output_dir = args.output_dir)
 
-    sim.run()
+    plot_individual_candlestick_charts(sim.exchange.daily_ohlc)
+    #Only the columns the plots use are read back
+    if has_table(sim.output_dir, "agent_wealth"):
+        df_wealth = read_table(sim.output_dir, "agent_wealth",
+                               columns = ["agent_id", "strategy", "day", "wealth", "is_market_maker"])
+        plot_top_5_agent_wealth(df_wealth)
+    elif sim.memory is not None and not sim.memory.frame("agent_wealth").empty:
+        plot_top_5_agent_wealth(sim.memory.frame("agent_wealth"))
+    else:
+        print("⚠️ No per-agent wealth log (wealth_detail: strategy or record_agent_wealth: false).")
+    if has_table(sim.output_dir, "strategy_switch_log"):
+        plot_evolving_strategy_transitions(read_table(sim.output_dir, "strategy_switch_log"))
+    else:
+        plot_evolving_strategy_transitions(None)
 
-    pd.DataFrame(sim.market_maker_trades).to_csv("market_maker_trades.csv", index = False)
-    pd.DataFrame(sim.wealth_log).to_csv("agent_wealth.csv", index = False)
-    pd.DataFrame(sim.sentiment_log).to_csv("sentiment_log.csv", index = False)
-    
-    plot_individual_candlestick_charts(exchange.daily_ohlc)
-    df_wealth = pd.read_csv("agent_wealth.csv")  # or use sim.wealth_log if still in memory
-    plot_top_5_agent_wealth(df_wealth)
-    plot_evolving_strategy_transitions()
 
-    
 
 if __name__ == "__main__":
     main()
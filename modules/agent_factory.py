@@ -1,6 +1,5 @@
 # Generates the population of agents
 
-import random
 import numpy as np
 import yaml
 
@@ -15,9 +14,13 @@ from modules.agent_strategies import (
     HFTAgent,
     EvolvingAgent
 )
+from modules.agent_state import AgentStateStore, AgentStateView
+from modules.rng import ensure_rng
+
+MARKET_MAKER_ID = 99999
 
 #Define the Agent Class
-class Agent:
+class Agent(AgentStateView):
     def __init__(self, agent_id, strategy_type, strategy, stock_list, cash = 1_000_000.00):
         self.agent_id = agent_id
         self.strategy_type = strategy_type
@@ -29,29 +32,42 @@ class Agent:
         #History
         self.history = []
 
-    def decide_action(self, market_observation):
-        return self.strategy.decide(market_observation, self)
+    def decide_action(self, market_observation, orders):
+        return self.strategy.decide(market_observation, self, orders)
     
-def create_agent(num_agents, config_path = "config.yml", config_override = None):
+def create_agent(num_agents, config_path = "config.yml", config_override = None,
+                 rng = None, strategy_rng = None, shard = None):
+    '''
+    `rng` drives population building (fill-up strategies, shuffle, initial
+    holdings); `strategy_rng` is handed to strategies that trade randomly.
+
+    `shard = (index, count)` builds one partition of the population for a
+    sharded run (modules/sharding.py): its slice of the HFT and of each
+    strategy's agents, under the ids they have in the whole population,
+    and its slice of every stock's float. The market maker is in shard 0.
+    '''
+    rng = ensure_rng(rng)
+    strategy_rng = strategy_rng if strategy_rng is not None else rng
+
     if config_override:
         config = config_override
     else:
         with open(config_path, "r") as file:
             config = yaml.safe_load(file)
 
+    index, count = shard or (0, 1)
     dist = config['agent_distribution']
     stock_list = config['stocks']
     agent_list = []
-    agent_counter = 0
     num_hft_agents = config['num_hft_agents']
 
     #Create HFT agents
-    for i in range(num_hft_agents):
+    for i in shard_slice(num_hft_agents, index, count):
         hft = HFTAgent(agent_id = 9990 + i, stock_list = stock_list, cash = 700_000)
         agent_list.append(hft)
 
     # Prevent ID overlap
-    agent_counter = 9990 + num_hft_agents
+    first_id = 9990 + num_hft_agents
 
     def assign_strategy(agent_id, strategy_type):
         if strategy_type == "momentum":
@@ -61,50 +77,95 @@ def create_agent(num_agents, config_path = "config.yml", config_override = None)
         elif strategy_type == "risk_averse":
             return Agent(agent_id, strategy_type, RiskAverseStrategy(), stock_list)
         elif strategy_type == "noise":
-            return Agent(agent_id, strategy_type, NoiseStrategy(), stock_list, cash = 500_000)
+            return Agent(agent_id, strategy_type, NoiseStrategy(rng = strategy_rng), stock_list, cash = 500_000)
         elif strategy_type == "mean_reversion":
             return Agent(agent_id, strategy_type, MeanReversionStrategy(), stock_list)
         elif strategy_type == "arbitrage":
             return Agent(agent_id, strategy_type, ArbitrageStrategy(), stock_list)
         elif strategy_type == "evolving":
-            return EvolvingAgent(agent_id, stock_list, cash = 1_000_000)
+            return EvolvingAgent(agent_id, stock_list, cash = 1_000_000, rng = strategy_rng)
         else:
             raise ValueError(f"Invalid strategy type: {strategy_type}")
         
-    #Determine counts
+    #Determine counts; `position` numbers the regular agents of the whole population
+    position = 0
     for strategy, proportion in dist.items():
-        count = int(num_agents * proportion)
-        for _ in range(count):
-            agent = assign_strategy(agent_counter, strategy)
-            agent_list.append(agent)
-            agent_counter += 1
+        strategy_count = int(num_agents * proportion)
+        for i in shard_slice(strategy_count, index, count):
+            agent_list.append(assign_strategy(agent_id_at(first_id, position + i), strategy))
+        position += strategy_count
         
-    while len(agent_list) < num_agents:
-        agent = assign_strategy(agent_counter, random.choice(list(dist.keys())))
+    strategy_names = list(dist.keys())
+    fill_up = max(num_agents - num_hft_agents - position, 0)
+    for i in shard_slice(fill_up, index, count):
+        agent = assign_strategy(agent_id_at(first_id, position + i), strategy_names[rng.integers(len(strategy_names))])
         agent_list.append(agent)
-        agent_counter += 1
     
-    mm_agent = MarketMakerAgent(agent_id = 99999, stock_list = stock_list, cash = 10_000_000, inventory = 1000)
-    agent_list.append(mm_agent)
+    if index == 0:
+        mm_agent = MarketMakerAgent(agent_id = MARKET_MAKER_ID, stock_list = stock_list, cash = 10_000_000, inventory = 1000)
+        agent_list.append(mm_agent)
 
-    random.shuffle(agent_list)
+    agent_list = [agent_list[i] for i in rng.permutation(len(agent_list))]
+
+    #Move cash/portfolio state into shared arrays
+    AgentStateStore.from_agents(agent_list, [s['symbol'] for s in stock_list])
 
     #Distribute stock floats
-    distribute_initial_holdings(agent_list, stock_list)
+    if count > 1:
+        stock_list = [dict(stock, float = len(shard_slice(int(stock['float']), index, count))) for stock in stock_list]
+    distribute_initial_holdings(agent_list, stock_list, rng = rng)
 
     return agent_list
 
-def distribute_initial_holdings(agents, stock_config):
+def shard_slice(n, index, count):
+    '''Positions of shard `index` when n items are split into `count` contiguous near-equal parts.'''
+    return range(index * n // count, (index + 1) * n // count)
+
+def agent_id_at(first_id, position):
+    '''
+    Id of the regular agent at `position`: ids count up from `first_id`,
+    skipping the market maker's id (reached by populations above ~90k).
+    '''
+    agent_id = first_id + position
+    return agent_id + 1 if agent_id >= MARKET_MAKER_ID else agent_id
+
+def distribute_initial_holdings(agents, stock_config, rng = None, max_passes = 20):
+    '''
+    Hands out each stock's float across the agents at its initial price.
+    Shares are drawn multinomially (every agent equally likely, as with the
+    old lot-by-lot loop) and capped at what each agent can still afford;
+    shares left over are redrawn among the agents with budget left, and a
+    final pass fills any remainder in order. Works on the shared store, so
+    the cost is a few array passes regardless of float size.
+    '''
+    rng = ensure_rng(rng)
+    store = AgentStateStore.of(agents)
+    cash = store.cash
+
     for stock in stock_config:
-        symbol = stock['symbol']
-        total_shares = stock['float']
+        col = store.symbol_index[stock['symbol']]
+        remaining = int(stock['float'])
         price = stock['initial_price']
 
-        while total_shares > 0:
-            agent = random.choice(agents)
-            qty = min(10, total_shares)
+        capacity = np.floor(cash / price).astype(np.int64)
+        if capacity.sum() < remaining:
+            raise ValueError(f"Agents cannot afford the float of {stock['symbol']}")
+
+        allocation = np.zeros(len(cash), dtype = np.int64)
+        for _ in range(max_passes):
+            if remaining == 0:
+                break
+            eligible = np.flatnonzero(capacity)
+            draw = np.minimum(rng.multinomial(remaining, np.full(len(eligible), 1 / len(eligible))),
+                              capacity[eligible])
+            allocation[eligible] += draw
+            capacity[eligible] -= draw
+            remaining -= int(draw.sum())
+
+        if remaining:
+            #Redistribution pass: fill the leftover into remaining budgets in order
+            fill = np.minimum(capacity, np.maximum(remaining - (np.cumsum(capacity) - capacity), 0))
+            allocation += fill
 
-            if agent.cash >= qty * price:
-                agent.portfolio[symbol] += qty
-                agent.cash -= qty * price
-                total_shares -= qty
+        store.holdings[:, col] += allocation
+        cash -= allocation * price
@@ -0,0 +1,151 @@
+# Columnar storage for agent cash, holdings and strategy labels
+
+from collections.abc import MutableMapping
+import numpy as np
+
+STRATEGY_NAMES = [
+    'momentum',
+    'contrarian',
+    'risk_averse',
+    'noise',
+    'mean_reversion',
+    'arbitrage',
+    'evolving',
+    'hft',
+    'market_maker'
+]
+
+class AgentStateStore:
+    '''
+    Keeps the state of every agent in a few NumPy buffers:
+    - cash: float vector (agents)
+    - holdings: int matrix (agents x symbols)
+    - strategy_codes: int vector indexing into `strategy_names`
+    Agents bound to the store read and write these arrays through
+    `AgentStateView`, so per-agent code keeps working unchanged.
+    '''
+    def __init__(self, num_agents, symbols, strategy_names = STRATEGY_NAMES):
+        self.symbols = list(symbols)
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.strategy_names = list(strategy_names)
+        self.strategy_index = {s: i for i, s in enumerate(self.strategy_names)}
+
+        self.cash = np.zeros(num_agents, dtype = np.float64)
+        self.holdings = np.zeros((num_agents, len(self.symbols)), dtype = np.int64)
+        self.strategy_codes = np.zeros(num_agents, dtype = np.int16)
+        self.agent_ids = np.zeros(num_agents, dtype = np.int64)
+        self.row_of = {}
+
+    def __len__(self):
+        return len(self.cash)
+
+    @classmethod
+    def from_agents(cls, agents, symbols = None):
+        if symbols is None:
+            symbols = list(agents[0].portfolio)
+        store = cls(len(agents), symbols)
+        for row, agent in enumerate(agents):
+            store.bind(agent, row)
+        return store
+
+    @classmethod
+    def of(cls, agents):
+        '''Returns the store the agents share, binding them to a new one if needed.'''
+        store = getattr(agents[0], '_store', None)
+        if store is not None and len(store) == len(agents) and all(a._store is store for a in agents):
+            return store
+        return cls.from_agents(agents)
+
+    def bind(self, agent, row):
+        '''Moves an agent's current cash/portfolio into row `row` of the store.'''
+        cash = agent.cash
+        portfolio = dict(agent.portfolio)
+
+        self.agent_ids[row] = agent.agent_id
+        self.strategy_codes[row] = self.strategy_index[agent.strategy_type]
+        self.row_of[agent.agent_id] = row
+
+        agent._store = self
+        agent._row = row
+        agent._portfolio_view = PortfolioView(self, row)
+        agent.cash = cash
+        agent.portfolio = portfolio
+
+    def price_vector(self, prices):
+        '''Orders a {symbol: price} dict along the store's symbol axis.'''
+        return np.array([prices[s] for s in self.symbols], dtype = np.float64)
+
+    def wealth(self, price_vector):
+        '''Mark-to-market wealth of every agent.'''
+        return self.cash + self.holdings @ price_vector
+
+class PortfolioView(MutableMapping):
+    '''{symbol: shares} mapping over one row of the holdings matrix.'''
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, symbol):
+        return int(self.store.holdings[self.row, self.store.symbol_index[symbol]])
+
+    def __setitem__(self, symbol, shares):
+        self.store.holdings[self.row, self.store.symbol_index[symbol]] = shares
+
+    def __delitem__(self, symbol):
+        raise TypeError("Symbols cannot be removed from a portfolio")
+
+    def __iter__(self):
+        return iter(self.store.symbols)
+
+    def __len__(self):
+        return len(self.store.symbols)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class AgentStateView:
+    '''
+    Mixin giving agents `cash`, `portfolio` and `strategy_type` attributes that
+    live in plain attributes until the agent is bound to an AgentStateStore.
+    '''
+    _store = None
+    _row = None
+
+    @property
+    def cash(self):
+        if self._store is None:
+            return self._cash
+        return float(self._store.cash[self._row])
+
+    @cash.setter
+    def cash(self, value):
+        if self._store is None:
+            self._cash = value
+        else:
+            self._store.cash[self._row] = value
+
+    @property
+    def portfolio(self):
+        if self._store is None:
+            return self._portfolio
+        return self._portfolio_view
+
+    @portfolio.setter
+    def portfolio(self, value):
+        if self._store is None:
+            self._portfolio = dict(value)
+        else:
+            for symbol, shares in value.items():
+                self._portfolio_view[symbol] = shares
+
+    @property
+    def strategy_type(self):
+        return self._strategy_type
+
+    @strategy_type.setter
+    def strategy_type(self, value):
+        self._strategy_type = value
+        if self._store is not None:
+            self._store.strategy_codes[self._row] = self._store.strategy_index[value]
@@ -1,20 +1,43 @@
 # Logic for momentum, contrarian, etc.
 #Order Structure
 '''
-{
-    "agent_id": agent.agent_id,
-    "type": "buy" or "sell",
-    "quantity": int,
-    "price": float,  # Limit price (or None for market order)
-}
+Strategies write orders into an OrderBuffer (see modules/orders.py) instead of
+returning dicts; each row is
+(agent_id, symbol_idx, side, quantity, price)
+with side in {SIDE_BUY, SIDE_SELL} and price NaN for a market order.
+Batch kernels (`decide_batch`) return parallel arrays instead:
+(agent_ids, symbol_idx, side, qty)
 '''
 
 import numpy as np
-import random
+
+from modules.agent_state import AgentStateView
+from modules.orders import SIDE_BUY, SIDE_SELL
+from modules.rng import ensure_rng
 
 TRADE_FRACTION = 0.1  #Fraction of cash/shares used per trade
 LOOKBACK_WINDOW = 5   #Minutes for moving average
 
+def threshold_orders(agent_ids, cash, holdings, prices, buy_mask, sell_mask):
+    '''
+    Shared kernel for the sentiment-threshold strategies. `buy_mask` and
+    `sell_mask` are boolean arrays broadcastable to (agents, symbols).
+    Buys spend TRADE_FRACTION of cash, sells unload TRADE_FRACTION of the
+    position. Returns (agent_ids, symbol_idx, side, qty) arrays in
+    agent-major, symbol-minor order, matching the per-agent `decide` loop.
+    '''
+    buy_qty = (cash[:, None] * TRADE_FRACTION // prices).astype(np.int64)
+    sell_qty = (holdings * TRADE_FRACTION).astype(np.int64)
+
+    buy_qty = np.where(buy_mask, buy_qty, 0)
+    sell_qty = np.where(sell_mask, sell_qty, 0)
+
+    rows, symbols = np.nonzero((buy_qty > 0) | (sell_qty > 0))
+    is_buy = buy_qty[rows, symbols] > 0
+    side = np.where(is_buy, SIDE_BUY, SIDE_SELL).astype(np.int8)
+    qty = np.where(is_buy, buy_qty[rows, symbols], sell_qty[rows, symbols])
+    return np.asarray(agent_ids)[rows], symbols, side, qty
+
 class MomentumStrategy:
 
     def get_params(self):
@@ -23,35 +46,27 @@ class MomentumStrategy:
     def set_params(self, params):
         pass
 
-    def decide(self, market_obs, agent):
-       decisions = []
-       prices = market_obs['prices']
-       sentiment = market_obs['sentiment']
-       
-       for stock, price in prices.items():
-           #Dummy momentum singal: sentiment boost
+    @classmethod
+    def decide_batch(cls, market_obs, agent_ids, cash, holdings, rng = None):
+        sentiment = market_obs['sentiment_vector']
+        return threshold_orders(agent_ids, cash, holdings, market_obs['price_vector'],
+                                sentiment > 0.1, sentiment < -0.1)
+
+    def decide(self, market_obs, agent, orders):
+        prices = market_obs['prices']
+        sentiment = market_obs['sentiment']
+
+        for col, (stock, price) in enumerate(prices.items()):
+            #Dummy momentum singal: sentiment boost
             if sentiment.get(stock, 0) > 0.1:
-               budget = agent.cash * TRADE_FRACTION
-               qty = int(budget // price)
-               if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'buy',
-                        'quantity': qty,
-                        'price': None
-                    })
+                budget = agent.cash * TRADE_FRACTION
+                qty = int(budget // price)
+                if qty > 0:
+                    orders.append(agent.agent_id, col, SIDE_BUY, qty)
             elif sentiment.get(stock, 0) < -0.1 and agent.portfolio[stock] > 0:
                 qty = int(agent.portfolio[stock] * TRADE_FRACTION)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'sell',
-                        'quantity': qty,
-                        'price': None
-                    })
-       return decisions
+                    orders.append(agent.agent_id, col, SIDE_SELL, qty)
         
     
 class ContrarianStrategy:
@@ -62,34 +77,26 @@ class ContrarianStrategy:
     def set_params(self, params):
         pass
 
-    def decide(self, market_obs, agent):
-        decisions = []
+    @classmethod
+    def decide_batch(cls, market_obs, agent_ids, cash, holdings, rng = None):
+        sentiment = market_obs['sentiment_vector']
+        return threshold_orders(agent_ids, cash, holdings, market_obs['price_vector'],
+                                sentiment < -0.1, sentiment > 0.1)
+
+    def decide(self, market_obs, agent, orders):
         prices = market_obs['prices']
         sentiment = market_obs['sentiment']
 
-        for stock, price in prices.items():
+        for col, (stock, price) in enumerate(prices.items()):
             if sentiment.get(stock, 0) < -0.1:
                 budget = agent.cash * TRADE_FRACTION
                 qty = int(budget // price)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'buy',
-                        'quantity': qty,
-                        'price': None
-                    })
+                    orders.append(agent.agent_id, col, SIDE_BUY, qty)
             elif sentiment.get(stock, 0) > 0.1 and agent.portfolio[stock] > 0:
                 qty = int(agent.portfolio[stock] * TRADE_FRACTION)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'sell',
-                        'quantity': qty,
-                        'price': None
-                    })
-        return decisions
+                    orders.append(agent.agent_id, col, SIDE_SELL, qty)
                  
 class RiskAverseStrategy:
 
@@ -99,35 +106,27 @@ class RiskAverseStrategy:
     def set_params(self, params):
         pass
 
-    def decide(self, market_obs, agent):
-        decisions = []
+    @classmethod
+    def decide_batch(cls, market_obs, agent_ids, cash, holdings, rng = None):
+        sentiment = market_obs['sentiment_vector']
+        return threshold_orders(agent_ids, cash, holdings, market_obs['price_vector'],
+                                sentiment > 0.2, sentiment < -0.2)
+
+    def decide(self, market_obs, agent, orders):
         prices = market_obs['prices']
         sentiment = market_obs['sentiment']
 
-        for stock, price in prices.items():
+        for col, (stock, price) in enumerate(prices.items()):
             sent = sentiment.get(stock, 0)
             if sent > 0.2:
                 budget = agent.cash * TRADE_FRACTION
                 qty = int(budget // price)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'buy',
-                        'quantity': qty,
-                        'price': None
-                    })
+                    orders.append(agent.agent_id, col, SIDE_BUY, qty)
             elif sent < -0.2 and agent.portfolio[stock] > 0:
                 qty = int(agent.portfolio[stock] * TRADE_FRACTION)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'sell',
-                        'quantity': qty,
-                        'price': None
-                    })
-        return decisions
+                    orders.append(agent.agent_id, col, SIDE_SELL, qty)
     
 class NoiseStrategy:
 
@@ -137,37 +136,35 @@ class NoiseStrategy:
     def set_params(self, params):
         pass
 
-    def decide(self, market_obs, agent):
-        decisions = []
+    def __init__(self, rng = None):
+        self.rng = ensure_rng(rng)
+
+    @classmethod
+    def decide_batch(cls, market_obs, agent_ids, cash, holdings, rng = None):
+        rng = ensure_rng(rng)
+        shape = holdings.shape
+        act = rng.random(shape) < 0.2
+        buy = rng.random(shape) < 0.5
+        return threshold_orders(agent_ids, cash, holdings, market_obs['price_vector'],
+                                act & buy, act & ~buy)
+
+    def decide(self, market_obs, agent, orders):
         prices = market_obs['prices']
         
-        for stock, price in prices.items():
-            if random.random() < 0.2:
-                action = random.choice(['buy', 'sell'])
+        for col, (stock, price) in enumerate(prices.items()):
+            if self.rng.random() < 0.2:
+                action = 'buy' if self.rng.random() < 0.5 else 'sell'
                 if action == 'buy':
                     budget = agent.cash * TRADE_FRACTION
                     qty = int(budget // price)
                     if qty > 0:
-                        decisions.append({
-                            'agent_id': agent.agent_id,
-                            'stock': stock,
-                            'type': 'buy',
-                            'quantity': qty,
-                            'price': None
-                        })
+                        orders.append(agent.agent_id, col, SIDE_BUY, qty)
                 elif action == 'sell' and agent.portfolio[stock] > 0:
                     qty = int(agent.portfolio[stock] * TRADE_FRACTION)
                     if qty > 0:
-                        decisions.append({
-                            'agent_id': agent.agent_id,
-                            'stock': stock,
-                            'type': 'sell',
-                            'quantity': qty,
-                            'price': None
-                        })
-        return decisions
+                        orders.append(agent.agent_id, col, SIDE_SELL, qty)
 
-class MarketMakerAgent:
+class MarketMakerAgent(AgentStateView):
 
     def get_params(self):
         return {'threshold': 0.1}
@@ -182,14 +179,13 @@ class MarketMakerAgent:
         self.portfolio = {stock['symbol']: inventory for stock in stock_list}
         self.history = []
     
-    def decide_action(self, market_obs):
-        decisions = []
+    def decide_action(self, market_obs, orders):
         prices = market_obs['prices']
 
         spread_pct = 0.005
         trade_qty = 25
 
-        for stock, price in prices.items():
+        for col, (stock, price) in enumerate(prices.items()):
             if price <= 0:
                 continue
 
@@ -197,23 +193,10 @@ class MarketMakerAgent:
             bid_price = price * (1 - spread_pct)
 
             if self.portfolio[stock] >= trade_qty:
-                decisions.append({
-                    'agent_id': self.agent_id,
-                    'stock': stock,
-                    'type': 'sell',
-                    'quantity': trade_qty,
-                    'price': ask_price
-                })
+                orders.append(self.agent_id, col, SIDE_SELL, trade_qty, ask_price)
             
             if self.cash >= bid_price * trade_qty:
-                decisions.append({
-                    'agent_id': self.agent_id,
-                    'stock': stock,
-                    'type': 'buy',
-                    'quantity': trade_qty,
-                    'price': bid_price
-                })
-        return decisions
+                orders.append(self.agent_id, col, SIDE_BUY, trade_qty, bid_price)
 
 class MeanReversionStrategy:
 
@@ -228,42 +211,27 @@ class MeanReversionStrategy:
         self.trade_fraction = trade_fraction
         self.threshold = threshold
     
-    def decide(self, market_obs, agent):
-        decisions = []
+    def decide(self, market_obs, agent, orders):
         prices = market_obs['prices']
-        price_history = market_obs.get('price_history', {})
+        history = market_obs.get('price_history')
+        if history is None or len(history) < self.lookback:
+            return
+        indicators = market_obs['indicators']
 
-        for stock, price in prices.items():
-            history = price_history.get(stock, [])
-            if len(history) < self.lookback:
-                continue
-
-            avg_price = sum(history[-self.lookback:]) / self.lookback
+        for col, (stock, price) in enumerate(prices.items()):
+            avg_price = indicators.get('mean', col, self.lookback)
             deviation = (price - avg_price) / avg_price
 
             if deviation < -self.threshold:
                 budget = agent.cash * self.trade_fraction
                 qty = int(budget // price)
                 if qty > 0:
-                    decisions.append({
-                        'agent_id': agent.agent_id,
-                        'stock': stock,
-                        'type': 'buy',
-                        'quantity': qty,
-                        'price': None
-                    })
+                    orders.append(agent.agent_id, col, SIDE_BUY, qty)
             
             elif deviation > self.threshold and agent.portfolio[stock] > 0:
                 qty = int(agent.portfolio[stock] * self.trade_fraction)
                 if qty > 0:
-                    decisions.append({
-                        "agent_id": agent.agent_id,
-                        "stock": stock,
-                        "type": "sell",
-                        "quantity": qty,
-                        "price": None
-                    })
-        return decisions
+                    orders.append(agent.agent_id, col, SIDE_SELL, qty)
 
 class ArbitrageStrategy:
 
@@ -280,65 +248,34 @@ class ArbitrageStrategy:
         self.threshold = threshold
         self.trade_fraction = trade_fraction
     
-    def decide(self, market_obs, agent):
-        decisions = []
+    def decide(self, market_obs, agent, orders):
         prices = market_obs['prices']
-        price_history = market_obs.get('price_history', {})
+        history = market_obs.get('price_history')
+        symbol_index = market_obs['symbol_index']
 
         price_a = prices.get(self.stock_a)
         price_b = prices.get(self.stock_b)
 
-        hist_a = price_history.get(self.stock_a, [])
-        hist_b = price_history.get(self.stock_b, [])
-
-        if not price_a or not price_b or len(hist_a) < self.lookback or len(hist_b) < self.lookback:
-            return decisions
+        if not price_a or not price_b or history is None or len(history) < self.lookback:
+            return
         
-        ratio_series = [a / b for a, b in zip(hist_a[-self.lookback:], hist_b[-self.lookback:]) if b != 0]
-        if not ratio_series:
-            return decisions
-        
-        avg_ratio = sum(ratio_series) / len(ratio_series)
+        avg_ratio = market_obs['indicators'].get('ratio_mean', (symbol_index[self.stock_a], symbol_index[self.stock_b]),
+                                                 self.lookback)
         current_ratio = price_a / price_b
         deviation = (current_ratio - avg_ratio) / avg_ratio
 
         qty = int((agent.cash * self.trade_fraction) // min(price_a, price_b))
         if qty <= 0:
-            return decisions
+            return
         
         if deviation > self.threshold and agent.portfolio.get(self.stock_a, 0) >= qty:
-            decisions.append({
-                'agent_id': agent.agent_id,
-                'stock': self.stock_a,
-                'type': 'sell',
-                'quantity': qty,
-                'price': None
-            })
-            decisions.append({
-                'agent_id': agent.agent_id,
-                'stock': self.stock_b,
-                'type': 'buy',
-                'quantity': qty,
-                'price': None
-            })
+            orders.append(agent.agent_id, symbol_index[self.stock_a], SIDE_SELL, qty)
+            orders.append(agent.agent_id, symbol_index[self.stock_b], SIDE_BUY, qty)
         elif deviation < -self.threshold and agent.portfolio.get(self.stock_b, 0) >= qty:
-            decisions.append({
-                'agent_id': agent.agent_id,
-                'stock': self.stock_b,
-                'type': 'sell',
-                'quantity': qty,
-                'price': None
-            })
-            decisions.append({
-                'agent_id': agent.agent_id,
-                'stock': self.stock_a,
-                'type': 'buy',
-                'quantity': qty,
-                'price': None
-            })
-        return decisions
-
-class HFTAgent:
+            orders.append(agent.agent_id, symbol_index[self.stock_b], SIDE_SELL, qty)
+            orders.append(agent.agent_id, symbol_index[self.stock_a], SIDE_BUY, qty)
+
+class HFTAgent(AgentStateView):
 
     def get_params(self):
         return {'threshold': 0.1}
@@ -353,13 +290,12 @@ class HFTAgent:
         self.portfolio = {s['symbol']: inventory_per_stock for s in stock_list}
         self.history = []
 
-    def decide_action(self, market_obs):
-        decisions = []
+    def decide_action(self, market_obs, orders):
         prices = market_obs['prices']
         spread_pct = 0.001
         trade_size = 20
 
-        for stock, price in prices.items():
+        for col, (stock, price) in enumerate(prices.items()):
             if price <= 0:
                 continue
 
@@ -367,25 +303,12 @@ class HFTAgent:
             bid_price = price * (1 - spread_pct)
 
             if self.portfolio.get(stock, 0) >= trade_size:
-                decisions.append({
-                    'agent_id': self.agent_id,
-                    'stock': stock,
-                    'type': 'sell',
-                    'quantity': trade_size,
-                    'price': ask_price
-                })
+                orders.append(self.agent_id, col, SIDE_SELL, trade_size, ask_price)
             
             if self.cash >= bid_price * trade_size:
-                decisions.append({
-                    'agent_id': self.agent_id,
-                    'stock': stock,
-                    'type': 'buy',
-                    'quantity': trade_size,
-                    'price': bid_price
-                })
-        return decisions
+                orders.append(self.agent_id, col, SIDE_BUY, trade_size, bid_price)
 
-class EvolvingAgent:
+class EvolvingAgent(AgentStateView):
 
     def get_params(self):
         return {'threshold': 0.1}
@@ -393,9 +316,10 @@ class EvolvingAgent:
     def set_params(self, params):
         pass
 
-    def __init__(self, agent_id, stock_list, initial_strategy = 'momentum', cash = 500_000):
+    def __init__(self, agent_id, stock_list, initial_strategy = 'momentum', cash = 500_000, rng = None):
         self.agent_id = agent_id
         self.stock_list = stock_list
+        self.rng = ensure_rng(rng)
         self.cash = cash
         self.portfolio = {s['symbol']: 0 for s in stock_list}
         self.strategy_type = 'evolving'
@@ -419,7 +343,7 @@ class EvolvingAgent:
         elif name == "arbitrage":
             strat = ArbitrageStrategy()
         elif name == "noise":
-            strat = NoiseStrategy()
+            strat = NoiseStrategy(rng = self.rng)
         elif name == "risk_averse":
             strat = RiskAverseStrategy()
         else:
@@ -454,7 +378,7 @@ class EvolvingAgent:
             mutated_params = {}
             for k, v in genome['params'].items():
                 if isinstance(v, (float, int)):
-                    mutated_params[k] = v + np.random.nomral(0, 0.1 * abs(v + 1e-6))
+                    mutated_params[k] = v + self.rng.normal(0, 0.1 * abs(v + 1e-6))
                 else:
                     mutated_params[k] = v
             mutated['params'] = mutated_params
@@ -471,14 +395,14 @@ class EvolvingAgent:
         self.cash = 700_000
         self.portfolio = {s: 0 for s in self.portfolio}
 
-        self.evolution_lop.append({
+        self.evolution_log.append({
             'from': parent.agent_id,
             'strategy': self.strategy_name,
             'day': len(self.performance_history)
         })
 
-    def decide_action(self, market_obs):
-        return self.strategy.decide(market_obs, self)
+    def decide_action(self, market_obs, orders):
+        return self.strategy.decide(market_obs, self, orders)
     
     def update_performance(self, wealth, day_idx):
         self.performance_history.append({'day': day_idx, 'wealth': wealth})
@@ -502,7 +426,7 @@ class EvolvingAgent:
 
         current = self.strategy_name
         candidates.remove(current)
-        new_strategy = random.choice(candidates)
+        new_strategy = candidates[self.rng.integers(len(candidates))]
 
         self.strategy_name = new_strategy
         self.strategy_type = 'evolving'
@@ -0,0 +1,160 @@
+# Open/high/low/close/volume bars kept up to date as trades happen
+
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'vwap', 'trades')
+
+class _Bars:
+    '''Preallocated bars x symbols arrays of one interval.'''
+    def __init__(self, num_bars, num_symbols):
+        shape = (num_bars, num_symbols)
+        self.open = np.zeros(shape)
+        self.high = np.zeros(shape)
+        self.low = np.zeros(shape)
+        self.close = np.zeros(shape)
+        self.volume = np.zeros(shape, dtype = np.int64)
+        self.notional = np.zeros(shape)
+        self.trades = np.zeros(shape, dtype = np.int64)
+
+    def __len__(self):
+        return len(self.open)
+
+    def fields(self):
+        return (self.open, self.high, self.low, self.close, self.volume, self.notional, self.trades)
+
+    def grow(self):
+        for name, values in vars(self).items():
+            setattr(self, name, np.concatenate((values, np.zeros_like(values))))
+
+    def clear(self):
+        for values in self.fields():
+            values.fill(0)
+
+    def merge(self, b, traded, o, h, l, c, v, n, t, reference):
+        '''Folds one minute into bar `b` (a row index, or Ellipsis for a 1-D day bar).'''
+        first = traded & (self.trades[b] == 0)
+        self.open[b] = np.where(first, o, self.open[b])
+        self.high[b] = np.where(first, h, np.where(traded, np.maximum(self.high[b], h), self.high[b]))
+        self.low[b] = np.where(first, l, np.where(traded, np.minimum(self.low[b], l), self.low[b]))
+        self.close[b] = np.where(traded, c, self.close[b])
+        self.volume[b] += v
+        self.notional[b] += n
+        self.trades[b] += t
+
+        #A bar without trades so far is flat at the latest reference price
+        flat = self.trades[b] == 0
+        for values in (self.open, self.high, self.low, self.close):
+            values[b] = np.where(flat, reference, values[b])
+
+class BarBuilder:
+    '''
+    OHLCV bars for several intervals (in minutes) at once, plus the day bar.
+    - `add_fill` updates the open minute with plain per-symbol lists, O(1)
+    - `close_minute` folds that minute into the current bar of every
+      interval and into the day bar, one vector operation per field
+    - `reset_day` starts a new day; the arrays are reused
+    Bars are preallocated for `minutes_per_day` and grow if a day runs
+    longer. A bar without trades is flat at the reference price its last
+    minute closed at, with zero volume; VWAP is then that price.
+    '''
+    def __init__(self, num_symbols, intervals = (1, 5), minutes_per_day = 390):
+        if any(interval < 1 for interval in intervals):
+            raise ValueError("Bar intervals must be at least one minute")
+        self.num_symbols = num_symbols
+        self.intervals = tuple(sorted(set(int(i) for i in intervals)))
+        self.bars = {i: _Bars(-(-minutes_per_day // i), num_symbols) for i in self.intervals}
+        self.day = _Bars(1, num_symbols)
+        self.minute = 0
+        self._open_minute()
+
+    def _open_minute(self):
+        n = self.num_symbols
+        self.m_open = [0.0] * n
+        self.m_high = [0.0] * n
+        self.m_low = [0.0] * n
+        self.m_close = [0.0] * n
+        self.m_volume = [0] * n
+        self.m_notional = [0.0] * n
+        self.m_trades = [0] * n
+
+    def add_fill(self, col, price, qty):
+        if self.m_trades[col] == 0:
+            self.m_open[col] = self.m_high[col] = self.m_low[col] = price
+        elif price > self.m_high[col]:
+            self.m_high[col] = price
+        elif price < self.m_low[col]:
+            self.m_low[col] = price
+        self.m_close[col] = price
+        self.m_volume[col] += qty
+        self.m_notional[col] += price * qty
+        self.m_trades[col] += 1
+
+    def close_minute(self, reference):
+        '''Closes the open minute; `reference` holds each symbol's price at its close.'''
+        t = np.array(self.m_trades, dtype = np.int64)
+        minute = (np.array(self.m_open), np.array(self.m_high), np.array(self.m_low), np.array(self.m_close),
+                  np.array(self.m_volume, dtype = np.int64), np.array(self.m_notional), t)
+        traded = t > 0
+        reference = np.asarray(reference, dtype = np.float64)
+
+        for interval, bars in self.bars.items():
+            b = self.minute // interval
+            while b >= len(bars):
+                bars.grow()
+            bars.merge(b, traded, *minute, reference)
+        self.day.merge(0, traded, *minute, reference)
+
+        self.minute += 1
+        self._open_minute()
+
+    def reset_day(self):
+        for bars in self.bars.values():
+            bars.clear()
+        self.day.clear()
+        self.minute = 0
+        self._open_minute()
+
+    def day_bar(self, col):
+        '''The day so far for one symbol, as a dict of BAR_COLUMNS.'''
+        return self._row(self.day, 0, col)
+
+    def _row(self, bars, b, col):
+        volume = int(bars.volume[b, col])
+        close = float(bars.close[b, col])
+        return {
+            'open': float(bars.open[b, col]),
+            'high': float(bars.high[b, col]),
+            'low': float(bars.low[b, col]),
+            'close': close,
+            'volume': volume,
+            'vwap': float(bars.notional[b, col]) / volume if volume else close,
+            'trades': int(bars.trades[b, col])
+        }
+
+    def frame(self, interval, symbols = None):
+        '''
+        Closed bars of the day for `interval`, one row per bar and symbol:
+        `minute` is the bar's first minute; `stock` the symbol (a column
+        index unless `symbols` names them).
+        '''
+        bars = self.bars[interval]
+        num_bars = -(-self.minute // interval)
+        n = self.num_symbols
+        cols = np.tile(np.arange(n), num_bars)
+        volume = bars.volume[:num_bars].ravel()
+        close = bars.close[:num_bars].ravel()
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            vwap = np.where(volume > 0, bars.notional[:num_bars].ravel() / volume, close)
+        return pd.DataFrame({
+            'interval': interval,
+            'minute': np.repeat(np.arange(num_bars) * interval, n),
+            'stock': pd.Categorical.from_codes(cols, symbols) if symbols is not None else cols,
+            'open': bars.open[:num_bars].ravel(),
+            'high': bars.high[:num_bars].ravel(),
+            'low': bars.low[:num_bars].ravel(),
+            'close': close,
+            'volume': volume,
+            'vwap': vwap,
+            'trades': bars.trades[:num_bars].ravel()
+        })
@@ -0,0 +1,228 @@
+# Checkpoint and resume of a whole simulation at a day boundary
+
+import json
+from itertools import count
+
+import numpy as np
+import pandas as pd
+
+from modules.orders import RestingOrder
+
+CHECKPOINT_VERSION = 2
+
+def _columns(prefix, rows):
+    '''List of row dicts -> {prefix/column: array}, strings stored as fixed-width unicode.'''
+    arrays = {}
+    df = pd.DataFrame(rows)
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[f"{prefix}/{name}"] = values
+    return arrays
+
+def _rows(data, prefix):
+    '''Inverse of `_columns`: rebuilds the row dicts in their original column order.'''
+    names = [key[len(prefix) + 1:] for key in data.files if key.startswith(prefix + '/')]
+    if not names:
+        return []
+    return _frame(data, prefix, names).to_dict('records')
+
+def _frame(data, prefix, names = None):
+    if names is None:
+        names = [key[len(prefix) + 1:] for key in data.files if key.startswith(prefix + '/')]
+    return pd.DataFrame({name: data[f"{prefix}/{name}"] for name in names})
+
+def _generators(sim):
+    '''Every numpy Generator the run draws from, in a stable order.'''
+    found = [sim.rng, sim.exchange.rng, sim.scheduler.rng]
+    for agent in sim.agents:
+        for owner in (agent, getattr(agent, 'strategy', None)):
+            rng = getattr(owner, 'rng', None)
+            if rng is not None:
+                found.append(rng)
+    unique, seen = [], set()
+    for rng in found:
+        if id(rng) not in seen:
+            seen.add(id(rng))
+            unique.append(rng)
+    return unique
+
+def save_checkpoint(sim, path, next_day, config = None):
+    '''
+    Writes the state of `sim` between two days to a compressed .npz file:
+    agent store arrays, evolving-agent histories, exchange prices, price
+    history, order books and OHLC, any logs kept in memory, how far the
+    output files had got and every RNG state (as JSON). `next_day` is the first day a resumed run will simulate.
+    Nothing is pickled, so the file loads with allow_pickle=False.
+    '''
+    exchange, store = sim.exchange, sim.store
+    arrays = {
+        'store/cash': store.cash,
+        'store/holdings': store.holdings,
+        'store/strategy_codes': store.strategy_codes,
+        'store/agent_ids': store.agent_ids,
+        'exchange/prices': np.array([exchange.prices[s] for s in exchange.symbols]),
+        'exchange/last_trade_price': np.array(exchange.last_trade_price, dtype = np.float64),
+        'history/data': exchange.price_history.data,
+        'history/sums': exchange.price_history.sums,
+        'trades/day': exchange.trades.view(),
+        'trades/log': exchange.trade_log.view()
+    }
+
+    #Order ids keep increasing after a resume
+    next_order_id = next(exchange.order_ids)
+    exchange.order_ids = count(next_order_id)
+
+    resting = [(col, order_id, o.agent_id, o.side, o.quantity, o.price)
+               for col, book in enumerate(exchange.books)
+               for order_id, o in sorted(book.orders.items())]
+    arrays['books/orders'] = np.array(resting, dtype = [('symbol', np.int16), ('order_id', np.int64),
+                                                        ('agent_id', np.int64), ('side', np.int8),
+                                                        ('quantity', np.int64), ('price', np.float64)])
+    arrays['books/expiry'] = np.array(list(exchange.expiry_queue), dtype = np.int64).reshape(-1, 3)
+
+    pairs = list(exchange.price_history.ratio_sums)
+    arrays['history/ratio_pairs'] = np.array(pairs, dtype = np.int64).reshape(-1, 2)
+    arrays['history/ratio_sums'] = (np.stack([exchange.price_history.ratio_sums[p] for p in pairs])
+                                    if pairs else np.zeros((0, exchange.price_history.capacity + 1)))
+
+    arrays.update(_columns('ohlc', [{**row, 'stock': stock}
+                                    for stock, rows in exchange.daily_ohlc.items() for row in rows]))
+    memory_tables = []
+    if sim.memory is not None:
+        for table in sim.memory.tables:
+            memory_tables.append(table)
+            arrays.update(_columns(f"memory/{table}", sim.memory.frame(table)))
+
+    evolving = sim.evolving_agents
+    arrays['evolving/agent_ids'] = np.array([a.agent_id for a in evolving], dtype = np.int64)
+    arrays['evolving/strategy_names'] = np.array([a.strategy_name for a in evolving], dtype = str)
+    arrays.update(_columns('evolving/performance', [{'agent_id': a.agent_id, **row}
+                                                    for a in evolving for row in a.performance_history]))
+    arrays.update(_columns('evolving/switches', [row for a in evolving for row in a.strategy_switch_log]))
+    arrays.update(_columns('evolving/evolution', [{'agent_id': a.agent_id, **row}
+                                                  for a in evolving for row in a.evolution_log]))
+
+    #The trade log file is cut back to this point on resume
+    trade_log = None
+    if exchange.trade_sink is not None:
+        exchange.trade_sink.flush()
+        trade_log = exchange.trade_sink.position()
+
+    meta = {
+        'version': CHECKPOINT_VERSION,
+        'next_day': next_day,
+        'symbols': exchange.symbols,
+        'clock': exchange.clock,
+        'next_order_id': next_order_id,
+        'trades_saved': exchange.trades_saved,
+        'history_count': exchange.price_history.count,
+        'news_root_seed': sim.news_generator.root_seed,
+        'rng_states': [rng.bit_generator.state for rng in _generators(sim)],
+        'trade_log': trade_log,
+        'output': sim.output.position(),
+        'memory_tables': memory_tables,
+        'config': config
+    }
+    arrays['meta'] = np.array(json.dumps(meta))
+    np.savez_compressed(path, **arrays)
+
+def read_meta(path):
+    with np.load(path, allow_pickle = False) as data:
+        return json.loads(str(data['meta']))
+
+def load_checkpoint(sim, path):
+    '''
+    Restores a checkpoint into a freshly built Simulation of the same
+    population (same agents in the same order, same symbols) and returns
+    the day to continue from.
+    '''
+    with np.load(path, allow_pickle = False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta['version'] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {meta['version']}")
+        exchange, store = sim.exchange, sim.store
+        if meta['symbols'] != exchange.symbols:
+            raise ValueError("Checkpoint symbols do not match the simulation")
+        if not np.array_equal(data['store/agent_ids'], store.agent_ids):
+            raise ValueError("Checkpoint agents do not match the simulation's population")
+
+        store.cash[:] = data['store/cash']
+        store.holdings[:] = data['store/holdings']
+        store.strategy_codes[:] = data['store/strategy_codes']
+
+        for col, stock in enumerate(exchange.symbols):
+            exchange.prices[stock] = float(data['exchange/prices'][col])
+        exchange.last_trade_price = data['exchange/last_trade_price'].tolist()
+        exchange.clock = meta['clock']
+        exchange.order_ids = count(meta['next_order_id'])
+        exchange.trades_saved = meta['trades_saved']
+        exchange.trades.reset()
+        exchange.trades.extend(data['trades/day'])
+        exchange.trade_log.reset()
+        exchange.trade_log.extend(data['trades/log'])
+
+        for book in exchange.books:
+            book.clear()
+        for col, order_id, agent_id, side, qty, price in data['books/orders'].tolist():
+            exchange.books[col].add(order_id, RestingOrder(agent_id, side, qty, price))
+        exchange.expiry_queue.clear()
+        exchange.expiry_queue.extend(tuple(e) for e in data['books/expiry'].tolist())
+
+        history = exchange.price_history
+        if data['history/data'].shape != history.data.shape:
+            raise ValueError("Checkpoint price history size does not match the exchange")
+        history.data[:] = data['history/data']
+        history.sums[:] = data['history/sums']
+        history.count = meta['history_count']
+        history.ratio_sums = {tuple(pair): sums.copy() for pair, sums in
+                              zip(data['history/ratio_pairs'].tolist(), data['history/ratio_sums'])}
+
+        for stock in exchange.daily_ohlc:
+            exchange.daily_ohlc[stock] = []
+            exchange.daily_closes[stock] = []
+        for row in _rows(data, 'ohlc'):
+            stock = row.pop('stock')
+            exchange.daily_ohlc[stock].append(row)
+            exchange.daily_closes[stock].append(row['close'])
+
+        if sim.memory is not None:
+            sim.memory.tables = {table: [_frame(data, f"memory/{table}")] for table in meta['memory_tables']}
+
+        by_id = {a.agent_id: a for a in sim.evolving_agents}
+        for agent_id, name in zip(data['evolving/agent_ids'].tolist(), data['evolving/strategy_names'].tolist()):
+            agent = by_id[agent_id]
+            agent.strategy_name = name
+            agent.strategy = agent._initialize_strategy(name)
+            agent.performance_history, agent.strategy_switch_log, agent.evolution_log = [], [], []
+        for row in _rows(data, 'evolving/performance'):
+            by_id[row.pop('agent_id')].performance_history.append(row)
+        for row in _rows(data, 'evolving/switches'):
+            by_id[row['agent_id']].strategy_switch_log.append(row)
+        for row in _rows(data, 'evolving/evolution'):
+            by_id[row.pop('agent_id')].evolution_log.append(row)
+
+    #Strategies were rebuilt above, so generators are collected afterwards
+    generators = _generators(sim)
+    if len(generators) != len(meta['rng_states']):
+        raise ValueError("Checkpoint RNG streams do not match the simulation")
+    for rng, state in zip(generators, meta['rng_states']):
+        rng.bit_generator.state = state
+    sim.news_generator.root_seed = meta['news_root_seed']
+    sim.news_generator.cached_day = None
+    exchange.trade_log_resume = meta['trade_log']
+    sim.output_resume = meta['output']
+    return meta['next_day']
+
+def reseed(sim, seed):
+    '''
+    Gives a resumed run fresh random streams derived from `seed`, so forks
+    of one checkpoint diverge from each other after the fork point.
+    '''
+    generators = _generators(sim)
+    children = np.random.SeedSequence(seed).spawn(len(generators) + 1)
+    for rng, child in zip(generators, children):
+        rng.bit_generator.state = np.random.default_rng(child).bit_generator.state
+    sim.news_generator.root_seed = int(np.random.default_rng(children[-1]).integers(2**63))
+    sim.news_generator.cached_day = None
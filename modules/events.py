@@ -0,0 +1,91 @@
+# Day- and minute-indexed calendar of scripted news events
+
+import csv
+import os
+from collections import defaultdict
+
+KINDS = ('breaking', 'market')
+
+#Columns of an event file and how to parse them; empty cells are left out
+EVENT_FIELDS = {
+    'kind': str,
+    'day': int,
+    'minute': int,
+    'stock': str,
+    'target': str,
+    'type': str,
+    'impact': float,
+    'spillover': float
+}
+
+class EventCalendar:
+    '''
+    News events indexed by day and by (day, minute), so finding what fires
+    at a given time never scans the full list.
+    - 'breaking' events set one stock's sentiment (and optionally a
+      `spillover` for its competitor)
+    - 'market' events add `impact` to every stock (`target: market`) or to
+      one `stock`
+    An event without a `minute` is indexed at minute 0 and lasts all day.
+    '''
+    def __init__(self):
+        self.by_day = {kind: defaultdict(list) for kind in KINDS}
+        self.by_minute = {kind: defaultdict(list) for kind in KINDS}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def from_config(cls, news_config):
+        '''Events from the `news` section of the config, plus any `event_files`.'''
+        calendar = cls()
+        calendar.extend(news_config.get('breaking_events', []), 'breaking')
+        calendar.extend(news_config.get('market_events', []), 'market')
+        for path in news_config.get('event_files', []):
+            calendar.load(path)
+        return calendar
+
+    def add(self, event, kind):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown event kind: {kind}")
+        event = {k: v for k, v in event.items() if k != 'kind'}
+        day = event['day']
+        self.by_day[kind][day].append(event)
+        self.by_minute[kind][(day, event.get('minute', 0))].append(event)
+        self.count += 1
+
+    def extend(self, events, kind = None):
+        '''Adds events; without `kind`, each event names its own.'''
+        for event in events:
+            self.add(event, kind or event['kind'])
+
+    def on_day(self, day, kind):
+        '''Events of `day` by minute; events of the same minute keep the order they were added in.'''
+        return sorted(self.by_day[kind].get(day, []), key = lambda event: event.get('minute', 0))
+
+    def at(self, day, minute, kind):
+        return self.by_minute[kind].get((day, minute), [])
+
+    def load(self, path, kind = None, batch_size = 65_536):
+        '''
+        Streams events from a CSV or Parquet file with EVENT_FIELDS columns
+        (`kind` may instead be passed for the whole file). Rows are parsed
+        as they are read, so the file itself is never held in memory.
+        '''
+        if os.path.splitext(path)[1].lower() == '.parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size = batch_size):
+                self.extend((parse_event(row) for row in batch.to_pylist()), kind)
+        else:
+            with open(path, 'r', newline = '') as f:
+                self.extend((parse_event(row) for row in csv.DictReader(f)), kind)
+
+def parse_event(row):
+    event = {}
+    for name, value in row.items():
+        if value is None or value == '':
+            continue
+        parse = EVENT_FIELDS.get(name)
+        event[name] = parse(value) if parse else value
+    return event
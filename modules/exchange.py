@@ -1,10 +1,28 @@
 import numpy as np
-from collections import defaultdict
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from modules.order_book import OrderBook
+from modules.orders import SIDE_BUY, SIDE_SELL, TRADE_DTYPE, TradeBuffer, RestingOrder
+from modules.trade_sink import TradeLogWriter
+from modules.rng import ensure_rng
+from modules.price_history import PriceHistory
+from modules.indicators import IndicatorCache
+from modules.bars import BarBuilder
+from modules.matching import SymbolLedger, match_groups
 
 class Exchange:
-    def __init__(self, stock_config, transaction_cost_rate = 0.005):
+    def __init__(self, stock_config, transaction_cost_rate = 0.005, order_ttl = 5,
+                 keep_trade_log = True, trade_log_flush_size = 50_000, rng = None,
+                 price_history_size = 1024, bar_intervals = (1, 5), minutes_per_day = 390,
+                 matching = 'serial', match_workers = 1):
+        self.rng = ensure_rng(rng)
+        self.symbols = [s['symbol'] for s in stock_config]
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
         self.order_books = {
-            s['symbol']: {'buy': [], 'sell': []} for s in stock_config
+            s['symbol']: OrderBook(s['symbol']) for s in stock_config
         }
         self.prices = {
             s['symbol']: s['initial_price'] for s in stock_config
@@ -15,129 +33,331 @@ class Exchange:
         self.daily_ohlc = {
             s['symbol']: [] for s in stock_config
         }
-        self.trades = []
+        self.daily_closes = {
+            s['symbol']: [] for s in stock_config
+        }
+        #Trades of the current day and (optionally) of the whole run, as TRADE_DTYPE records
+        self.trades = TradeBuffer()
         self.transaction_cost_rate = transaction_cost_rate
-        self.trade_log = []
+        self.keep_trade_log = keep_trade_log
+        self.trade_log = TradeBuffer()
+
+        #Streaming trade log on disk; `trades_saved` counts today's trades already handed to it
+        self.trade_log_flush_size = trade_log_flush_size
+        self.trade_sink = None
+        self.trades_saved = 0
+        #Set when resuming from a checkpoint: where the trade log file continues
+        self.trade_log_resume = None
+
+        #Resting orders live for `order_ttl` calls to match_all (minutes)
+        self.order_ttl = order_ttl
+        self.clock = 0
+        self.expiry_queue = deque()
+        #Unfilled market orders rest only until their minute closes
+        self.minute_orders = []
+        self.order_ids = count()
+        self.store = None
+        self.books = [self.order_books[s] for s in self.symbols]
+        self.traded_this_minute = set()
+        self.last_trade_price = [self.prices[s] for s in self.symbols]
+        #Minute-level reference prices, appended by match_all
+        self.price_history = PriceHistory(self.symbols, capacity = price_history_size)
+        self.indicators = IndicatorCache(self.price_history)
+        #Intraday and day bars, updated on every fill
+        self.bars = BarBuilder(len(self.symbols), intervals = bar_intervals, minutes_per_day = minutes_per_day)
+
+        #'serial': orders settle one after another against shared cash.
+        #'partitioned': groups of symbols match independently (modules/matching.py)
+        #on `match_workers` threads, with exactly the serial result for any
+        #worker count.
+        if matching not in ('serial', 'partitioned'):
+            raise ValueError(f"Unknown matching mode: {matching}")
+        self.matching = matching
+        self.match_workers = match_workers
+        self.match_pool = None
+
+    def attach_store(self, store):
+        '''Registers the AgentStateStore whose cash/holdings settle fills.'''
+        if list(store.symbols) != self.symbols:
+            raise ValueError("Agent store and exchange must list the same symbols in the same order")
+        self.store = store
 
     def submit_order(self, stock, order):
-        self.order_books[stock][order['type']].append(order)
-
-    def match_all(self, agents):
-        for stock, books in self.order_books.items():
-            buys = sorted(books['buy'], key = lambda o: -o['quantity'])
-            sells = sorted(books['sell'], key = lambda o: o['quantity'])
-
-            matched = min(len(buys), len(sells))
-            price = self.prices[stock]
-            trades_this_stock = []
-
-            for i in range(matched):
-                buyer = agents[buys[i]['agent_id']]
-                seller = agents[sells[i]['agent_id']]
-                qty = min(buys[i]['quantity'], sells[i]['quantity'])
-
-                cost = qty * price
-                fee = cost * self.transaction_cost_rate
-
-                if buyer.cash >= qty * price and seller.portfolio[stock] >= qty:
-                    buyer.cash -= (cost + fee)
-                    seller.cash += (cost - fee)
-                    
-                    buyer.portfolio[stock] += qty
-                    seller.portfolio[stock] -= qty
-
-                    trades_this_stock.append({
-                        'stock': stock,
-                        'price': price,
-                        'quantity': qty,
-                        'buyer_id': buyer.agent_id,
-                        'seller_id': seller.agent_id,
-                        'fee_paid': round(2 * fee, 4)
-                    })
-
-                    self.log_trade({
-                        'stock': stock,
-                        'price': price,
-                        'quantity': qty,
-                        'buyer_id': buyer.agent_id,
-                        'seller_id': seller.agent_id,
-                        'fee_paid': round(2 * fee, 4)
-                    })
-            
-            self.trades.extend(trades_this_stock)
-
-            #Update prices
-            if trades_this_stock:
-                self.prices[stock] += np.random.normal(0, 0.1)
+        '''
+        Matches a single order dict against the opposite side of the book as
+        soon as it arrives. Limit orders (or market orders when the book runs
+        dry) rest with the remaining quantity; orders whose owner runs out of
+        cash or shares are dropped.
+        '''
+        side = SIDE_BUY if order['type'] == 'buy' else SIDE_SELL
+        self._submit(self.symbol_index[stock], order['agent_id'], side, order['quantity'], order['price'])
+
+    def submit_orders(self, orders):
+        '''Submits an ORDER_DTYPE array in array order (NaN price = market order).'''
+        if self.matching == 'partitioned':
+            self._submit_partitioned(orders)
+            return
+        for agent_id, col, side, qty, price in orders.tolist():
+            self._submit(col, agent_id, side, qty, None if price != price else price)
+
+    def _submit_partitioned(self, orders):
+        '''
+        Matches each group of symbols from match_groups (its orders in array
+        order) against its own books and a SymbolLedger, then reconciles the
+        ledgers. Order ids are reserved per order position up front, so
+        nothing depends on which worker finishes first.
+        '''
+        groups = match_groups(self, orders)
+        group_of = np.zeros(len(self.symbols), dtype = np.int64)
+        for g, cols in enumerate(groups):
+            group_of[cols] = g
+        order_groups = group_of[orders['symbol']]
+        positions = np.argsort(order_groups, kind = 'stable')
+        bounds = np.searchsorted(order_groups[positions], np.arange(len(groups) + 1)).tolist()
+        positions = positions.tolist()
+        rows = orders.tolist()
+
+        first_id = next(self.order_ids)
+        self.order_ids = count(first_id + len(orders))
+        ledgers = [SymbolLedger(self, cols, first_id) for cols in groups]
+
+        def match(g):
+            ledger = ledgers[g]
+            for position in positions[bounds[g]:bounds[g + 1]]:
+                agent_id, col, side, qty, price = rows[position]
+                ledger.position = position
+                self._submit(col, agent_id, side, qty, None if price != price else price, ledger)
+
+        if self.match_workers > 1 and len(groups) > 1:
+            if self.match_pool is None:
+                self.match_pool = ThreadPoolExecutor(max_workers = self.match_workers)
+            list(self.match_pool.map(match, range(len(groups))))
+        else:
+            for g in range(len(groups)):
+                match(g)
+        self._reconcile(ledgers)
+
+    def _reconcile(self, ledgers):
+        '''
+        Applies partitioned ledgers as serial settlement would have: trades
+        in order of the incoming order that made them, and cash updated
+        trade by trade in that order, so the floats match bit for bit.
+        '''
+        store = self.store
+        records = [trade for ledger in ledgers for trade in ledger.trades]
+        for ledger in ledgers:
+            self.expiry_queue.extend(ledger.expiries)
+            self.minute_orders.extend(ledger.minute_orders)
+        if not records:
+            return
+
+        position, col, price, qty, buyer, seller, fee_paid = (np.array(v) for v in zip(*records))
+        order = np.argsort(position, kind = 'stable')
+        col, price, qty, buyer, seller, fee_paid = (v[order] for v in (col, price, qty, buyer, seller, fee_paid))
+
+        cost = qty * price
+        fee = cost * self.transaction_cost_rate
+        #Buyer then seller for each trade, as in _settle
+        np.add.at(store.cash, np.column_stack((buyer, seller)).ravel(),
+                  np.column_stack((-(cost + fee), cost - fee)).ravel())
+
+        trades = np.empty(len(order), dtype = TRADE_DTYPE)
+        trades['symbol'] = col
+        trades['price'] = price
+        trades['quantity'] = qty
+        #Ledgers record store rows; the logs hold agent ids
+        trades['buyer_id'] = store.agent_ids[buyer]
+        trades['seller_id'] = store.agent_ids[seller]
+        trades['fee_paid'] = fee_paid
+        self.trades.extend(trades)
+        if self.keep_trade_log:
+            self.trade_log.extend(trades)
+
+        for c, p in zip(col.tolist(), price.tolist()):
+            self.last_trade_price[c] = p
+        self.traded_this_minute.update(col.tolist())
+
+    def close_match_pool(self):
+        if self.match_pool is not None:
+            self.match_pool.shutdown()
+            self.match_pool = None
+
+    def _submit(self, col, agent_id, side, quantity, limit, ledger = None):
+        '''
+        Matches one order against the book. Capacity checks, settlement and
+        resting go through `ledger`: the exchange itself (shared cash) or a
+        SymbolLedger in partitioned mode.
+        '''
+        ledger = self if ledger is None else ledger
+        book = self.books[col]
+        opposite = SIDE_SELL if side == SIDE_BUY else SIDE_BUY
+        store = self.store
+        owner = store.row_of[agent_id]
+
+        while quantity > 0:
+            best = book.best(opposite)
+            if best is None:
+                break
+            price, level = best
+            if limit is not None and (price > limit if side == SIDE_BUY else price < limit):
+                break
+
+            resting_id = level[0]
+            resting = book.orders[resting_id]
+            if resting.agent_id == agent_id:
+                #Self-trade prevention: the older order is cancelled
+                book.cancel(resting_id)
+                continue
+
+            qty_in = ledger._capacity(owner, side, col, price)
+            if qty_in <= 0:
+                return
+            counterparty = store.row_of[resting.agent_id]
+            qty_rest = ledger._capacity(counterparty, opposite, col, price)
+            if qty_rest <= 0:
+                book.cancel(resting_id)
+                continue
+
+            qty = min(quantity, resting.quantity, qty_in, qty_rest)
+            if side == SIDE_BUY:
+                ledger._settle(col, price, qty, owner, counterparty)
             else:
-                self.prices[stock] += np.random.normal(0, 0.01)
-            self.order_books[stock] = {'buy': [], 'sell': []}
+                ledger._settle(col, price, qty, counterparty, owner)
+
+            quantity -= qty
+            resting.quantity -= qty
+            if resting.quantity == 0:
+                book.pop_front(level)
+
+        if quantity > 0:
+            ledger._rest(col, agent_id, side, quantity, limit)
+
+    def _rest(self, col, agent_id, side, quantity, limit):
+        order_id = next(self.order_ids)
+        if limit is None:
+            #Market orders wait at the reference price for the rest of the minute
+            self.books[col].add(order_id, RestingOrder(agent_id, side, quantity, self.prices[self.symbols[col]]))
+            self.minute_orders.append((col, order_id))
+        else:
+            self.books[col].add(order_id, RestingOrder(agent_id, side, quantity, limit))
+            self.expiry_queue.append((self.clock + self.order_ttl, col, order_id))
+
+    def _capacity(self, row, side, col, price):
+        '''Largest quantity the agent in `row` can currently settle at `price`.'''
+        if side == SIDE_BUY:
+            return int(self.store.cash[row] // (price * (1 + self.transaction_cost_rate)))
+        return int(self.store.holdings[row, col])
+
+    def _settle(self, col, price, qty, buyer, seller):
+        store = self.store
+        cost = qty * price
+        fee = cost * self.transaction_cost_rate
+
+        store.cash[buyer] -= (cost + fee)
+        store.cash[seller] += (cost - fee)
+
+        store.holdings[buyer, col] += qty
+        store.holdings[seller, col] -= qty
+
+        trade = (col, price, qty, store.agent_ids[buyer], store.agent_ids[seller], round(2 * fee, 4))
+        self.trades.append(*trade)
+        if self.keep_trade_log:
+            self.log_trade(trade)
+
+        self.bars.add_fill(col, price, qty)
+        self.last_trade_price[col] = price
+        self.traded_this_minute.add(col)
+
+    def match_all(self):
+        '''
+        Closes the current minute: cancels unfilled market orders, expires
+        stale resting orders and moves each reference price to its last trade
+        plus noise (or a smaller random drift if the stock did not trade).
+        '''
+        for col, stock in enumerate(self.symbols):
+            if col in self.traded_this_minute:
+                self.prices[stock] = self.last_trade_price[col] + self.rng.normal(0, 0.1)
+            else:
+                self.prices[stock] += self.rng.normal(0, 0.01)
+        self.traded_this_minute = set()
+        prices = [self.prices[s] for s in self.symbols]
+        self.price_history.append(prices)
+        self.bars.close_minute(prices)
+
+        for col, order_id in self.minute_orders:
+            self.books[col].cancel(order_id)
+        self.minute_orders.clear()
+
+        self.clock += 1
+        while self.expiry_queue and self.expiry_queue[0][0] <= self.clock:
+            _, col, order_id = self.expiry_queue.popleft()
+            self.books[col].cancel(order_id)
     
     def get_price(self, stock):
         return self.prices.get(stock, None)
     
     def get_observation(self):
+        '''
+        Market state for this minute's decisions. `prices` is the live dict
+        (not a copy): it only changes in match_all, after every agent decided.
+        '''
         return {
-            'prices': self.prices.copy(),
-            'price_history': {s: [] for s in self.prices}
+            'prices': self.prices,
+            'symbol_index': self.symbol_index,
+            'price_history': self.price_history,
+            'indicators': self.indicators
         }
     
     def get_price_history_dict(self):
-        return {
-            stock: [ohlc['close'] for ohlc in self.daily_ohlc[stock]]
-            for stock in self.daily_ohlc
-        }
+        '''Daily closes per stock (the live lists, appended by log_day_close).'''
+        return self.daily_closes
     
     def reset_day(self):
-        self.trades = []
+        #Resting orders are day orders
+        self.trades.reset()
+        self.trades_saved = 0
+        self.bars.reset_day()
+        for book in self.order_books.values():
+            book.clear()
+        self.expiry_queue.clear()
+        self.minute_orders.clear()
         return
     
     
     def log_day_close(self, day_idx):
         """
-        Generate OHLC and volume for each stock based on trades during the day.
+        Appends each stock's OHLC, volume, VWAP and trade count for the day,
+        read from the day bar (flat at the current price if it did not trade).
         """
-        # First, collect trades per stock
-
-        trade_data = defaultdict(list)
-        for trade in self.trades:
-            stock = trade['stock']
-            price = trade['price']
-            qty = trade['quantity']
-            trade_data[stock].append((price, qty))
-
-        for stock in self.prices:
-            trades = trade_data.get(stock, [])
-            if not trades:
-                # No trades today; use current price as flat OHLC
+        for col, stock in enumerate(self.symbols):
+            ohlc = {"day": day_idx, **self.bars.day_bar(col)}
+            if ohlc["trades"] == 0:
                 price = self.prices[stock]
-                ohlc = {
-                    "day": day_idx,
-                    "open": price,
-                    "high": price,
-                    "low": price,
-                    "close": price,
-                    "volume": 0
-                    }
-            else:
-                prices = [t[0] for t in trades]
-                volumes = [t[1] for t in trades]
-                ohlc = {
-                    "day": day_idx,
-                    "open": prices[0],
-                    "high": max(prices),
-                    "low": min(prices),
-                    "close": prices[-1],
-                    "volume": sum(volumes)
-                }
-
+                ohlc.update(open = price, high = price, low = price, close = price, vwap = price)
             self.daily_ohlc[stock].append(ohlc)
+            self.daily_closes[stock].append(ohlc["close"])
     
     def log_trade(self, trade):
-        self.trade_log.append(trade)
+        self.trade_log.append(*trade)
+
+    def trades_frame(self, trades):
+        '''DataFrame of TRADE_DTYPE records with the symbol index mapped back to names.'''
+        df = pd.DataFrame(trades)
+        df.insert(0, 'stock', np.asarray(self.symbols, dtype = object)[trades['symbol']])
+        return df.drop(columns = 'symbol')
     
     def save_trade_log(self, path = 'trade_log.csv'):
-        import pandas as pd
-        if self.trade_log:
-            df = pd.DataFrame(self.trade_log)
-            df.to_csv(path, index=False)
\ No newline at end of file
+        '''
+        Appends the trades made since the previous call to the trade log file.
+        Rows are batched by the writer, so call `close_trade_log()` once the
+        run is over.
+        '''
+        if self.trade_sink is None:
+            self.trade_sink = TradeLogWriter(path, self.symbols, flush_size = self.trade_log_flush_size,
+                                             resume = self.trade_log_resume)
+        self.trade_sink.write(self.trades.view()[self.trades_saved:])
+        self.trades_saved = len(self.trades)
+
+    def close_trade_log(self):
+        if self.trade_sink is not None:
+            self.trade_sink.close()
@@ -0,0 +1,47 @@
+# Rolling indicators shared by every agent within a minute
+
+class IndicatorCache:
+    '''
+    Memoizes indicator values keyed by (indicator, symbol column or column
+    pair, lookback). Values are computed from the exchange's PriceHistory
+    the first time any agent asks during a minute; the cache empties itself
+    as soon as the history gets a new price. Strategies read it through
+    `market_obs['indicators']`.
+
+    Built-in indicators:
+    - 'mean': mean price of a column over the lookback
+    - 'ratio_mean': mean of price[a] / price[b] for a column pair (a, b)
+    - 'std': standard deviation of a column's price over the lookback
+    New ones can be added with `register(name, fn)`, where
+    `fn(history, key, lookback)` returns the value.
+    '''
+    def __init__(self, history):
+        self.history = history
+        self.values = {}
+        self.version = history.count
+        self.hits = 0
+        self.misses = 0
+        self.indicators = {
+            'mean': lambda h, col, n: h.mean(col, n),
+            'ratio_mean': lambda h, pair, n: h.ratio_mean(pair[0], pair[1], n),
+            'std': lambda h, col, n: float(h.window(col, n).std())
+        }
+
+    def register(self, name, fn):
+        self.indicators[name] = fn
+        self.values = {}
+
+    def get(self, indicator, key, lookback):
+        if self.history.count != self.version:
+            self.values = {}
+            self.version = self.history.count
+
+        cache_key = (indicator, key, lookback)
+        value = self.values.get(cache_key)
+        if value is None:
+            self.misses += 1
+            value = self.indicators[indicator](self.history, key, lookback)
+            self.values[cache_key] = value
+        else:
+            self.hits += 1
+        return value
@@ -0,0 +1,85 @@
+# Destinations for the per-day log batches of a simulation
+
+import numpy as np
+import pandas as pd
+
+class LogSink:
+    '''
+    Receives every log batch the simulation emits as (table, day, frame),
+    where `frame` is a typed DataFrame holding that table's new rows (`day`
+    is None for batches spanning several days). `phase` is the profiler
+    phase its writes are timed under.
+    '''
+    phase = 'persist'
+
+    def write(self, table, day, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class TableSink(LogSink):
+    '''Appends batches to the run's output tables (modules/output.py).'''
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, table, day, frame):
+        self.output.write(table, frame, day)
+
+class MemorySink(LogSink):
+    '''Keeps every batch in memory; `frame(table)` returns them concatenated.'''
+    def __init__(self):
+        self.tables = {}
+
+    def write(self, table, day, frame):
+        self.tables.setdefault(table, []).append(frame)
+
+    def frame(self, table):
+        frames = self.tables.get(table)
+        if not frames:
+            return pd.DataFrame()
+        if len(frames) > 1:
+            #Later reads are free
+            self.tables[table] = frames = [pd.concat(frames, ignore_index = True)]
+        return frames[0]
+
+class PublisherSink(LogSink):
+    '''Forwards the tables listed in `endpoints` to the API through a DeltaPublisher.'''
+    phase = 'push'
+
+    def __init__(self, publisher, endpoints = None):
+        self.publisher = publisher
+        self.endpoints = endpoints or {'agent_wealth': "/update/wealth", 'sentiment_log': "/update/sentiment"}
+
+    def write(self, table, day, frame):
+        endpoint = self.endpoints.get(table)
+        if endpoint is not None and len(frame):
+            self.publisher.publish_frame(endpoint, frame)
+
+def run_starts(series):
+    '''
+    (minute, column) of every entry of a minutes x symbols array that
+    differs from the minute before, plus all of minute 0; in minute order.
+    '''
+    changed = np.ones(series.shape, dtype = bool)
+    changed[1:] = series[1:] != series[:-1]
+    return np.nonzero(changed)
+
+def expand_sentiment(frame, minutes_per_day):
+    '''
+    Turns a run-length encoded sentiment log (a row only where a stock's
+    sentiment changes) back into one row per day, minute and stock.
+    '''
+    if frame.empty:
+        return frame
+    frame = frame.sort_values(['day', 'stock', 'minute'], kind = 'stable').reset_index(drop = True)
+    day, stock, minute = frame['day'].to_numpy(), frame['stock'].to_numpy(), frame['minute'].to_numpy()
+    last = np.ones(len(frame), dtype = bool)
+    last[:-1] = (day[1:] != day[:-1]) | (stock[1:] != stock[:-1])
+    end = np.where(last, minutes_per_day, np.roll(minute, -1))
+    lengths = end - minute
+
+    expanded = frame.loc[np.repeat(np.arange(len(frame)), lengths)].reset_index(drop = True)
+    offsets = np.arange(len(expanded)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    expanded['minute'] = np.repeat(minute, lengths) + offsets
+    return expanded.sort_values(['day', 'minute'], kind = 'stable').reset_index(drop = True)
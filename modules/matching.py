@@ -0,0 +1,131 @@
+# Partitioned matching: groups of symbols matched independently with the result of serial matching
+
+import numpy as np
+
+from modules.orders import SIDE_BUY, SIDE_SELL, RestingOrder
+
+#Relative slack on the cash test, far above the rounding of serial cash updates
+CASH_MARGIN = 1e-9
+
+def match_groups(exchange, orders):
+    '''
+    Splits the symbols that receive orders this minute into groups that can
+    be matched independently and still give exactly the serial result.
+
+    A buyer can only be cut short by its cash if it might spend more than
+    it holds: every incoming buy at its limit (or, for a market order, the
+    highest ask resting or arriving in that symbol this minute) plus every
+    resting bid, with fees. Agents over that bound are constrained, and
+    every symbol a constrained agent has an order in (incoming or resting)
+    goes into one group, so its cash is only ever touched by that group, in
+    array order. Everyone else can afford all their buys wherever they
+    match. Returns lists of columns, in order of their lowest column.
+    '''
+    store = exchange.store
+    n = len(exchange.symbols)
+    reference = np.array([exchange.prices[s] for s in exchange.symbols], dtype = np.float64)
+    fee_factor = 1 + exchange.transaction_cost_rate
+
+    cols = orders['symbol'].astype(np.int64)
+    sells = orders['side'] == SIDE_SELL
+    prices = orders['price']
+    #Highest price a buy could fill at in each symbol
+    ceiling = np.zeros(n)
+    np.maximum.at(ceiling, cols[sells], np.where(np.isnan(prices), reference[cols], prices)[sells])
+
+    resting_ids, resting_cols, resting_spend = [], [], []
+    for col, book in enumerate(exchange.books):
+        for order in book.orders.values():
+            resting_ids.append(order.agent_id)
+            resting_cols.append(col)
+            if order.side == SIDE_BUY:
+                resting_spend.append(order.quantity * order.price * fee_factor)
+            else:
+                resting_spend.append(0.0)
+                if order.price > ceiling[col]:
+                    ceiling[col] = order.price
+
+    bound = np.where(np.isnan(prices), ceiling[cols], np.minimum(prices, ceiling[cols]))
+    spend = np.where(sells, 0.0, orders['quantity'] * bound * fee_factor)
+
+    agent_ids = orders['agent_id'].tolist() + resting_ids
+    rows = np.fromiter(map(store.row_of.__getitem__, agent_ids), dtype = np.int64, count = len(agent_ids))
+    all_cols = np.concatenate((cols, np.array(resting_cols, dtype = np.int64)))
+    total = np.bincount(rows, weights = np.concatenate((spend, resting_spend)), minlength = len(store))
+    constrained = (total > 0) & (total > store.cash * (1 - CASH_MARGIN))
+
+    #Union the symbols of each constrained agent
+    parent = list(range(n))
+    def find(col):
+        while parent[col] != col:
+            parent[col] = parent[parent[col]]
+            col = parent[col]
+        return col
+    first_col = {}
+    linked = constrained[rows]
+    for row, col in zip(rows[linked].tolist(), all_cols[linked].tolist()):
+        if row in first_col:
+            parent[find(col)] = find(first_col[row])
+        else:
+            first_col[row] = col
+
+    groups = {}
+    for col in np.unique(cols).tolist():
+        groups.setdefault(find(col), []).append(col)
+    return sorted(groups.values())
+
+class SymbolLedger:
+    '''
+    Settles the fills of one group of symbols during a partitioned minute,
+    in place of the exchange. Each agent's cash is followed as a running
+    value starting from the store, updated in the same order as serial
+    settlement; the store's cash itself is left alone until
+    `Exchange._reconcile`. Trades are tagged with the position of the
+    incoming order that made them, so the reconcile can put them in serial
+    order. Holdings and bars are updated directly: only this group touches
+    its symbols' columns and slots.
+    '''
+    def __init__(self, exchange, cols, first_order_id):
+        self.exchange = exchange
+        self.cols = cols
+        self.first_order_id = first_order_id
+        self.cash = {}
+        self.trades = []
+        self.expiries = []
+        self.minute_orders = []
+        #Position in the minute's order array of the order being matched
+        self.position = 0
+
+    def _cash(self, row):
+        cash = self.cash.get(row)
+        return float(self.exchange.store.cash[row]) if cash is None else cash
+
+    def _capacity(self, row, side, col, price):
+        if side == SIDE_BUY:
+            return int(self._cash(row) // (price * (1 + self.exchange.transaction_cost_rate)))
+        return int(self.exchange.store.holdings[row, col])
+
+    def _settle(self, col, price, qty, buyer, seller):
+        holdings = self.exchange.store.holdings
+        cost = qty * price
+        fee = cost * self.exchange.transaction_cost_rate
+
+        self.cash[buyer] = self._cash(buyer) - (cost + fee)
+        self.cash[seller] = self._cash(seller) + (cost - fee)
+
+        holdings[buyer, col] += qty
+        holdings[seller, col] -= qty
+        self.trades.append((self.position, col, price, qty, buyer, seller, round(2 * fee, 4)))
+        #Bars only touch this group's slots
+        self.exchange.bars.add_fill(col, price, qty)
+
+    def _rest(self, col, agent_id, side, quantity, limit):
+        exchange = self.exchange
+        #Ids are reserved per minute: one per order position
+        order_id = self.first_order_id + self.position
+        if limit is None:
+            exchange.books[col].add(order_id, RestingOrder(agent_id, side, quantity, exchange.prices[exchange.symbols[col]]))
+            self.minute_orders.append((col, order_id))
+        else:
+            exchange.books[col].add(order_id, RestingOrder(agent_id, side, quantity, limit))
+            self.expiries.append((exchange.clock + exchange.order_ttl, col, order_id))
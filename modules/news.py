@@ -3,8 +3,20 @@
 import numpy as np
 import yaml
 
+from modules.rng import ensure_rng
+from modules.events import EventCalendar
+
 class NewsGenerator:
-    def __init__(self, num_days, config_path = "config.yml", config_override = None):
+    '''
+    Sentiment is a days x minutes x symbols series generated lazily one day
+    at a time. Each day draws from its own child stream of `rng`, so a day
+    comes out the same whichever order days are requested in. Events come
+    from an EventCalendar (by default built from the config's events and
+    `event_files`); an event with a `minute` key applies from that minute
+    to the end of its day, otherwise to the whole day.
+    '''
+    def __init__(self, num_days, config_path = "config.yml", config_override = None, rng = None,
+                 minutes_per_day = None, calendar = None):
         if config_override:
             config = config_override
         else:
@@ -12,12 +24,14 @@ class NewsGenerator:
                 config = yaml.safe_load(file)
 
         self.mode = config['news'].get('mode', 'random')
+        if self.mode not in ('neutral', 'random', 'scripted'):
+            raise ValueError(f"Unknown news mode: {self.mode}")
         self.daily_vol = config['news'].get('daily_volatility', 0.2)
-        self.shock_days = config['news'].get('shock_days', [])
+        self.shock_days = set(config['news'].get('shock_days', []))
         self.shock_magnitude = config['news'].get('shock_magnitude', -0.9)
         self.stocks = [s['symbol'] for s in config['stocks']]
-        self.breaking_events = config['news'].get('breaking_events', [])
-        self.market_events = config['news'].get('market_events', [])
+        self.symbol_index = {s: i for i, s in enumerate(self.stocks)}
+        self.calendar = calendar if calendar is not None else EventCalendar.from_config(config['news'])
 
         self.competitor_map = {
             "AAPL": "MSFT",
@@ -26,70 +40,72 @@ class NewsGenerator:
             "SHOP": "DSM"
         }
 
-
         self.num_days = num_days
-        self.sentiment_series = self._generate_sentiment_series()
-
-    def _generate_sentiment_series(self):
-        sentiment_series = []
-
-        for day in range(self.num_days):
-            daily_sentiment = {}
-
-            for stock in self.stocks:
-                if self.mode == 'neutral':
-                    daily_sentiment[stock] = 0.0
-                elif self.mode == 'random':
-                    value = np.random.normal(0, self.daily_vol)
-                    daily_sentiment[stock] = np.clip(value, -1, 1)
-                elif self.mode == 'scripted':
-                    if day in self.shock_days and stock == self.stocks[0]:
-                        daily_sentiment[stock] = self.shock_magnitude
-                        #Inject positive sentiment for competitor
-                        rival = self.competitor_map.get(stock)
-                        if rival:
-                            daily_sentiment[rival] = abs(self.shock_magnitude)
-                    else:
-                        value = np.random.normal(0, self.daily_vol)
-                        daily_sentiment[stock] = np.clip(value, -1, 1)
-                else:
-                    raise ValueError(f"Unknown news mode: {self.mode}")
-
-            for event in self.breaking_events:
-                if event['day'] == day:
-                    target = event['stock']
-                    impact = event['impact']
-                    
-                    daily_sentiment[target] = impact
-
-                    rival = self.competitor_map.get(target)
-                    if rival and 'spillover' in event:
-                        daily_sentiment[rival] = event['spillover']
-            
-            for event in self.market_events:
-                if event['day'] == day:
-                    impact = event['impact']
-
-                    if event.get('target') == 'market':
-                        for stock in self.stocks:
-                            daily_sentiment[stock] += impact
-                    elif 'stock' in event:
-                        daily_sentiment[event['stock']] += impact
-            
-            for stock in self.stocks:
-                if stock not in daily_sentiment:
-                    daily_sentiment[stock] = np.random.normal(0, self.daily_vol)
-            
-            for stock in self.stocks:
-                daily_sentiment[stock] = np.clip(daily_sentiment[stock], -1, 1)
-
-            sentiment_series.append(daily_sentiment)
-
-        return sentiment_series
-                        
+        self.minutes_per_day = minutes_per_day or config.get('minutes_per_day', 390)
 
-    def get_sentiment(self, day, minute = None):
+        #Per-day streams are derived from one draw of `rng`
+        self.root_seed = int(ensure_rng(rng).integers(2**63))
+        self.cached_day = None
+        self.cached_series = None
+        self.neutral = np.zeros(len(self.stocks))
+        self.neutral.flags.writeable = False
+
+    def market_events_on(self, day):
+        return self.calendar.on_day(day, 'market')
+
+    def _base_sentiment(self, day, rng):
+        '''Sentiment every symbol opens the day with, before events.'''
+        if self.mode == 'neutral':
+            return np.zeros(len(self.stocks))
+
+        base = np.clip(rng.normal(0, self.daily_vol, len(self.stocks)), -1, 1)
+        if self.mode == 'scripted' and day in self.shock_days and self.stocks:
+            base[0] = self.shock_magnitude
+            #Inject positive sentiment for competitor
+            rival = self.symbol_index.get(self.competitor_map.get(self.stocks[0]))
+            if rival is not None:
+                base[rival] = abs(self.shock_magnitude)
+        return base
+
+    def _generate_day(self, day):
+        '''Returns the minutes x symbols sentiment of one day.'''
+        rng = np.random.default_rng((self.root_seed, day))
+        series = np.repeat(self._base_sentiment(day, rng)[np.newaxis, :], self.minutes_per_day, axis = 0)
+
+        for event in self.calendar.on_day(day, 'breaking'):
+            col = self.symbol_index.get(event['stock'])
+            if col is None:
+                continue
+            minute = event.get('minute', 0)
+            series[minute:, col] = event['impact']
+
+            rival = self.symbol_index.get(self.competitor_map.get(event['stock']))
+            if rival is not None and 'spillover' in event:
+                series[minute:, rival] = event['spillover']
+
+        for event in self.calendar.on_day(day, 'market'):
+            minute = event.get('minute', 0)
+            if event.get('target') == 'market':
+                series[minute:] += event['impact']
+            elif event.get('stock') in self.symbol_index:
+                series[minute:, self.symbol_index[event['stock']]] += event['impact']
+
+        np.clip(series, -1, 1, out = series)
+        series.flags.writeable = False
+        return series
+
+    def day_sentiment(self, day):
+        '''minutes x symbols array for `day`; the latest day is kept in memory.'''
+        if day != self.cached_day:
+            self.cached_series = self._generate_day(day)
+            self.cached_day = day
+        return self.cached_series
+
+    def get_sentiment_vector(self, day, minute = 0):
+        '''Read-only view of the sentiment per symbol at (day, minute).'''
         if 0 <= day < self.num_days:
-            return self.sentiment_series[day]
-        return {stock: 0.0 for stock in self.stocks}
-        
\ No newline at end of file
+            return self.day_sentiment(day)[minute or 0]
+        return self.neutral
+
+    def get_sentiment(self, day, minute = None):
+        return dict(zip(self.stocks, self.get_sentiment_vector(day, minute).tolist()))
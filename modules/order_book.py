@@ -0,0 +1,76 @@
+# Per-symbol limit order book with price-time priority
+
+import heapq
+from collections import deque
+
+from modules.orders import SIDE_BUY, SIDE_SELL
+
+class OrderBook:
+    '''
+    Price levels are kept in two heaps (bids stored as negative prices) and each
+    level holds a FIFO queue of order ids. Cancels are lazy: the order is dropped
+    from `self.orders` and its queue entry is skipped the next time the level is
+    inspected, so insert and cancel are both O(log n).
+    '''
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = []
+        self.asks = []
+        self.bid_levels = {}
+        self.ask_levels = {}
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order_id, order):
+        '''Rest a RestingOrder on the book at its limit price.'''
+        price = order.price
+        if order.side == SIDE_BUY:
+            heap, levels, key = self.bids, self.bid_levels, -price
+        else:
+            heap, levels, key = self.asks, self.ask_levels, price
+
+        level = levels.get(price)
+        if level is None:
+            level = deque()
+            levels[price] = level
+            heapq.heappush(heap, key)
+        level.append(order_id)
+        self.orders[order_id] = order
+
+    def cancel(self, order_id):
+        return self.orders.pop(order_id, None) is not None
+
+    def best(self, side):
+        '''
+        Returns (price, queue) for the best level on `side`, or None if that
+        side is empty. Cancelled ids at the head of the queue are discarded.
+        '''
+        if side == SIDE_BUY:
+            heap, levels, sign = self.bids, self.bid_levels, -1
+        else:
+            heap, levels, sign = self.asks, self.ask_levels, 1
+
+        while heap:
+            price = sign * heap[0]
+            level = levels[price]
+            while level and level[0] not in self.orders:
+                level.popleft()
+            if level:
+                return price, level
+            del levels[price]
+            heapq.heappop(heap)
+        return None
+
+    def pop_front(self, level):
+        '''Removes the fully filled order at the head of a level.'''
+        order_id = level.popleft()
+        return self.orders.pop(order_id, None)
+
+    def clear(self):
+        self.bids = []
+        self.asks = []
+        self.bid_levels = {}
+        self.ask_levels = {}
+        self.orders = {}
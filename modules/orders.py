@@ -0,0 +1,96 @@
+# Compact order and trade records
+
+import numpy as np
+
+#Integer side codes
+SIDE_BUY = 0
+SIDE_SELL = 1
+SIDE_NAMES = ('buy', 'sell')
+
+#One row per order; `symbol` is the column index into the symbol list and a
+#NaN price marks a market order
+ORDER_DTYPE = np.dtype([
+    ('agent_id', np.int64),
+    ('symbol', np.int16),
+    ('side', np.int8),
+    ('quantity', np.int64),
+    ('price', np.float64)
+])
+
+TRADE_DTYPE = np.dtype([
+    ('symbol', np.int16),
+    ('price', np.float64),
+    ('quantity', np.int64),
+    ('buyer_id', np.int64),
+    ('seller_id', np.int64),
+    ('fee_paid', np.float64)
+])
+
+class RecordBuffer:
+    '''
+    Preallocated structured array that records are written into. `reset()`
+    rewinds the write position without freeing memory, so a buffer reused
+    every minute (or every day) allocates only when it has to grow.
+    '''
+    def __init__(self, dtype, capacity = 4096):
+        self.data = np.zeros(capacity, dtype = dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def reset(self):
+        self.size = 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed > len(self.data):
+            grown = np.zeros(max(needed, 2 * len(self.data)), dtype = self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def append(self, *fields):
+        if self.size == len(self.data):
+            self._reserve(1)
+        self.data[self.size] = fields
+        self.size += 1
+
+    def extend(self, records = None, **columns):
+        '''Writes either a structured array or equal-length column arrays.'''
+        count = len(records) if records is not None else len(next(iter(columns.values())))
+        self._reserve(count)
+        target = self.data[self.size:self.size + count]
+        if records is not None:
+            target[:] = records
+        else:
+            for name, values in columns.items():
+                target[name] = values
+        self.size += count
+
+    def view(self):
+        '''Zero-copy view of the records written since the last reset.'''
+        return self.data[:self.size]
+
+class OrderBuffer(RecordBuffer):
+    def __init__(self, capacity = 4096):
+        super().__init__(ORDER_DTYPE, capacity)
+
+    def append(self, agent_id, symbol, side, quantity, price = np.nan):
+        if self.size == len(self.data):
+            self._reserve(1)
+        self.data[self.size] = (agent_id, symbol, side, quantity, np.nan if price is None else price)
+        self.size += 1
+
+class TradeBuffer(RecordBuffer):
+    def __init__(self, capacity = 4096):
+        super().__init__(TRADE_DTYPE, capacity)
+
+class RestingOrder:
+    '''An order waiting on the book.'''
+    __slots__ = ('agent_id', 'side', 'quantity', 'price')
+
+    def __init__(self, agent_id, side, quantity, price):
+        self.agent_id = agent_id
+        self.side = side
+        self.quantity = quantity
+        self.price = price
@@ -0,0 +1,176 @@
+# Typed, columnar output files for the simulation logs
+
+import os
+import shutil
+
+import pandas as pd
+
+#Table name -> (logging flag that turns it on or off, columns stored dictionary-encoded)
+TABLES = {
+    'daily_ohlc': ('record_ohlc', ('stock',)),
+    'intraday_bars': ('record_intraday_bars', ('stock',)),
+    'agent_wealth': ('record_agent_wealth', ('strategy',)),
+    'strategy_wealth': ('record_agent_wealth', ('strategy',)),
+    'sentiment_log': ('record_sentiment', ('stock',)),
+    'market_maker_trades': ('record_market_maker_trades', ('stock', 'role')),
+    'strategy_stock_profit_log': ('record_strategy_profit', ('strategy', 'stock')),
+    'strategy_switch_log': ('record_strategy_switches', ('from', 'to')),
+    'trade_log': ('record_trades', ('stock',))
+}
+
+FORMATS = ('csv', 'parquet')
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow") from e
+
+def _partition(day):
+    #Zero-padded so directory order is day order
+    return f"day={int(day):05d}"
+
+class RunOutput:
+    '''
+    Writes the simulation logs of one run into `output_dir`.
+    - 'parquet': one dataset directory per table, hive-partitioned by day
+      (`agent_wealth/day=00003/part-0.parquet`), zstd-compressed, with the
+      strategy/stock columns of TABLES dictionary-encoded
+    - 'csv': one `<table>.csv` per table, appended to day by day
+    `record` maps the `record_*` flags of TABLES to booleans; a table whose
+    flag is missing is written. Rows are given as lists of dicts or as
+    DataFrames and must carry a `day` column unless `day` is passed.
+    '''
+    def __init__(self, output_dir = ".", file_format = 'csv', record = None, compression = 'zstd'):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown output format: {file_format}")
+        if file_format == 'parquet':
+            _require_pyarrow()
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.record = dict(record or {})
+        self.compression = compression
+        os.makedirs(self.output_dir, exist_ok = True)
+
+    def enabled(self, table):
+        return self.record.get(TABLES[table][0], True)
+
+    def path(self, table):
+        '''Dataset directory (parquet) or file (csv) of `table`.'''
+        if self.file_format == 'parquet':
+            return os.path.join(self.output_dir, table)
+        return os.path.join(self.output_dir, f"{table}.csv")
+
+    def position(self):
+        '''Where the tables had got to; CSV appends are unbuffered, so this is exact.'''
+        sizes = {}
+        if self.file_format == 'csv':
+            sizes = {table: os.path.getsize(self.path(table)) for table in TABLES
+                     if table != 'trade_log' and os.path.exists(self.path(table))}
+        return {'path': os.path.abspath(self.output_dir), 'format': self.file_format, 'bytes': sizes}
+
+    def begin(self, start_day = 0, resume = None):
+        '''
+        Prepares the tables for a run starting at `start_day`. Resuming in the
+        directory of `resume` (a `position()` taken at that day) keeps the
+        earlier days: parquet partitions before `start_day`, CSV files cut
+        back to their recorded size. Anything else is dropped, so a run
+        resumed elsewhere only holds the days it simulates. The CSV trade log
+        is cut back by its own writer.
+        '''
+        same_run = (resume is not None and resume['path'] == os.path.abspath(self.output_dir)
+                    and resume['format'] == self.file_format)
+        if not same_run:
+            start_day = 0
+
+        for table in TABLES:
+            path = self.path(table)
+            if self.file_format == 'csv':
+                if table == 'trade_log' or not os.path.exists(path):
+                    continue
+                size = resume['bytes'].get(table) if same_run else None
+                if size is not None and os.path.getsize(path) >= size:
+                    with open(path, 'r+b') as f:
+                        f.truncate(size)
+                else:
+                    os.remove(path)
+            elif os.path.isdir(path):
+                for entry in os.listdir(path):
+                    if entry.startswith('day=') and int(entry[4:]) >= start_day:
+                        shutil.rmtree(os.path.join(path, entry))
+
+    def write(self, table, rows, day = None):
+        '''Appends rows to `table`; with `day`, they all belong to that day.'''
+        if not self.enabled(table) or len(rows) == 0:
+            return
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        if day is not None and 'day' not in df.columns:
+            df.insert(0, 'day', day)
+
+        if self.file_format == 'csv':
+            path = self.path(table)
+            df.to_csv(path, mode = 'a', header = not os.path.exists(path), index = False)
+        elif day is not None:
+            self._write_partition(table, df, day)
+        else:
+            for day, part in df.groupby('day', sort = True):
+                self._write_partition(table, part, day)
+
+    def _write_partition(self, table, df, day):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        #The day lives in the directory name
+        data = pa.Table.from_pandas(df.drop(columns = 'day'), preserve_index = False)
+        for name in TABLES[table][1]:
+            if name in data.column_names and not pa.types.is_dictionary(data.schema.field(name).type):
+                data = data.set_column(data.schema.get_field_index(name), name,
+                                       pc.dictionary_encode(data.column(name)))
+
+        directory = os.path.join(self.path(table), _partition(day))
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        pq.write_table(data, os.path.join(directory, "part-0.parquet"), compression = self.compression)
+
+def _locate(output_dir, table):
+    '''(path, format) of a table written by RunOutput, parquet first.'''
+    directory = os.path.join(output_dir, table)
+    if os.path.isdir(directory):
+        return directory, 'parquet'
+    path = os.path.join(output_dir, f"{table}.csv")
+    if os.path.exists(path):
+        return path, 'csv'
+    return None, None
+
+def has_table(output_dir, table):
+    return _locate(output_dir, table)[0] is not None
+
+def open_table(output_dir, table):
+    '''
+    Lazy pyarrow Dataset over a table in either format. Nothing is read
+    until it is scanned, and a scan only reads the columns and day
+    partitions it asks for.
+    '''
+    import pyarrow.dataset as ds
+
+    path, file_format = _locate(output_dir, table)
+    if path is None:
+        raise FileNotFoundError(f"No {table} table in {output_dir}")
+    if file_format == 'parquet':
+        return ds.dataset(path, format = 'parquet', partitioning = 'hive')
+    return ds.dataset(path, format = 'csv')
+
+def read_table(output_dir, table, columns = None, days = None):
+    '''
+    Reads a table into a DataFrame, keeping only `columns` (all by default)
+    and the rows of `days` (an iterable of day indices, all by default).
+    Dictionary-encoded columns come back as pandas categoricals.
+    '''
+    import pyarrow.dataset as ds
+
+    dataset = open_table(output_dir, table)
+    row_filter = ds.field('day').isin([int(d) for d in days]) if days is not None else None
+    data = dataset.to_table(columns = list(columns) if columns is not None else None, filter = row_filter)
+    return data.to_pandas()
@@ -0,0 +1,81 @@
+# Rolling minute-level price history kept by the exchange
+
+import numpy as np
+
+class PriceHistory:
+    '''
+    Fixed-capacity ring buffer of the reference price of every symbol, one
+    entry per minute.
+    - Each price is written twice (at slot and slot + capacity), so the last
+      n prices of a symbol are always one contiguous slice: `window` returns
+      a view, never a copy.
+    - Running prefix sums give the mean of any lookback in O(1); price
+      ratios of symbol pairs get the same treatment once a pair is asked for.
+    Symbols are addressed by column (the exchange's symbol order).
+    '''
+    def __init__(self, symbols, capacity = 1024):
+        self.symbols = list(symbols)
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.capacity = capacity
+        self.count = 0
+        self.data = np.zeros((len(self.symbols), 2 * capacity))
+        #sums[:, t % (capacity + 1)] = sum of the first t prices
+        self.sums = np.zeros((len(self.symbols), capacity + 1))
+        self.ratio_sums = {}
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, prices):
+        '''Records one minute of prices (a sequence in column order).'''
+        prices = np.asarray(prices, dtype = np.float64)
+        cap = self.capacity
+        slot = self.count % cap
+        self.data[:, slot] = prices
+        self.data[:, slot + cap] = prices
+
+        prev, nxt = self.count % (cap + 1), (self.count + 1) % (cap + 1)
+        self.sums[:, nxt] = self.sums[:, prev] + prices
+        for (a, b), sums in self.ratio_sums.items():
+            sums[nxt] = sums[prev] + prices[a] / prices[b]
+        self.count += 1
+
+    def _check(self, n):
+        if n > len(self):
+            raise ValueError(f"Lookback {n} exceeds the {len(self)} prices held")
+
+    def window(self, col, n = None):
+        '''Read-only view of the last `n` prices of column `col`, oldest first.'''
+        n = len(self) if n is None else n
+        self._check(n)
+        end = (self.count - 1) % self.capacity + self.capacity + 1
+        view = self.data[col, end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def mean(self, col, n):
+        '''Mean of the last `n` prices of column `col`.'''
+        self._check(n)
+        ring = self.capacity + 1
+        return (self.sums[col, self.count % ring] - self.sums[col, (self.count - n) % ring]) / n
+
+    def ratio_mean(self, a, b, n):
+        '''Mean of price[a] / price[b] over the last `n` minutes.'''
+        self._check(n)
+        sums = self.ratio_sums.get((a, b))
+        if sums is None:
+            sums = self._track_ratio(a, b)
+        ring = self.capacity + 1
+        return (sums[self.count % ring] - sums[(self.count - n) % ring]) / n
+
+    def _track_ratio(self, a, b):
+        '''Starts prefix sums for a pair, backfilled from the prices already held.'''
+        held = len(self)
+        ring = self.capacity + 1
+        sums = np.zeros(ring)
+        ratios = self.window(a, held) / self.window(b, held)
+        start = self.count - held
+        sums[np.arange(start + 1, self.count + 1) % ring] = np.cumsum(ratios)
+        sums[start % ring] = 0.0
+        self.ratio_sums[(a, b)] = sums
+        return sums
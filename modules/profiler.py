@@ -0,0 +1,188 @@
+# Opt-in phase timers and profiler capture for the simulation loop
+
+import os
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+PHASES = ('decide', 'submit', 'match', 'log', 'persist', 'push')
+
+class _PhaseTimer:
+    '''
+    Reusable context manager adding its elapsed time to one phase. Phases
+    nest: while an inner phase runs, the outer one is paused, so no time
+    is counted twice.
+    '''
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        now = time.perf_counter()
+        active = self.profiler.active
+        if active:
+            outer = active[-1]
+            self.profiler.add(outer.name, now - outer.start)
+        active.append(self)
+        self.start = now
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        active = self.profiler.active
+        self.profiler.add(self.name, now - active.pop().start)
+        if active:
+            active[-1].start = now
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+class NullProfiler:
+    '''Stand-in used when profiling is off; every hook is a no-op.'''
+    enabled = False
+    _timer = _NullTimer()
+
+    def phase(self, name):
+        return self._timer
+
+    def add(self, name, seconds):
+        pass
+
+    def record_minute(self, orders):
+        pass
+
+    def record_strategy(self, name, decisions, orders, seconds):
+        pass
+
+    def start_day(self, day):
+        pass
+
+    def end_day(self, day, trades = 0):
+        pass
+
+    def finish(self, output_dir = "."):
+        pass
+
+class PhaseProfiler:
+    '''
+    Accumulates wall time per phase (decide, submit, match, log, persist,
+    push), decision time and order counts per strategy class, and orders
+    per minute. Prints one line per day and writes `profile_phases.csv` and
+    `profile_strategies.csv` at the end of the run.
+
+    `capture_days = (first, last)` additionally runs cProfile (or
+    pyinstrument with `capture_tool = 'pyinstrument'`) over those days,
+    inclusive.
+    '''
+    enabled = True
+
+    def __init__(self, capture_days = None, capture_tool = 'cprofile', output_dir = "."):
+        if capture_tool not in ('cprofile', 'pyinstrument'):
+            raise ValueError(f"Unknown capture tool: {capture_tool}")
+        self.capture_days = tuple(capture_days) if capture_days else None
+        self.capture_tool = capture_tool
+        self.output_dir = output_dir
+        self.capture = None
+
+        self.timers = {name: _PhaseTimer(self, name) for name in PHASES}
+        #Timers entered and not yet exited, innermost last
+        self.active = []
+        self.totals = defaultdict(float)
+        self.day_phases = defaultdict(float)
+        self.day_minute_orders = []
+        self.day_strategies = defaultdict(lambda: [0, 0, 0.0])
+        self.phase_rows = []
+        self.strategy_rows = []
+
+    def phase(self, name):
+        return self.timers[name]
+
+    def add(self, name, seconds):
+        self.day_phases[name] += seconds
+        self.totals[name] += seconds
+
+    def record_minute(self, orders):
+        self.day_minute_orders.append(orders)
+
+    def record_strategy(self, name, decisions, orders, seconds):
+        stats = self.day_strategies[name]
+        stats[0] += decisions
+        stats[1] += orders
+        stats[2] += seconds
+
+    def start_day(self, day):
+        self.day_phases.clear()
+        self.day_minute_orders.clear()
+        self.day_strategies.clear()
+        self.day_start = time.perf_counter()
+        if self.capture_days and day == self.capture_days[0]:
+            self._start_capture()
+
+    def end_day(self, day, trades = 0):
+        if self.capture is not None and day == self.capture_days[1]:
+            self._stop_capture()
+
+        elapsed = time.perf_counter() - self.day_start
+        minute_orders = self.day_minute_orders or [0]
+        row = {'day': day, **{name: self.day_phases[name] for name in PHASES}, 'total': elapsed,
+               'orders': sum(minute_orders), 'trades': trades,
+               'orders_per_minute_mean': sum(minute_orders) / len(minute_orders),
+               'orders_per_minute_max': max(minute_orders)}
+        self.phase_rows.append(row)
+        for name, (decisions, orders, seconds) in self.day_strategies.items():
+            self.strategy_rows.append({'day': day, 'strategy': name, 'decisions': decisions,
+                                       'orders': orders, 'seconds': seconds})
+
+        phases = " | ".join(f"{name} {row[name]:.2f}s" for name in PHASES)
+        print(f"⏱️ Day {day + 1}: {phases} | total {elapsed:.2f}s | "
+              f"{row['orders_per_minute_mean']:,.0f} orders/min (max {row['orders_per_minute_max']:,})")
+
+    def finish(self, output_dir = None):
+        '''Stops a capture still running and writes the per-day reports.'''
+        output_dir = output_dir or self.output_dir
+        if self.capture is not None:
+            self._stop_capture()
+        if self.phase_rows:
+            pd.DataFrame(self.phase_rows).to_csv(os.path.join(output_dir, "profile_phases.csv"), index = False)
+        if self.strategy_rows:
+            pd.DataFrame(self.strategy_rows).to_csv(os.path.join(output_dir, "profile_strategies.csv"), index = False)
+
+        phases = " | ".join(f"{name} {self.totals[name]:.2f}s" for name in PHASES)
+        print(f"⏱️ Run totals: {phases}")
+
+    def _capture_name(self):
+        first, last = self.capture_days
+        return os.path.join(self.output_dir, f"profile_days_{first}-{last}")
+
+    def _start_capture(self):
+        if self.capture_tool == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.capture = Profiler()
+            self.capture.start()
+        else:
+            import cProfile
+            self.capture = cProfile.Profile()
+            self.capture.enable()
+
+    def _stop_capture(self):
+        name = self._capture_name()
+        if self.capture_tool == 'pyinstrument':
+            self.capture.stop()
+            with open(f"{name}.txt", 'w') as f:
+                f.write(self.capture.output_text())
+        else:
+            import pstats
+            self.capture.disable()
+            self.capture.dump_stats(f"{name}.prof")
+            with open(f"{name}.txt", 'w') as f:
+                pstats.Stats(self.capture, stream = f).sort_stats('cumulative').print_stats(40)
+        self.capture = None
+        print(f"✅ Saved profile of days {self.capture_days[0]}-{self.capture_days[1]} to {name}.txt")
@@ -0,0 +1,282 @@
+# Background delivery of simulation updates to the API
+
+import gzip
+import io
+import json
+import os
+import threading
+from collections import deque
+from itertools import count
+
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+#Responses worth retrying; other errors are reported and the update skipped
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+class DeltaPublisher:
+    '''
+    Posts payloads to the API from a worker thread so the simulation loop
+    never waits on HTTP. Updates wait in one ordered backlog and each
+    endpoint receives them in the order they were published.
+    - `publish` never blocks: at most `queue_size` updates, waiting or
+      being posted, are held in memory; further ones are written to `spill_dir` (or
+      dropped when it is None) and read back when their turn comes. Spill
+      files belong to one run: any found there at start are deleted.
+    - Up to `batch_size` updates are taken at once and those for the same
+      endpoint merged into a single post.
+    - Posts reuse pooled connections of one requests.Session; bodies of
+      `compress_min_bytes` or more are gzipped (None turns this off).
+    - A post that fails on a connection error, timeout, 429 or 5xx is
+      retried `retries` times, waiting `backoff` seconds and doubling up
+      to `backoff_max`. If it still fails it goes back to the head of the
+      backlog, with the rest of its batch, and the worker pauses for
+      `backoff_max`; any other error is reported and the update skipped.
+
+    Row batches go out in `wire_format`:
+    - 'rows': JSON list of row objects (validated row by row by the API)
+    - 'columns': {"columns": {name: [values]}} (validated once per batch)
+    - 'arrow': Arrow IPC stream (requires pyarrow)
+    '''
+    def __init__(self, base_url = "http://localhost:8000", timeout = 10, wire_format = 'columns',
+                 queue_size = 256, spill_dir = None, batch_size = 32, compress_min_bytes = 1024,
+                 retries = 5, backoff = 0.5, backoff_max = 30.0, close_timeout = 5.0):
+        if wire_format not in ('rows', 'columns', 'arrow'):
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.wire_format = wire_format
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.compress_min_bytes = compress_min_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.close_timeout = close_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        #Oldest first: (endpoint, payload) tuples held in memory, or paths of spill files
+        self.backlog = deque()
+        self.in_memory = 0
+        self.ready = threading.Condition()
+        self.spill_dir = spill_dir
+        self.spill_ids = count()
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok = True)
+            stale = [f for f in os.listdir(spill_dir) if f.endswith('.spill')]
+            for name in stale:
+                os.remove(os.path.join(spill_dir, name))
+            if stale:
+                print(f"⚠️ Discarded {len(stale)} undelivered API updates of an earlier run in {spill_dir}")
+
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self.aborted = threading.Event()
+        self.thread = threading.Thread(target = self._run, daemon = True)
+        self.thread.start()
+
+    def publish(self, endpoint, payload):
+        '''Adds a payload for `endpoint` to the backlog; spills or drops it if memory is full.'''
+        with self.ready:
+            if self.in_memory < self.queue_size:
+                self.backlog.append((endpoint, payload))
+                self.in_memory += 1
+            elif self.spill_dir is not None:
+                self.backlog.append(self._spill(endpoint, payload))
+            else:
+                if not self.dropped:
+                    print("⚠️ API publisher is falling behind; dropping updates")
+                self.dropped += 1
+                return
+            self.ready.notify()
+
+    def publish_frame(self, endpoint, frame):
+        '''Queues a DataFrame batch, encoded in the publisher's wire format.'''
+        categorical = [name for name in frame.columns if isinstance(frame[name].dtype, pd.CategoricalDtype)]
+        if categorical:
+            frame = frame.astype({name: object for name in categorical})
+        if self.wire_format == 'rows':
+            self.publish(endpoint, frame.to_dict('records'))
+        elif self.wire_format == 'columns':
+            self.publish(endpoint, {'columns': {name: frame[name].tolist() for name in frame.columns}})
+        else:
+            import pyarrow as pa
+            sink = io.BytesIO()
+            table = pa.Table.from_pandas(frame, preserve_index = False)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            self.publish(endpoint, sink.getvalue())
+
+    def _spill(self, endpoint, payload):
+        '''Writes an update to a spill file: a JSON header line, then the JSON or Arrow body.'''
+        path = os.path.join(self.spill_dir, f"{next(self.spill_ids):08d}.spill")
+        if isinstance(payload, bytes):
+            kind, body = 'arrow', payload
+        else:
+            kind, body = 'json', json.dumps(payload).encode()
+        with open(path, 'wb') as f:
+            f.write(json.dumps({'endpoint': endpoint, 'kind': kind}).encode() + b"\n")
+            f.write(body)
+        return path
+
+    def _load(self, entry):
+        if not isinstance(entry, str):
+            return entry
+        with open(entry, 'rb') as f:
+            header = json.loads(f.readline())
+            body = f.read()
+        os.remove(entry)
+        return header['endpoint'], body if header['kind'] == 'arrow' else json.loads(body)
+
+    def _take(self):
+        '''
+        Up to `batch_size` of the oldest updates, and how many of them were
+        held in memory; waits briefly when there are none. Those memory
+        slots stay taken until the batch is delivered or requeued.
+        '''
+        with self.ready:
+            if not self.backlog:
+                self.ready.wait(0.1)
+            entries = []
+            while self.backlog and len(entries) < self.batch_size:
+                entries.append(self.backlog.popleft())
+        slots = sum(not isinstance(entry, str) for entry in entries)
+        return [self._load(entry) for entry in entries], slots
+
+    def _requeue(self, items, slots):
+        '''
+        Puts undelivered updates back at the head of the backlog, in order.
+        The first `slots` keep the memory slots of their batch; the rest are
+        spilled again (without `spill_dir` every item of a batch had a slot).
+        '''
+        entries = [item if i < slots else self._spill(*item) for i, item in enumerate(items)]
+        with self.ready:
+            self.backlog.extendleft(reversed(entries))
+            self.in_memory -= slots - min(slots, len(items))
+
+    def _release(self, slots):
+        with self.ready:
+            self.in_memory -= slots
+
+    def _run(self):
+        while not self.aborted.is_set():
+            items, slots = self._take()
+            if not items:
+                if self.stopping.is_set():
+                    return
+                continue
+            merged = merge_payloads(items)
+            for i, (endpoint, payload) in enumerate(merged):
+                if not self._deliver(endpoint, payload):
+                    self._requeue(merged[i:], slots)
+                    #The API looks unreachable: give it time before the next attempt
+                    self.aborted.wait(self.backoff_max)
+                    break
+            else:
+                self._release(slots)
+
+    def _deliver(self, endpoint, payload):
+        '''Posts one update; False if it should be tried again later.'''
+        url = f"{self.base_url}{endpoint}"
+        if isinstance(payload, bytes):
+            body, headers = payload, {'Content-Type': ARROW_STREAM}
+        else:
+            body, headers = json.dumps(payload).encode(), {'Content-Type': "application/json"}
+        if self.compress_min_bytes is not None and len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body, compresslevel = 6)
+            headers['Content-Encoding'] = "gzip"
+
+        error = None
+        for attempt in range(self.retries + 1):
+            #Closing cuts the backoff short; the update stays in the backlog
+            if self.aborted.wait(min(self.backoff_max, self.backoff * 2 ** (attempt - 1)) if attempt else 0):
+                return False
+            try:
+                response = self.session.post(url, data = body, headers = headers, timeout = self.timeout)
+            except requests.RequestException as e:
+                error = e
+                continue
+            if response.status_code < 400:
+                self.delivered += 1
+                return True
+            error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUS:
+                self.failed += 1
+                print(f"⚠️ Failed to push {endpoint}: {error}")
+                return True
+        self.failed += 1
+        print(f"⚠️ Failed to push {endpoint}: {error}")
+        return False
+
+    def close(self, timeout = None):
+        '''
+        Delivers the backlog, waiting at most `timeout` seconds
+        (`close_timeout` by default); whatever is left then is discarded
+        with its spill files.
+        '''
+        self.stopping.set()
+        with self.ready:
+            self.ready.notify()
+        self.thread.join(self.close_timeout if timeout is None else timeout)
+        if self.thread.is_alive():
+            #Stops after the post in flight
+            self.aborted.set()
+            self.thread.join()
+        with self.ready:
+            left = len(self.backlog)
+            for entry in self.backlog:
+                if isinstance(entry, str):
+                    os.remove(entry)
+            self.backlog.clear()
+            self.in_memory = 0
+        self.session.close()
+
+        if self.failed or self.dropped or left:
+            print(f"⚠️ API publisher: {self.delivered} posts delivered, {self.failed} failed attempts, "
+                  f"{self.dropped} updates dropped, {left} not delivered")
+
+def merge_payloads(items):
+    '''
+    Merges (endpoint, payload) items per endpoint, keeping each endpoint's
+    order, where the payloads allow it: JSON row lists, column JSON with
+    the same columns and {key: [rows]} dicts (OHLC). Arrow streams are
+    sent as they are.
+    '''
+    merged = []
+    last = {}
+    for endpoint, payload in items:
+        index = last.get(endpoint)
+        if index is not None:
+            combined = _combine(merged[index][1], payload)
+            if combined is not None:
+                merged[index] = (endpoint, combined)
+                continue
+        last[endpoint] = len(merged)
+        merged.append((endpoint, payload))
+    return merged
+
+def _combine(a, b):
+    '''One payload with the rows of `a` followed by those of `b`, or None.'''
+    if isinstance(a, list) and isinstance(b, list):
+        return a + b
+    if not (isinstance(a, dict) and isinstance(b, dict)):
+        return None
+    if 'columns' in a or 'columns' in b:
+        if a.get('columns', {}).keys() != b.get('columns', {}).keys():
+            return None
+        return {'columns': {name: list(a['columns'][name]) + list(b['columns'][name]) for name in a['columns']}}
+    if not all(isinstance(rows, list) for rows in (*a.values(), *b.values())):
+        return None
+    combined = {key: list(rows) for key, rows in a.items()}
+    for key, rows in b.items():
+        combined.setdefault(key, []).extend(rows)
+    return combined
@@ -0,0 +1,20 @@
+# Seeded random streams shared by every component of a run
+
+import numpy as np
+
+#One independent stream per component; adding a name at the end keeps the
+#existing streams unchanged for a given seed
+STREAMS = ('agents', 'strategies', 'news', 'exchange', 'simulation')
+
+def spawn_rngs(seed = None):
+    '''
+    Returns {stream name: numpy Generator} derived from one root
+    SeedSequence. The same seed reproduces a run bit for bit; `seed = None`
+    draws fresh OS entropy.
+    '''
+    children = np.random.SeedSequence(seed).spawn(len(STREAMS))
+    return {name: np.random.default_rng(child) for name, child in zip(STREAMS, children)}
+
+def ensure_rng(rng):
+    '''Components take an optional Generator; fall back to an unseeded one.'''
+    return rng if rng is not None else np.random.default_rng()
@@ -0,0 +1,116 @@
+# Builds and runs a full simulation from a config dict
+
+import os
+
+from modules.agent_factory import create_agent
+from modules.exchange import Exchange
+from modules.news import NewsGenerator
+from modules.simulation import Simulation
+from modules.rng import spawn_rngs
+from modules.profiler import PhaseProfiler
+from modules.scheduler import AgentScheduler
+from modules.checkpoint import read_meta, reseed
+from modules.sharding import ShardPool, ShardedSimulation
+
+def run_simulation(config, output_dir = None, api_url = "http://localhost:8000"):
+    '''
+    Builds agents, exchange and news from a config dict, runs the simulation
+    and writes its logs to `output_dir` (by default `logging.output_dir`).
+    Returns the finished Simulation. A `seed` key in the config makes the
+    run reproducible; `profiling.enabled` turns on the phase timers of
+    modules/profiler.py. `logging.format` and the `logging.record_*` flags
+    choose how and which log tables are written (see modules/output.py);
+    `wealth_detail`, `sentiment_encoding` and `keep_in_memory` how much
+    of each day is logged and whether it is also kept in memory.
+
+    `checkpoint.resume_from` continues a checkpointed run. The population is
+    rebuilt with the checkpoint's seed; if the config's seed differs, the
+    run continues on fresh streams from it (a fork of the checkpoint).
+
+    With `sharding.shards` above 1 the agents are split across worker
+    processes and only the exchange, news and logs run here (see
+    modules/sharding.py); such runs cannot be checkpointed. The `api`
+    section configures the background publisher (modules/publisher.py).
+    '''
+    log_config = config.get('logging', {})
+    if output_dir is None:
+        output_dir = log_config.get('output_dir', ".")
+    checkpoint = config.get('checkpoint', {})
+    resume_from = checkpoint.get('resume_from')
+    seed = config.get('seed')
+    if resume_from:
+        saved_config = read_meta(resume_from)['config'] or {}
+        build_seed = saved_config.get('seed', seed)
+    else:
+        build_seed = seed
+    rngs = spawn_rngs(build_seed)
+    num_agents = config["num_agents"]
+    num_days = config["num_days"]
+    minutes_per_day = config["minutes_per_day"]
+    stocks = config["stocks"]
+    sharding = config.get('sharding', {})
+    shards = sharding.get('shards', 1)
+    if shards > 1 and (resume_from or checkpoint.get('every_days')):
+        raise ValueError("Sharded runs cannot be checkpointed or resumed")
+
+    #setup
+    exchange = Exchange(stock_config = stocks,
+                        transaction_cost_rate = config.get('transaction_cost', {}).get('rate', 0.0005),
+                        keep_trade_log = log_config.get('keep_trade_log', True),
+                        trade_log_flush_size = log_config.get('trade_log_flush_size', 50_000),
+                        rng = rngs['exchange'],
+                        price_history_size = config.get('market', {}).get('price_history_size', 1024),
+                        bar_intervals = config.get('market', {}).get('bar_intervals', (1, 5)),
+                        minutes_per_day = minutes_per_day,
+                        matching = config.get('market', {}).get('matching', 'serial'),
+                        match_workers = config.get('market', {}).get('match_workers', 1))
+    news_generator = NewsGenerator(num_days, config_override = config, rng = rngs['news'])
+
+    profiling = config.get('profiling', {})
+    profiler = None
+    if profiling.get('enabled'):
+        profiler = PhaseProfiler(capture_days = profiling.get('capture_days'),
+                                 capture_tool = profiling.get('capture_tool', 'cprofile'),
+                                 output_dir = output_dir)
+
+    options = dict(
+        exchange = exchange,
+        news_generator = news_generator,
+        num_days = num_days,
+        minutes_per_day = minutes_per_day,
+        api_url = api_url,
+        api_format = config.get('api', {}).get('format', 'columns'),
+        api_options = {k: v for k, v in config.get('api', {}).items() if k != 'format'},
+        output_dir = output_dir,
+        profiler = profiler,
+        checkpoint_every = checkpoint.get('every_days'),
+        checkpoint_dir = checkpoint.get('dir', "checkpoints"),
+        config = config,
+        output_format = log_config.get('format', 'csv'),
+        record = {k: v for k, v in log_config.items() if k.startswith('record_')},
+        wealth_detail = log_config.get('wealth_detail', 'agents'),
+        sentiment_encoding = log_config.get('sentiment_encoding', 'full'),
+        keep_in_memory = log_config.get('keep_in_memory', False)
+    )
+
+    if shards > 1:
+        authkey = os.environ.get('SHARD_AUTHKEY')
+        with ShardPool(config, shards, address = (sharding.get('host', 'localhost'), sharding.get('port', 0)),
+                       authkey = authkey.encode() if authkey else None,
+                       spawn = sharding.get('spawn_workers', True)) as pool:
+            sim = ShardedSimulation(pool.connections, **options)
+            sim.run()
+        return sim
+
+    agents = create_agent(num_agents, config_override = config,
+                          rng = rngs['agents'], strategy_rng = rngs['strategies'])
+    scheduler = AgentScheduler.from_config(agents, config.get('scheduling'), rng = rngs['simulation'])
+    sim = Simulation(agent = agents, rng = rngs['simulation'], scheduler = scheduler, **options)
+
+    if resume_from:
+        sim.resume_from(resume_from)
+        if seed != build_seed:
+            reseed(sim, seed)
+
+    sim.run()
+    return sim
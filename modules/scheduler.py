@@ -0,0 +1,120 @@
+# Decides which agents act in each minute of a day
+
+import numpy as np
+
+from modules.rng import ensure_rng
+
+class AgentScheduler:
+    '''
+    Draws a whole day of activations at once from stable per-strategy index
+    arrays (positions in the agent list).
+
+    - Strategies listed in `strategy_rates` are drawn on their own, at that
+      share of their agents per minute; every other agent shares one pool,
+      from which `activation_rate` of all agents (not only of the pool) is
+      drawn, as the original per-minute sampling did. A rate of 1.0 or more
+      means always active (HFTs by default); those agents act last each
+      minute, in list order.
+    - `arrival = 'fixed'` activates exactly int(rate * base) agents per
+      minute, capped at the group size; `'poisson'` draws that count from a
+      Poisson distribution with the same mean.
+    Within a minute the drawn agents come in random order.
+    '''
+    #Bounds the minutes x agents random-key block drawn at once
+    max_keys = 4_000_000
+
+    def __init__(self, agents, rng = None, activation_rate = 0.1, strategy_rates = None, arrival = 'fixed'):
+        if arrival not in ('fixed', 'poisson'):
+            raise ValueError(f"Unknown arrival model: {arrival}")
+        self.rng = ensure_rng(rng)
+        self.arrival = arrival
+        self.agent_array = np.empty(len(agents), dtype = object)
+        self.agent_array[:] = agents
+
+        strategy_rates = {'hft': 1.0} if strategy_rates is None else dict(strategy_rates)
+        types = np.array([a.strategy_type for a in agents])
+        own = np.isin(types, list(strategy_rates))
+
+        #(positions, rate, base the rate applies to) per drawn group
+        self.groups = []
+        pooled = np.flatnonzero(~own)
+        if len(pooled):
+            self.groups.append((pooled, activation_rate, len(agents)))
+        always = []
+        for strategy, rate in strategy_rates.items():
+            members = np.flatnonzero(types == strategy)
+            if rate >= 1.0:
+                always.append(members)
+            elif len(members):
+                self.groups.append((members, rate, len(members)))
+        self.always = np.sort(np.concatenate(always)) if always else np.empty(0, dtype = np.int64)
+
+        self.positions = np.empty(0, dtype = np.int64)
+        self.offsets = np.zeros(1, dtype = np.int64)
+
+    @classmethod
+    def from_config(cls, agents, scheduling = None, rng = None):
+        '''Builds a scheduler from the `scheduling` section of the config.'''
+        scheduling = scheduling or {}
+        return cls(agents, rng = rng,
+                   activation_rate = scheduling.get('activation_rate', 0.1),
+                   strategy_rates = scheduling.get('strategy_rates'),
+                   arrival = scheduling.get('arrival', 'fixed'))
+
+    def _counts(self, size, rate, base, minutes):
+        if self.arrival == 'poisson':
+            return np.minimum(self.rng.poisson(rate * base, minutes), size)
+        return np.full(minutes, min(int(rate * base), size))
+
+    def _sample(self, members, counts):
+        '''
+        Random ordered subsets of `members`, counts[m] for minute m. Returns
+        (minute, position) arrays, grouped by minute.
+        '''
+        n = len(members)
+        k = int(counts.max()) if len(counts) else 0
+        minute_ids, picks = [], []
+        if k == 0:
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64)
+
+        chunk = max(1, self.max_keys // n)
+        for start in range(0, len(counts), chunk):
+            block = counts[start:start + chunk]
+            keys = self.rng.random((len(block), n))
+            #k smallest keys per minute, sorted by key: a uniformly random ordered sample
+            idx = np.argpartition(keys, k - 1, axis = 1)[:, :k] if k < n else np.argsort(keys, axis = 1)
+            order = np.argsort(np.take_along_axis(keys, idx, axis = 1), axis = 1)
+            idx = np.take_along_axis(idx, order, axis = 1)
+            keep = np.arange(k) < block[:, np.newaxis]
+            picks.append(members[idx[keep]])
+            minute_ids.append(np.repeat(np.arange(start, start + len(block)), block))
+        return np.concatenate(minute_ids), np.concatenate(picks)
+
+    def plan_day(self, minutes):
+        '''Draws every minute's activations for the coming day.'''
+        minute_ids, picks = [], []
+        for members, rate, base in self.groups:
+            ids, pos = self._sample(members, self._counts(len(members), rate, base, minutes))
+            minute_ids.append(ids)
+            picks.append(pos)
+
+        if len(self.groups) > 1:
+            minute_ids, picks = np.concatenate(minute_ids), np.concatenate(picks)
+            #Interleave groups randomly within each minute
+            order = np.lexsort((self.rng.random(len(picks)), minute_ids))
+            minute_ids, picks = minute_ids[order], picks[order]
+        elif self.groups:
+            minute_ids, picks = minute_ids[0], picks[0]
+        else:
+            minute_ids = picks = np.empty(0, dtype = np.int64)
+
+        self.positions = picks
+        self.offsets = np.searchsorted(minute_ids, np.arange(minutes + 1))
+
+    def active_positions(self, minute):
+        drawn = self.positions[self.offsets[minute]:self.offsets[minute + 1]]
+        return np.concatenate((drawn, self.always)) if len(self.always) else drawn
+
+    def active_agents(self, minute):
+        '''Agents acting in `minute` of the planned day, in activation order.'''
+        return self.agent_array[self.active_positions(minute)]
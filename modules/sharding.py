@@ -0,0 +1,330 @@
+# Sharded runs: agent partitions decide in worker processes, one process runs the exchange
+#
+# Each minute the exchange process sends every worker one MINUTE message
+# (prices, sentiment, the fills of its agents since the last message and
+# their settled cash) and gets back one ORDERS message with all orders of
+# its active agents. Messages are the binary batches of modules/wire.py
+# over multiprocessing.connection, so workers can run on other hosts:
+#
+#   SHARD_AUTHKEY=secret python -m modules.sharding --connect host:port --shard 1 --shards 4 --config config.yml
+#
+# With `sharding.spawn_workers` the workers are local processes instead.
+
+import argparse
+import os
+import threading
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from modules import wire
+from modules.agent_factory import create_agent
+from modules.agent_state import AgentStateStore, STRATEGY_NAMES
+from modules.indicators import IndicatorCache
+from modules.orders import ORDER_DTYPE, OrderBuffer
+from modules.price_history import PriceHistory
+from modules.rng import spawn_rngs
+from modules.scheduler import AgentScheduler
+from modules.simulation import Simulation, collect_orders
+
+def _receive(conn, kind):
+    '''Waits for the next message, which must be of `kind`; returns (header, arrays).'''
+    received, header, arrays = wire.unpack(conn.recv_bytes())
+    if received != kind:
+        raise RuntimeError(f"Expected message {kind} from the other process, got {received}")
+    return header, arrays
+
+def merge_orders(batches):
+    '''
+    Interleaves the shards' order batches into one submission order. Each
+    batch keeps its own (activation) order and batches are merged by
+    relative position, ties going to the lower shard, so the result does
+    not depend on which worker answered first.
+    '''
+    sizes = [len(batch) for batch in batches]
+    if not sum(sizes):
+        return np.empty(0, dtype = ORDER_DTYPE)
+    position = np.concatenate([(np.arange(n) + 0.5) / n for n in sizes])
+    shard = np.repeat(np.arange(len(batches)), sizes)
+    return np.concatenate(batches)[np.lexsort((shard, position))]
+
+class ShardWorker:
+    '''
+    One partition of the population (`create_agent(shard = ...)`) with
+    replicas of what its agents observe: the minute price history, its
+    indicator cache and the cash and holdings of its own agents, kept in
+    step from the messages of the exchange process.
+    '''
+    def __init__(self, config, shard, shards):
+        seed = config.get('seed')
+        rngs = spawn_rngs(None if seed is None else [seed, shard])
+        self.shard = shard
+        self.agents = create_agent(config['num_agents'], config_override = config, rng = rngs['agents'],
+                                   strategy_rng = rngs['strategies'], shard = (shard, shards))
+        self.store = AgentStateStore.of(self.agents)
+        self.rng = rngs['simulation']
+        self.scheduler = AgentScheduler.from_config(self.agents, config.get('scheduling'), rng = self.rng)
+        self.evolving_agents = [a for a in self.agents if hasattr(a, 'update_performance')]
+        self.minutes_per_day = config['minutes_per_day']
+
+        symbols = self.store.symbols
+        self.history = PriceHistory(symbols, capacity = config.get('market', {}).get('price_history_size', 1024))
+        self.indicators = IndicatorCache(self.history)
+        self.price_vector = None
+        self.orders = OrderBuffer()
+
+    def serve(self, conn):
+        '''Answers the exchange process until it sends STOP.'''
+        store = self.store
+        conn.send_bytes(wire.pack(wire.HELLO, (self.shard, len(store.symbols)),
+                                  store.agent_ids, store.strategy_codes, store.cash, store.holdings))
+        while True:
+            kind, header, arrays = wire.unpack(conn.recv_bytes())
+            if kind == wire.STOP:
+                conn.send_bytes(wire.pack(wire.SWITCHES, (), self.switches()))
+                return
+            if kind not in (wire.MINUTE, wire.DAY_END):
+                raise RuntimeError(f"Unexpected message {kind} from the exchange process")
+
+            day_idx, minute, history_count = header
+            prices, sentiment, rows, cash, fills = arrays
+            self.sync(prices, history_count, rows, cash, fills)
+            if kind == wire.MINUTE:
+                conn.send_bytes(wire.pack(wire.ORDERS, (), self.decide(minute, sentiment)))
+            else:
+                self.end_day(day_idx)
+                conn.send_bytes(wire.pack(wire.DAY_DONE, (), store.strategy_codes))
+
+    def sync(self, prices, history_count, rows, cash, fills):
+        '''Applies fills to holdings, takes the settled cash and catches up on prices.'''
+        store = self.store
+        store.cash[rows] = cash
+        if len(fills):
+            for side, sign in (('buyer_id', 1), ('seller_id', -1)):
+                local = np.fromiter((store.row_of.get(i, -1) for i in fills[side].tolist()),
+                                    dtype = np.int64, count = len(fills))
+                mine = local >= 0
+                np.add.at(store.holdings, (local[mine], fills['symbol'][mine]), sign * fills['quantity'][mine])
+
+        self.price_vector = np.array(prices)
+        while self.history.count < history_count:
+            self.history.append(self.price_vector)
+
+    def decide(self, minute, sentiment):
+        '''This minute's orders of the shard's active agents.'''
+        store = self.store
+        if minute == 0:
+            self.scheduler.plan_day(self.minutes_per_day)
+        sentiment = np.array(sentiment)
+        market_obs = {
+            'prices': dict(zip(store.symbols, self.price_vector.tolist())),
+            'symbol_index': store.symbol_index,
+            'price_history': self.history,
+            'indicators': self.indicators,
+            'sentiment': dict(zip(store.symbols, sentiment.tolist())),
+            'price_vector': self.price_vector,
+            'sentiment_vector': sentiment
+        }
+        return collect_orders(self.scheduler.active_agents(minute), market_obs, store, self.orders, rng = self.rng)
+
+    def end_day(self, day_idx):
+        wealth = self.store.wealth(self.price_vector)
+        for agent in self.evolving_agents:
+            agent.update_performance(float(wealth[self.store.row_of[agent.agent_id]]), day_idx)
+
+    def switches(self):
+        '''Strategy switches of the shard's evolving agents as SWITCH_DTYPE records.'''
+        index = {name: i for i, name in enumerate(STRATEGY_NAMES)}
+        log = [s for agent in self.evolving_agents for s in agent.strategy_switch_log]
+        return np.array([(s['agent_id'], s['day'], index[s['from']], index[s['to']]) for s in log],
+                        dtype = wire.SWITCH_DTYPE)
+
+def run_worker(address, authkey, shard, shards, config):
+    '''Connects to the exchange process at `address` and serves one shard.'''
+    conn = Client(address, authkey = authkey)
+    try:
+        ShardWorker(config, shard, shards).serve(conn)
+    except EOFError:
+        #The exchange process went away
+        pass
+    finally:
+        conn.close()
+
+class ShardPool:
+    '''
+    Listens on `address` for `shards` workers, starting them as local
+    processes with `spawn = True`. Without it, workers are started by hand
+    (`python -m modules.sharding`, possibly on other hosts) with the same
+    config and SHARD_AUTHKEY. Closing the pool closes the connections and
+    reaps local workers.
+    '''
+    def __init__(self, config, shards, address = ('localhost', 0), authkey = None, spawn = True):
+        if authkey is None:
+            if not spawn:
+                raise ValueError("Workers started by hand need a shared SHARD_AUTHKEY")
+            authkey = os.urandom(16)
+        self.config = config
+        self.shards = shards
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.spawn = spawn
+        self.listener = None
+        self.processes = []
+        self.connections = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self.listener = Listener(self.address, authkey = self.authkey)
+        if self.spawn:
+            context = get_context('spawn')
+            for shard in range(self.shards):
+                process = context.Process(target = run_worker, daemon = True,
+                                          args = (self.listener.address, self.authkey, shard, self.shards, self.config))
+                process.start()
+                self.processes.append(process)
+        else:
+            host, port = self.listener.address
+            print(f"🔌 Waiting for {self.shards} shard workers on {host}:{port}")
+
+        #Accepting blocks; watch for local workers that die before connecting
+        errors = []
+        def accept():
+            try:
+                for _ in range(self.shards):
+                    self.connections.append(self.listener.accept())
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target = accept, daemon = True)
+        thread.start()
+        while thread.is_alive():
+            thread.join(0.5)
+            failed = [p for p in self.processes if p.exitcode not in (None, 0)]
+            if failed:
+                self.close()
+                raise RuntimeError(f"Shard worker exited with code {failed[0].exitcode} before connecting")
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        for process in self.processes:
+            process.join(timeout = 10)
+            if process.is_alive():
+                process.terminate()
+
+class ShardedSimulation(Simulation):
+    '''
+    The exchange side of a sharded run. The agent store holds every shard's
+    agents (rows grouped by shard) and is the authority on cash and
+    holdings: fills settle here and each worker gets its agents' fills and
+    cash with the next message. Logging, output and the API push work as
+    in Simulation. Checkpoints are not supported.
+    '''
+    def __init__(self, connections, exchange, news_generator, **kwargs):
+        hellos = sorted((_receive(conn, wire.HELLO) + (conn,) for conn in connections), key = lambda h: h[0][0])
+        if [header[0] for header, _, _ in hellos] != list(range(len(hellos))):
+            raise ValueError("Shard workers must be numbered 0 to shards - 1, once each")
+        self.connections = [conn for _, _, conn in hellos]
+
+        sizes = [len(arrays[0]) for _, arrays, _ in hellos]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.shard_of_row = np.repeat(np.arange(len(sizes)), sizes)
+        store = AgentStateStore(int(self.offsets[-1]), exchange.symbols)
+        for ((_, num_symbols), (agent_ids, codes, cash, holdings), _), start, end in zip(hellos, self.offsets, self.offsets[1:]):
+            if num_symbols != len(store.symbols):
+                raise ValueError("Shard workers and exchange must trade the same symbols")
+            store.agent_ids[start:end] = agent_ids
+            store.strategy_codes[start:end] = codes
+            store.cash[start:end] = cash
+            store.holdings[start:end] = holdings.reshape(-1, num_symbols)
+        store.row_of = dict(zip(store.agent_ids.tolist(), range(len(store))))
+        if len(store.row_of) != len(store):
+            raise ValueError("Shard workers hold overlapping agent ids")
+
+        #Today's trades already sent to the workers
+        self.synced_trades = 0
+        super().__init__([], exchange, news_generator, store = store, **kwargs)
+
+    def checkpoint(self, path = None):
+        raise ValueError("Sharded runs cannot be checkpointed or resumed")
+
+    def resume_from(self, path):
+        raise ValueError("Sharded runs cannot be checkpointed or resumed")
+
+    def plan_day(self, day_idx):
+        #Workers plan their own day on its first minute
+        self.synced_trades = 0
+
+    def decide_minute(self, day_idx, minute):
+        sentiment_vector = self.news_generator.get_sentiment_vector(day_idx, minute)
+        self.broadcast(wire.MINUTE, day_idx, minute, sentiment_vector)
+        return merge_orders([_receive(conn, wire.ORDERS)[1][0] for conn in self.connections])
+
+    def update_evolving_agents(self, day_idx, wealth):
+        self.broadcast(wire.DAY_END, day_idx, self.minutes_per_day, np.empty(0))
+        for conn, start, end in zip(self.connections, self.offsets, self.offsets[1:]):
+            self.store.strategy_codes[start:end] = _receive(conn, wire.DAY_DONE)[1][0]
+
+    def strategy_switches(self):
+        '''Stops the workers and collects their agents' strategy switches.'''
+        for conn in self.connections:
+            conn.send_bytes(wire.pack(wire.STOP))
+        names = np.asarray(self.store.strategy_names, dtype = object)
+        switches = np.concatenate([_receive(conn, wire.SWITCHES)[1][0] for conn in self.connections])
+        return pd.DataFrame({
+            'agent_id': switches['agent_id'],
+            'day': switches['day'],
+            'from': names[switches['from']],
+            'to': names[switches['to']]
+        }).to_dict('records')
+
+    def broadcast(self, kind, day_idx, minute, sentiment_vector):
+        '''Sends each worker the market state plus its agents' new fills and cash.'''
+        store = self.store
+        exchange = self.exchange
+        trades = exchange.trades.view()[self.synced_trades:]
+        self.synced_trades = len(exchange.trades)
+        header = (day_idx, minute, exchange.price_history.count)
+        prices = store.price_vector(exchange.prices)
+
+        buyers = np.fromiter(map(store.row_of.__getitem__, trades['buyer_id'].tolist()), dtype = np.int64, count = len(trades))
+        sellers = np.fromiter(map(store.row_of.__getitem__, trades['seller_id'].tolist()), dtype = np.int64, count = len(trades))
+        buyer_shard, seller_shard = self.shard_of_row[buyers], self.shard_of_row[sellers]
+        for shard, (conn, start) in enumerate(zip(self.connections, self.offsets)):
+            bought, sold = buyer_shard == shard, seller_shard == shard
+            rows = np.unique(np.concatenate((buyers[bought], sellers[sold])))
+            conn.send_bytes(wire.pack(kind, header, prices, sentiment_vector, rows - start, store.cash[rows],
+                                      trades[bought | sold]))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serve one agent shard of a sharded simulation")
+    parser.add_argument("--connect", required = True, help = "host:port of the exchange process")
+    parser.add_argument("--shard", type = int, required = True)
+    parser.add_argument("--shards", type = int, required = True)
+    parser.add_argument("--config", default = "config.yml")
+    args = parser.parse_args()
+
+    authkey = os.environ.get('SHARD_AUTHKEY')
+    if not authkey:
+        parser.error("set SHARD_AUTHKEY to the exchange process's key")
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    host, port = args.connect.rsplit(':', 1)
+    run_worker((host, int(port)), authkey.encode(), args.shard, args.shards, config)
+
+if __name__ == "__main__":
+    main()
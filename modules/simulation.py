@@ -1,74 +1,210 @@
 # Orchestrates the daily and minute-level simulation loop
 
+import os
+import time
 import numpy as np
 from collections import defaultdict
 import pandas as pd
-import requests
+
+from modules.agent_state import AgentStateStore
+from modules.agent_factory import MARKET_MAKER_ID
+from modules.orders import OrderBuffer
+from modules.publisher import DeltaPublisher
+from modules.rng import ensure_rng
+from modules.profiler import NullProfiler
+from modules.scheduler import AgentScheduler
+from modules.checkpoint import save_checkpoint, load_checkpoint
+from modules.output import RunOutput
+from modules.log_sinks import TableSink, MemorySink, PublisherSink, run_starts
 
 class Simulation:
     def __init__(self, agent, exchange,
                  news_generator,
                  num_days = 100,
-                 minutes_per_day = 390):
+                 minutes_per_day = 390,
+                 api_url = "http://localhost:8000",
+                 api_format = 'columns',
+                 api_options = None,
+                 output_dir = ".",
+                 rng = None,
+                 profiler = None,
+                 scheduler = None,
+                 checkpoint_every = None,
+                 checkpoint_dir = "checkpoints",
+                 config = None,
+                 output_format = 'csv',
+                 record = None,
+                 wealth_detail = 'agents',
+                 sentiment_encoding = 'full',
+                 keep_in_memory = False,
+                 store = None):
         self.agents = agent
+        self.rng = ensure_rng(rng)
+        #Phase timers (modules/profiler.py); a no-op unless one is passed
+        self.profiler = profiler or NullProfiler()
         self.exchange = exchange
         self.news_generator = news_generator
         self.num_days = num_days
         self.minutes_per_day = minutes_per_day
-        self.sentiment_log = []
-        self.wealth_log = []
-        self.market_maker_trades = []
-        self.strategy_stock_profit_log = []
+        self.output_dir = output_dir
+        #Log tables written at the end of each day (modules/output.py); `record` holds the record_* flags
+        self.output = RunOutput(output_dir, file_format = output_format, record = record)
+        #Set by a checkpoint: how far the output files had got
+        self.output_resume = None
+
+        #'agents': a wealth row per agent per day; 'strategy': per-strategy quantiles only
+        if wealth_detail not in ('agents', 'strategy'):
+            raise ValueError(f"Unknown wealth detail: {wealth_detail}")
+        self.wealth_detail = wealth_detail
+        #'full': every minute; 'rle': a sentiment row only where a stock's value changes
+        if sentiment_encoding not in ('rle', 'full'):
+            raise ValueError(f"Unknown sentiment encoding: {sentiment_encoding}")
+        self.sentiment_encoding = sentiment_encoding
+
+        #Checkpoint every N days into checkpoint_dir (relative to output_dir); `config` is stored with them
+        self.next_day = 0
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_dir = self.output_path(checkpoint_dir)
+        self.config = config
         
         self.agent_dict = {a.agent_id: a for a in self.agents}
+        #`store` is passed when the agents live in other processes (modules/sharding.py)
+        self.store = store if store is not None else AgentStateStore.of(self.agents)
+        self.exchange.attach_store(self.store)
+        if news_generator.stocks != self.store.symbols:
+            raise ValueError("News generator symbols do not match the agents' store")
+        if news_generator.minutes_per_day < minutes_per_day:
+            raise ValueError("News generator has fewer minutes per day than the simulation")
+        self.evolving_agents = [a for a in self.agents if hasattr(a, 'update_performance')]
+        #Draws each day's active agents up front (10% per minute plus every HFT by default)
+        if scheduler is None and self.agents:
+            scheduler = AgentScheduler(self.agents, rng = self.rng)
+        self.scheduler = scheduler
+        #Reused every minute; orders are written in place instead of as dicts
+        self.order_buffer = OrderBuffer()
+
+        #OHLC rows already pushed to the API (None disables pushing). `api_options` are
+        #DeltaPublisher settings; with `spill` (default) a backlog overflows into output_dir/api_spill
+        self.publisher = None
+        if api_url:
+            api_options = dict(api_options or {})
+            spill_dir = self.output_path("api_spill") if api_options.pop('spill', True) else None
+            self.publisher = DeltaPublisher(api_url, wire_format = api_format, spill_dir = spill_dir, **api_options)
+        self.push_cursors = {'ohlc': {stock: 0 for stock in self.exchange.daily_ohlc}}
+
+        #Every log batch goes to each sink; nothing is kept in memory unless asked
+        self.memory = MemorySink() if keep_in_memory else None
+        self.sinks = [TableSink(self.output)]
+        if self.memory is not None:
+            self.sinks.append(self.memory)
+        if self.publisher is not None:
+            self.sinks.append(PublisherSink(self.publisher))
     
     def run(self):
-        for day in range(self.num_days):
+        profiler = self.profiler
+        with profiler.phase('persist'):
+            self.output.begin(self.next_day, self.output_resume)
+
+        for day in range(self.next_day, self.num_days):
             print(f"Day {day+1} of {self.num_days}")
 
+            profiler.start_day(day)
             self.run_day(day)
-            self.exchange.log_day_close(day)
-            self.exchange.reset_day()
-        self.summarize_strategy_performance()
-
-        all_ohlc = []
-        for stock, ohlc_list in self.exchange.daily_ohlc.items():
-            for ohlc in ohlc_list:
-                ohlc['stock'] = stock
-                all_ohlc.append(ohlc)
-        
-        df_ohlc = pd.DataFrame(all_ohlc)
-        df_ohlc.to_csv("daily_ohlc.csv", index=False)
-        print("✅ Logged OHLC data to ohlc_log.csv")
+            with profiler.phase('log'):
+                self.exchange.log_day_close(day)
+            with profiler.phase('persist'):
+                self.persist_day(day)
+            trades = len(self.exchange.trades)
+            with profiler.phase('match'):
+                self.exchange.reset_day()
+            profiler.end_day(day, trades)
+            self.next_day = day + 1
 
-        switch_log = []
-        for agent in self.agents:
-            if hasattr(agent, 'strategy_switch_log'):
-                switch_log.extend(agent.strategy_switch_log)
-                print(f"Agent {agent.agent_id} switches: {len(agent.strategy_switch_log)}")
+            if self.checkpoint_every and (day + 1) % self.checkpoint_every == 0:
+                with profiler.phase('persist'):
+                    self.checkpoint()
+
+        with profiler.phase('persist'):
+            self.save_run_logs()
+        self.exchange.close_match_pool()
         
-        if switch_log:
-            df = pd.DataFrame(switch_log)
-            df.to_csv("strategy_switch_log.csv", index=False)
-            print("✅ Logged strategy switch to strategy_switch_log.csv")
-
-        if self.strategy_stock_profit_log:
-            df = pd.DataFrame(self.strategy_stock_profit_log)
-            df.to_csv("strategy_stock_profit_log.csv", index=False)
-            print("✅ Logged strategy-stock profit to strategy_stock_profit_log.csv")
+        # Send the remaining rows to the API
+        with profiler.phase('push'):
+            self.push_updates()
+            if self.publisher is not None:
+                self.publisher.close()
+        profiler.finish(self.output_dir)
         
-        # Send data to API
-        requests.post("http://localhost:8000/update/ohlc", json = self.exchange.daily_ohlc)
-        requests.post("http://localhost:8000/update/wealth", json = self.wealth_log)
-        requests.post("http://localhost:8000/update/sentiment", json = self.sentiment_log)
+    def checkpoint(self, path = None):
+        '''Saves the state between two days (see modules/checkpoint.py) and returns its path.'''
+        if path is None:
+            os.makedirs(self.checkpoint_dir, exist_ok = True)
+            path = os.path.join(self.checkpoint_dir, f"day_{self.next_day:04d}.npz")
+        save_checkpoint(self, path, self.next_day, config = self.config)
+        print(f"💾 Saved checkpoint to {path}")
+        return path
 
-        
-    def summarize_strategy_performance(self):
-        import pandas as pd
+    def resume_from(self, path):
+        '''Loads a checkpoint; `run()` then continues with the day after it.'''
+        self.next_day = load_checkpoint(self, path)
+        print(f"⏩ Resuming from {path} at day {self.next_day + 1}")
+
+    def persist_day(self, day_idx):
+        '''Writes the day's trades and new log rows to the output tables.'''
+        output = self.output
+        if output.enabled('trade_log'):
+            if output.file_format == 'csv':
+                self.exchange.save_trade_log(output.path('trade_log'))
+            else:
+                output.write('trade_log', self.exchange.trades_frame(self.exchange.trades.view()), day_idx)
+
+        ohlc = pd.DataFrame([rows[-1] for rows in self.exchange.daily_ohlc.values()])
+        ohlc['stock'] = pd.Categorical(list(self.exchange.daily_ohlc))
+        self.emit('daily_ohlc', day_idx, ohlc)
+
+        if output.enabled('intraday_bars'):
+            bars = self.exchange.bars
+            self.emit('intraday_bars', day_idx,
+                      pd.concat([bars.frame(interval, self.store.symbols) for interval in bars.intervals],
+                                ignore_index = True))
+
+    def emit(self, table, day_idx, frame):
+        '''Hands a batch of log rows to every sink, timed under the sink's phase.'''
+        for sink in self.sinks:
+            with self.profiler.phase(sink.phase):
+                sink.write(table, day_idx, frame)
 
-        df = pd.DataFrame(self.wealth_log)
-        last_day = df['day'].max()
-        final_wealth = df[df['day'] == last_day]
+    def save_run_logs(self):
+        '''Closes the trade log, writes the strategy switches and prints the summary.'''
+        self.exchange.close_trade_log()
+        self.summary = self.summarize_strategy_performance()
+
+        switch_log = self.strategy_switches()
+        if switch_log:
+            evolving = int((self.store.strategy_codes == self.store.strategy_index['evolving']).sum())
+            self.emit('strategy_switch_log', None, pd.DataFrame(switch_log))
+            print(f"🧬 {len(switch_log)} strategy switches by {evolving} evolving agents")
+        print(f"✅ Logged run tables to {self.output_dir} ({self.output.file_format})")
+
+    def strategy_switches(self):
+        '''Every strategy switch of the run, as dicts of agent_id, day, from and to.'''
+        switch_log = []
+        for agent in self.evolving_agents:
+            switch_log.extend(agent.strategy_switch_log)
+        return switch_log
+
+    def output_path(self, filename):
+        return os.path.join(self.output_dir, filename)
+
+    def summarize_strategy_performance(self):
+        '''Final wealth per strategy, from the agent store at the end of the run.'''
+        store = self.store
+        final_wealth = pd.DataFrame({
+            'strategy': np.asarray(store.strategy_names, dtype = object)[store.strategy_codes],
+            'cash': store.cash,
+            'wealth': store.wealth(store.price_vector(self.exchange.prices))
+        })
+        final_wealth['is_market_maker'] = final_wealth['strategy'] == 'market_maker'
 
         summary = final_wealth.groupby('strategy')['wealth'].agg(['mean', 'std', 'min', 'max'])
         print("\n📈 Strategy Performance Summary (Final Day):")
@@ -79,119 +215,228 @@ class Simulation:
         if not mm_df.empty:
             mm = mm_df.iloc[0]
             print(f"\n🏦 Market Maker Performance:\n  Final Wealth: ${mm['wealth']:.2f}\n  Cash: ${mm['cash']:.2f}")
-        return
-    
-    def log_news_sentiment(self, day_idx, minute, sentiment_dict):
-        for stock, value in sentiment_dict.items():
-            self.sentiment_log.append({
-                'day': day_idx,
-                'minute': minute,
-                'stock': stock,
-                'sentiment': value
-            })
+        return summary
     
+    def log_news_sentiment(self, day_idx):
+        '''Logs the day's sentiment; run-length encoded when `sentiment_encoding` is 'rle'.'''
+        series = self.news_generator.day_sentiment(day_idx)[:self.minutes_per_day]
+        if self.sentiment_encoding == 'rle':
+            minutes, cols = run_starts(series)
+        else:
+            minutes, cols = np.divmod(np.arange(series.size), series.shape[1])
+        self.emit('sentiment_log', day_idx, pd.DataFrame({
+            'day': day_idx,
+            'minute': minutes,
+            'stock': pd.Categorical.from_codes(cols, self.store.symbols),
+            'sentiment': series[minutes, cols]
+        }))
+
+    def log_market_maker_trades(self, day_idx):
+        trades = self.exchange.trades.view()
+        mm_trades = trades[(trades['buyer_id'] == MARKET_MAKER_ID) | (trades['seller_id'] == MARKET_MAKER_ID)]
+        self.emit('market_maker_trades', day_idx, pd.DataFrame({
+            'day': day_idx,
+            'stock': pd.Categorical.from_codes(mm_trades['symbol'], self.store.symbols),
+            'price': mm_trades['price'],
+            'quantity': mm_trades['quantity'],
+            'role': pd.Categorical.from_codes((mm_trades['buyer_id'] != MARKET_MAKER_ID).astype(np.int8), ['buy', 'sell'])
+        }))
+
     def log_agent_wealth(self, day_idx):
-        for agent in self.agents:
-            wealth = agent.cash
-            for stock, shares in agent.portfolio.items():
-                price = self.exchange.get_price(stock)
-                wealth += shares * price
-            
-            self.wealth_log.append({
-                'agent_id': agent.agent_id,
-                'strategy': agent.strategy_type,
+        '''
+        Logs the day's closing wealth: one row per agent, or with
+        `wealth_detail = 'strategy'` only its quantiles per strategy.
+        '''
+        store = self.store
+        prices = store.price_vector(self.exchange.prices)
+        wealth = store.wealth(prices)
+
+        self.update_evolving_agents(day_idx, wealth)
+
+        strategy = pd.Categorical.from_codes(store.strategy_codes, store.strategy_names)
+        if self.wealth_detail == 'strategy':
+            self.emit('strategy_wealth', day_idx, self.wealth_quantiles(day_idx, wealth))
+            return
+
+        frame = pd.DataFrame({'agent_id': store.agent_ids, 'strategy': strategy, 'day': day_idx, 'cash': store.cash})
+        for col, stock in enumerate(store.symbols):
+            frame[stock] = store.holdings[:, col]
+        frame['wealth'] = wealth
+        frame['is_market_maker'] = strategy == 'market_maker'
+        self.emit('agent_wealth', day_idx, frame)
+
+    def update_evolving_agents(self, day_idx, wealth):
+        '''Hands each evolving agent its closing wealth; they may switch strategy.'''
+        store = self.store
+        for agent in self.evolving_agents:
+            agent.update_performance(float(wealth[store.row_of[agent.agent_id]]), day_idx)
+
+    def wealth_quantiles(self, day_idx, wealth):
+        '''One row per strategy: agent count, mean cash and the spread of wealth.'''
+        store = self.store
+        rows = []
+        for code, strategy in enumerate(store.strategy_names):
+            members = store.strategy_codes == code
+            if not members.any():
+                continue
+            values = wealth[members]
+            p10, p25, p50, p75, p90 = np.quantile(values, [0.1, 0.25, 0.5, 0.75, 0.9]).tolist()
+            rows.append({
                 'day': day_idx,
-                'cash': agent.cash,
-                **agent.portfolio,
-                'wealth': wealth,
-                'is_market_maker': agent.strategy_type == 'market_maker'
+                'strategy': strategy,
+                'agents': int(members.sum()),
+                'cash_mean': float(store.cash[members].mean()),
+                'wealth_mean': float(values.mean()),
+                'wealth_std': float(values.std(ddof = 1)) if len(values) > 1 else np.nan,
+                'wealth_min': float(values.min()),
+                'wealth_p10': p10,
+                'wealth_p25': p25,
+                'wealth_p50': p50,
+                'wealth_p75': p75,
+                'wealth_p90': p90,
+                'wealth_max': float(values.max())
             })
-
-            if hasattr(agent, 'update_performance'):
-                agent.update_performance(wealth, day_idx)
+        return pd.DataFrame(rows)
 
     def run_day(self, day_idx):
-        for event in self.news_generator.market_events:
-            if event["day"] == day_idx:
-                if "stock" in event:
-                    print(f"📣 Impact Event: {event['type']} on {event['stock']} | Impact: {event['impact']:+.2f}")
-                elif event.get("target") == "market":
-                    print(f"🌍 Market Event: {event['type']} | Impact on all stocks: {event['impact']:+.2f}")
+        for event in self.news_generator.market_events_on(day_idx):
+            if "stock" in event:
+                print(f"📣 Impact Event: {event['type']} on {event['stock']} | Impact: {event['impact']:+.2f}")
+            elif event.get("target") == "market":
+                print(f"🌍 Market Event: {event['type']} | Impact on all stocks: {event['impact']:+.2f}")
         
+        profiler = self.profiler
+        with profiler.phase('decide'):
+            self.plan_day(day_idx)
         for minute in range(self.minutes_per_day):
-            sentiment = self.news_generator.get_sentiment(day_idx, minute)
-            self.log_news_sentiment(day_idx, minute, sentiment)
-            
-            market_obs = self.exchange.get_observation()
-            market_obs['sentiment'] = sentiment
-
-            active_agents = np.random.choice(self.agents,
-                                             size = int(0.1 * len(self.agents)),
-                                             replace = False)
-            
-            # Separate HFTs for full-minute activation
-            hft_agents = [a for a in self.agents if a.strategy_type == "hft"]
-            active_agents = np.random.choice([a for a in self.agents if a.strategy_type != "hft"],
-                                 size=int(0.1 * len(self.agents)), replace = False)
+            with profiler.phase('decide'):
+                orders = self.decide_minute(day_idx, minute)
+            profiler.record_minute(len(orders))
             
-            active_agents = list(active_agents) + hft_agents
+            with profiler.phase('submit'):
+                self.exchange.submit_orders(orders)
             
-            for agent in active_agents:
-                decisions = agent.decide_action(market_obs)
-                if decisions:
-                    for order in decisions:
-                        self.exchange.submit_order(order['stock'], order)
-            
-            self.exchange.match_all(self.agent_dict)
-
-            for trade in self.exchange.trades:
-                if 99999 in [trade['buyer_id'], trade['seller_id']]:
-                    self.market_maker_trades.append({
-                        'day': day_idx,
-                        'stock': trade['stock'],
-                        'price': trade['price'],
-                        'quantity': trade['quantity'],
-                        'role': 'buy' if trade['buyer_id'] == 99999 else 'sell'
-                    })
+            with profiler.phase('match'):
+                self.exchange.match_all()
         
         price_summary = ", ".join([f"{s}: {p:.2f}" for s, p in self.exchange.prices.items()])
         print(f"Day {day_idx + 1} completed. Prices: {price_summary}")
-        self.log_agent_wealth(day_idx)
-        self.log_strategy_stock_profit(day_idx)
+        with profiler.phase('log'):
+            self.log_news_sentiment(day_idx)
+            self.log_market_maker_trades(day_idx)
+            self.log_agent_wealth(day_idx)
+            self.log_strategy_stock_profit(day_idx)
 
         # Send data to API
-        requests.post("http://localhost:8000/update/ohlc", json = self.exchange.daily_ohlc)
-        requests.post("http://localhost:8000/update/wealth", json = self.wealth_log)
-        requests.post("http://localhost:8000/update/sentiment", json = self.sentiment_log)
-
-        self.exchange.save_trade_log()
+        with profiler.phase('push'):
+            self.push_updates()
     
+    def plan_day(self, day_idx):
+        self.scheduler.plan_day(self.minutes_per_day)
+
+    def decide_minute(self, day_idx, minute):
+        '''The orders of this minute's active agents, as an ORDER_DTYPE array.'''
+        sentiment_vector = self.news_generator.get_sentiment_vector(day_idx, minute)
+        market_obs = self.exchange.get_observation()
+        market_obs['sentiment'] = dict(zip(self.store.symbols, sentiment_vector.tolist()))
+        market_obs['price_vector'] = self.store.price_vector(market_obs['prices'])
+        market_obs['sentiment_vector'] = sentiment_vector
+
+        active_agents = self.scheduler.active_agents(minute)
+        return self.collect_orders(active_agents, market_obs)
+
+    def push_updates(self):
+        '''
+        Queues the OHLC rows added since the previous push (wealth and
+        sentiment reach the API through a PublisherSink). The API store is
+        keyed, so a row that is delivered twice is not duplicated.
+        '''
+        if self.publisher is None:
+            return
+        cursors = self.push_cursors
+
+        ohlc_delta = {}
+        for stock, rows in self.exchange.daily_ohlc.items():
+            ohlc_delta[stock] = rows[cursors['ohlc'][stock]:]
+            cursors['ohlc'][stock] = len(rows)
+        if any(ohlc_delta.values()):
+            self.publisher.publish("/update/ohlc", ohlc_delta)
+
+    def collect_orders(self, active_agents, market_obs):
+        return collect_orders(active_agents, market_obs, self.store, self.order_buffer,
+                              rng = self.rng, profiler = self.profiler)
+
     def log_strategy_stock_profit(self, day_idx):
         '''
         Aggregates and logs the profit per strategy per stock for the current day.
         '''
-        profit_data = {}
+        store = self.store
+        prices = store.price_vector(self.exchange.prices)
+        codes = store.strategy_codes
+        num_strategies = len(store.strategy_names)
 
-        for agent in self.agents:
-            strategy = agent.strategy_type
-            if strategy == 'market_maker':
-                continue
-            
-            if hasattr(agent, 'strategy_type'):
-                strategy = agent.strategy_type
-            
-            for stock, shares in agent.portfolio.items():
-                price = self.exchange.get_price(stock)
-                value = shares * price
-                key = (strategy, stock)
-                profit_data.setdefault(key, 0)
-                profit_data[key] += value
-        
-        for (strategy, stock), total_value in profit_data.items():
-            self.strategy_stock_profit_log.append({
-                'day': day_idx,
-                'strategy': strategy,
-                'stock': stock,
-                'profit': total_value
-            })
-            
\ No newline at end of file
+        #Holdings value summed per (strategy, stock) in one pass
+        totals = np.zeros((num_strategies, len(store.symbols)))
+        np.add.at(totals, codes, store.holdings * prices)
+        present = np.bincount(codes, minlength = num_strategies) > 0
+
+        keep = np.flatnonzero(present & (np.asarray(store.strategy_names) != 'market_maker'))
+        num_symbols = len(store.symbols)
+        self.emit('strategy_stock_profit_log', day_idx, pd.DataFrame({
+            'day': day_idx,
+            'strategy': pd.Categorical.from_codes(np.repeat(keep, num_symbols), store.strategy_names),
+            'stock': pd.Categorical.from_codes(np.tile(np.arange(num_symbols), len(keep)), store.symbols),
+            'profit': totals[keep].ravel()
+        }))
+
+def collect_orders(active_agents, market_obs, store, orders, rng = None, profiler = None):
+    '''
+    Writes this minute's orders into the reusable order buffer and returns
+    them as an ORDER_DTYPE array. Agents whose strategy has a
+    `decide_batch` kernel are decided together per strategy class; the
+    rest call `decide_action`. Orders are returned in activation order so
+    batching does not change who reaches the book first. Shared by the
+    simulation and the shard workers of modules/sharding.py.
+    '''
+    orders.reset()
+    batches = defaultdict(list)
+    span_ranks, span_counts = [], []
+    profiler = profiler or NullProfiler()
+    timed = profiler.enabled
+
+    for rank, agent in enumerate(active_agents):
+        strategy = getattr(agent, 'strategy', None)
+        if hasattr(strategy, 'decide_batch'):
+            batches[type(strategy)].append((rank, store.row_of[agent.agent_id]))
+            continue
+
+        before = len(orders)
+        if timed:
+            start = time.perf_counter()
+            agent.decide_action(market_obs, orders)
+            profiler.record_strategy(type(strategy or agent).__name__, 1, len(orders) - before,
+                                     time.perf_counter() - start)
+        else:
+            agent.decide_action(market_obs, orders)
+        span_ranks.append(rank)
+        span_counts.append(len(orders) - before)
+
+    ranks = [np.repeat(np.array(span_ranks, dtype = np.int64), span_counts)]
+
+    for strategy_cls, members in batches.items():
+        member_ranks, rows = np.array(members, dtype = np.int64).T
+        #Rank of each output row, looked up among the members' rows
+        by_row = np.argsort(rows)
+        sorted_rows = rows[by_row]
+
+        start = time.perf_counter()
+        out_rows, out_symbols, out_sides, out_qtys = strategy_cls.decide_batch(
+            market_obs, rows, store.cash[rows], store.holdings[rows], rng = rng)
+        profiler.record_strategy(strategy_cls.__name__, len(rows), len(out_rows),
+                                 time.perf_counter() - start)
+        orders.extend(agent_id = store.agent_ids[out_rows], symbol = out_symbols,
+                      side = out_sides, quantity = out_qtys, price = np.nan)
+        ranks.append(member_ranks[by_row[np.searchsorted(sorted_rows, out_rows)]])
+
+    ranks = np.concatenate(ranks)
+    return orders.view()[np.argsort(ranks, kind = 'stable')]
@@ -0,0 +1,165 @@
+# Parameter sweeps and Monte Carlo replications over a process pool
+#
+# Sweep spec (YAML):
+#
+# base_config: config.yml
+# output_dir: sweeps/example
+# mode: grid            # grid: every combination; random: `runs` samples
+# runs: 16              # random mode only
+# replications: 2       # runs per parameter set, each with its own seed
+# seed: 42
+# workers: null         # defaults to every core
+# resume_from: null     # checkpoint every run continues from (a fork per run)
+# parameters:           # dotted keys into the config
+#   transaction_cost.rate: [0.0005, 0.001]                  # grid values / random choices
+#   agent_distribution.noise: {low: 0.05, high: 0.2}        # random mode: uniform draw
+#   news.shock_days: [[35], [60]]
+
+import contextlib
+import copy
+import itertools
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from modules.runner import run_simulation
+from modules.checkpoint import read_meta
+
+def set_path(config, dotted_key, value):
+    node = config
+    keys = dotted_key.split('.')
+    for key in keys[:-1]:
+        node = node.setdefault(key, {})
+    node[keys[-1]] = value
+
+def expand_grid(parameters):
+    names = list(parameters)
+    for values in itertools.product(*(parameters[n] for n in names)):
+        yield dict(zip(names, values))
+
+def sample_random(parameters, runs, rng):
+    for _ in range(runs):
+        sample = {}
+        for name, spec in parameters.items():
+            if isinstance(spec, dict):
+                sample[name] = float(rng.uniform(spec['low'], spec['high']))
+            else:
+                sample[name] = spec[rng.integers(len(spec))]
+        yield sample
+
+def build_runs(spec, base_config):
+    '''Returns one dict per run with its id, overrides, seed, config and output dir.'''
+    parameters = spec.get('parameters', {})
+    seed_seq = np.random.SeedSequence(spec.get('seed'))
+    if spec.get('mode', 'grid') == 'grid':
+        param_sets = list(expand_grid(parameters))
+    elif spec['mode'] == 'random':
+        param_sets = list(sample_random(parameters, spec['runs'], np.random.default_rng(seed_seq.spawn(1)[0])))
+    else:
+        raise ValueError(f"Unknown sweep mode: {spec['mode']}")
+
+    replications = spec.get('replications', 1)
+    run_seeds = seed_seq.spawn(len(param_sets) * replications)
+    runs = []
+    for i, (params, rep) in enumerate(itertools.product(param_sets, range(replications))):
+        config = copy.deepcopy(base_config)
+        for name, value in params.items():
+            set_path(config, name, value)
+        if spec.get('resume_from'):
+            set_path(config, 'checkpoint.resume_from', spec['resume_from'])
+        run_id = f"run_{i:04d}"
+        runs.append({
+            'run_id': run_id,
+            'replication': rep,
+            'params': params,
+            'seed': int(run_seeds[i].generate_state(1)[0]),
+            'config': config,
+            'output_dir': os.path.join(spec.get('output_dir', 'sweeps'), run_id)
+        })
+    return runs
+
+def execute_run(run):
+    '''Worker entry point: runs one simulation in its own output directory.'''
+    os.makedirs(run['output_dir'], exist_ok = True)
+    config = dict(run['config'], seed = run['seed'])
+    with open(os.path.join(run['output_dir'], 'config.yml'), 'w') as f:
+        yaml.safe_dump(config, f)
+
+    with open(os.path.join(run['output_dir'], 'run.log'), 'w') as log, \
+         contextlib.redirect_stdout(log):
+        sim = run_simulation(config, output_dir = run['output_dir'], api_url = None)
+
+    summary = sim.summary.reset_index()
+    summary.insert(0, 'run_id', run['run_id'])
+    summary.insert(1, 'replication', run['replication'])
+    summary.insert(2, 'seed', run['seed'])
+    for name, value in run['params'].items():
+        summary[name] = str(value) if isinstance(value, (list, dict)) else value
+    return summary
+
+def run_sweep(spec, workers = None):
+    '''
+    Fans every run of the sweep out over a ProcessPoolExecutor and merges the
+    per-run strategy summaries into `<output_dir>/summary.csv`.
+    '''
+    with open(spec.get('base_config', 'config.yml'), 'r') as f:
+        base_config = yaml.safe_load(f)
+    runs = build_runs(spec, base_config)
+    return run_all(runs, spec.get('output_dir', 'sweeps'), workers or spec.get('workers'))
+
+def fork(checkpoint, scenarios, output_dir = 'forks', workers = None, seeds = None):
+    '''
+    Continues one checkpoint under several scenarios in parallel, without
+    re-running the days before it. Each scenario is a dict of dotted config
+    overrides applied to the config saved in the checkpoint (e.g. new
+    `news.market_events` or `transaction_cost.rate`). Branches keep the
+    checkpoint's random streams unless `seeds` gives each its own seed.
+    '''
+    base_config = read_meta(checkpoint)['config']
+    if base_config is None:
+        raise ValueError(f"{checkpoint} was saved without its config; it can be resumed but not forked")
+
+    runs = []
+    for i, params in enumerate(scenarios):
+        config = copy.deepcopy(base_config)
+        for name, value in params.items():
+            set_path(config, name, value)
+        set_path(config, 'checkpoint.resume_from', checkpoint)
+        run_id = f"branch_{i:03d}"
+        runs.append({
+            'run_id': run_id,
+            'replication': 0,
+            'params': params,
+            'seed': seeds[i] if seeds and seeds[i] is not None else config.get('seed'),
+            'config': config,
+            'output_dir': os.path.join(output_dir, run_id)
+        })
+    return run_all(runs, output_dir, workers)
+
+def run_all(runs, output_dir, workers = None):
+    '''Runs prepared runs on a process pool and merges their summaries.'''
+    if not runs:
+        raise ValueError("Nothing to run: the sweep produced no runs")
+    os.makedirs(output_dir, exist_ok = True)
+    workers = workers or os.cpu_count()
+    summaries = []
+    with ProcessPoolExecutor(max_workers = min(workers, len(runs))) as pool:
+        futures = {pool.submit(execute_run, run): run for run in runs}
+        for future in as_completed(futures):
+            run = futures[future]
+            try:
+                summaries.append(future.result())
+                print(f"✅ {run['run_id']} finished")
+            except Exception:
+                print(f"⚠️ {run['run_id']} failed:\n{traceback.format_exc()}")
+
+    if not summaries:
+        return pd.DataFrame()
+    summary = pd.concat(summaries, ignore_index = True).sort_values(['run_id', 'strategy'])
+    summary.to_csv(os.path.join(output_dir, 'summary.csv'), index = False)
+    print(f"✅ Merged {len(summaries)} run summaries into {os.path.join(output_dir, 'summary.csv')}")
+    return summary
@@ -0,0 +1,86 @@
+# Append-only trade log writer
+
+import os
+import numpy as np
+import pandas as pd
+
+class TradeLogWriter:
+    '''
+    Buffers TRADE_DTYPE records and appends them to disk in batches of at
+    least `flush_size` rows, so each trade is written exactly once.
+    - .csv: the header is written on the first flush, later flushes append
+    - .parquet: every flush becomes one row group of a single file
+    Call `close()` at the end of the run to write the tail of the buffer.
+    `resume` (a `position()` taken earlier) continues that same CSV file,
+    cut back to that point, instead of starting a new one.
+    '''
+    def __init__(self, path, symbols, flush_size = 50_000, file_format = None, resume = None):
+        self.path = path
+        self.symbols = np.asarray(symbols, dtype = object)
+        self.flush_size = flush_size
+        self.file_format = file_format or ('parquet' if path.endswith('.parquet') else 'csv')
+        if self.file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unknown trade log format: {self.file_format}")
+
+        self.pending = []
+        self.pending_rows = 0
+        self.rows_written = 0
+        self.parquet_writer = None
+
+        if resume is not None and self.file_format == 'csv' and resume['path'] == os.path.abspath(self.path) \
+                and os.path.exists(self.path) and os.path.getsize(self.path) >= resume['bytes']:
+            #Drop anything written after the checkpoint
+            with open(self.path, 'r+b') as f:
+                f.truncate(resume['bytes'])
+            self.rows_written = resume['rows']
+        elif os.path.exists(self.path):
+            #Start every run from an empty file
+            os.remove(self.path)
+
+    def position(self):
+        '''File, bytes and rows already on disk; call after `flush()`.'''
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {'path': os.path.abspath(self.path), 'bytes': size, 'rows': self.rows_written}
+
+    def write(self, trades):
+        if len(trades) == 0:
+            return
+        self.pending.append(trades.copy())
+        self.pending_rows += len(trades)
+        if self.pending_rows >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        trades = np.concatenate(self.pending)
+        self.pending = []
+        self.pending_rows = 0
+
+        df = pd.DataFrame(trades)
+        df.insert(0, 'stock', self.symbols[trades['symbol']])
+        df = df.drop(columns = 'symbol')
+
+        if self.file_format == 'csv':
+            df.to_csv(self.path, mode = 'a', header = self.rows_written == 0, index = False)
+        else:
+            self._write_row_group(df)
+        self.rows_written += len(df)
+
+    def _write_row_group(self, df):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Writing the trade log as Parquet requires pyarrow") from e
+
+        table = pa.Table.from_pandas(df, preserve_index = False)
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self.parquet_writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
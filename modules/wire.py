@@ -0,0 +1,77 @@
+# Binary messages between shard workers and the exchange process
+
+import struct
+
+import numpy as np
+
+from modules.orders import ORDER_DTYPE, TRADE_DTYPE
+
+#One strategy switch of an evolving agent; `from`/`to` index STRATEGY_NAMES
+SWITCH_DTYPE = np.dtype([
+    ('agent_id', np.int64),
+    ('day', np.int32),
+    ('from', np.int16),
+    ('to', np.int16)
+])
+
+#Exchange process -> worker
+MINUTE = 1      #(day, minute, history count) | prices, sentiment, rows, cash, fills
+DAY_END = 2     #(day, minute, history count) | prices, sentiment (empty), rows, cash, fills
+STOP = 3
+#Worker -> exchange process
+HELLO = 10      #(shard, symbols) | agent_ids, strategy_codes, cash, holdings (flattened)
+ORDERS = 11     #| orders
+DAY_DONE = 12   #| strategy_codes
+SWITCHES = 13   #| switches
+
+_SYNC = ('<iiq', (np.float64, np.float64, np.int64, np.float64, TRADE_DTYPE))
+
+#Kind -> (struct format of the header, dtype of each array that follows)
+MESSAGES = {
+    MINUTE: _SYNC,
+    DAY_END: _SYNC,
+    STOP: ('<', ()),
+    HELLO: ('<ii', (np.int64, np.int16, np.float64, np.int64)),
+    ORDERS: ('<', (ORDER_DTYPE,)),
+    DAY_DONE: ('<', (np.int16,)),
+    SWITCHES: ('<', (SWITCH_DTYPE,))
+}
+
+_KIND = struct.Struct('<B')
+_LENGTH = struct.Struct('<q')
+
+def pack(kind, header = (), *arrays):
+    '''
+    Encodes one message: the kind byte, the fixed header, then each array
+    as its element count followed by its raw little-endian buffer. A
+    whole minute of orders or fills is one message, never one per record.
+    '''
+    header_format, dtypes = MESSAGES[kind]
+    if len(arrays) != len(dtypes):
+        raise ValueError(f"Message {kind} carries {len(dtypes)} arrays, got {len(arrays)}")
+    parts = [_KIND.pack(kind), struct.pack(header_format, *header)]
+    for values, dtype in zip(arrays, dtypes):
+        values = np.ascontiguousarray(values, dtype = np.dtype(dtype).newbyteorder('<'))
+        parts.append(_LENGTH.pack(values.size))
+        parts.append(values.tobytes())
+    return b''.join(parts)
+
+def unpack(data):
+    '''
+    Decodes a message into (kind, header tuple, list of arrays). The
+    arrays are read-only views of `data`, not copies.
+    '''
+    (kind,) = _KIND.unpack_from(data, 0)
+    header_format, dtypes = MESSAGES[kind]
+    offset = _KIND.size
+    header = struct.unpack_from(header_format, data, offset)
+    offset += struct.calcsize(header_format)
+
+    arrays = []
+    for dtype in dtypes:
+        dtype = np.dtype(dtype).newbyteorder('<')
+        (size,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        arrays.append(np.frombuffer(data, dtype = dtype, count = size, offset = offset))
+        offset += size * dtype.itemsize
+    return kind, header, arrays
@@ -0,0 +1,16 @@
+from modules.sweep import run_sweep
+import argparse
+import yaml
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run a parameter sweep of the simulation")
+    parser.add_argument("spec", help = "Sweep spec YAML (see modules/sweep.py)")
+    parser.add_argument("--workers", type = int, default = None)
+    args = parser.parse_args()
+
+    with open(args.spec, 'r') as f:
+        spec = yaml.safe_load(f)
+    run_sweep(spec, workers = args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modules.agent_state import AgentStateStore
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD']
+
+def small_config(num_agents = 150, num_days = 4, minutes_per_day = 15):
+    '''The repo's config.yml shrunk to a run of a few seconds at most.'''
+    with open(os.path.join(ROOT, "config.yml")) as f:
+        config = yaml.safe_load(f)
+    config.update(num_agents = num_agents, num_days = num_days, minutes_per_day = minutes_per_day)
+    config['logging'].update(format = 'csv', keep_in_memory = False)
+    config['profiling'] = {'enabled': False}
+    return config
+
+def make_store(num_agents, cash = 10_000.0, holdings = 100, symbols = SYMBOLS):
+    '''A store of agents with ids 1..num_agents and the same starting state.'''
+    store = AgentStateStore(num_agents, symbols)
+    store.agent_ids[:] = np.arange(1, num_agents + 1)
+    store.row_of = {agent_id: row for row, agent_id in enumerate(store.agent_ids.tolist())}
+    store.cash[:] = cash
+    store.holdings[:] = holdings
+    return store
+
+@pytest.fixture
+def stock_config():
+    return [{'symbol': s, 'float': 1_000, 'initial_price': 100.0} for s in SYMBOLS]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from modules.agent_factory import Agent
+from modules.agent_state import AgentStateStore
+from modules.agent_strategies import ContrarianStrategy, MomentumStrategy
+from conftest import SYMBOLS
+
+STOCKS = [{'symbol': s} for s in SYMBOLS]
+
+def agents():
+    first = Agent(7, 'momentum', MomentumStrategy(), STOCKS, cash = 500.0)
+    second = Agent(3, 'contrarian', ContrarianStrategy(), STOCKS, cash = 250.0)
+    first.portfolio['BBB'] = 4
+    return [first, second]
+
+def test_binding_moves_state_into_the_store():
+    first, second = pool = agents()
+    store = AgentStateStore.from_agents(pool)
+    assert store.symbols == SYMBOLS
+    assert store.row_of == {7: 0, 3: 1}
+    assert store.agent_ids.tolist() == [7, 3]
+    assert store.cash.tolist() == [500.0, 250.0]
+    assert store.holdings.tolist() == [[0, 4, 0, 0], [0, 0, 0, 0]]
+    assert [store.strategy_names[c] for c in store.strategy_codes] == ['momentum', 'contrarian']
+    assert AgentStateStore.of(pool) is store
+
+def test_views_read_and_write_through_to_the_arrays():
+    first, second = pool = agents()
+    store = AgentStateStore.from_agents(pool)
+
+    first.cash -= 100.0
+    second.portfolio['CCC'] += 3
+    second.portfolio = {'AAA': 2}
+    assert store.cash.tolist() == [400.0, 250.0]
+    assert store.holdings[1].tolist() == [2, 0, 3, 0]
+
+    #Vectorised updates show up on the agents
+    store.cash *= 2
+    store.holdings[0, 3] = 9
+    assert first.cash == 800.0
+    assert dict(first.portfolio) == {'AAA': 0, 'BBB': 4, 'CCC': 0, 'DDD': 9}
+    with pytest.raises(TypeError):
+        del first.portfolio['AAA']
+
+    first.strategy_type = 'contrarian'
+    assert store.strategy_codes[0] == store.strategy_index['contrarian']
+
+def test_wealth_marks_holdings_to_market():
+    store = AgentStateStore.from_agents(agents())
+    prices = store.price_vector({'DDD': 4.0, 'CCC': 3.0, 'BBB': 2.5, 'AAA': 1.0})
+    assert prices.tolist() == [1.0, 2.5, 3.0, 4.0]
+    assert np.array_equal(store.wealth(prices), [510.0, 250.0])
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+import api.main
+
+def test_ohlc_bars_keep_vwap_and_trades(monkeypatch):
+    monkeypatch.setattr(api.main, 'store', api.main.DataStore())
+    client = TestClient(api.main.app)
+    bar = {'day': 0, 'open': 10.0, 'high': 12.0, 'low': 9.0, 'close': 11.0, 'volume': 30}
+    response = client.post('/update/ohlc', json = {'AAA': [dict(bar, vwap = 10.5, trades = 4)],
+                                                   'BBB': [dict(bar, day = 1)]})
+    assert response.status_code == 200
+
+    assert client.get('/data/ohlc', params = {'stock': 'AAA'}).json() == {'AAA': [dict(bar, vwap = 10.5, trades = 4)]}
+    #Bars from older publishers, without the new fields, still validate
+    assert client.get('/data/ohlc', params = {'stock': 'BBB'}).json() == {'BBB': [dict(bar, day = 1)]}
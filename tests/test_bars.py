@@ -0,0 +1,52 @@
+import pytest
+
+from modules.bars import BarBuilder
+
+#(minute, symbol column, price, quantity) and each minute's closing reference prices
+FILLS = [(0, 0, 10.0, 2), (0, 0, 12.0, 1), (0, 0, 9.0, 3), (1, 1, 51.0, 4),
+         (2, 0, 11.0, 5), (3, 0, 8.0, 1), (3, 0, 13.0, 2)]
+REFERENCE = [[9.0, 50.0], [9.2, 51.0], [11.0, 51.0], [13.0, 51.3]]
+
+@pytest.fixture
+def bars():
+    builder = BarBuilder(2, intervals = (1, 3), minutes_per_day = 4)
+    for minute, reference in enumerate(REFERENCE):
+        for _, col, price, qty in (f for f in FILLS if f[0] == minute):
+            builder.add_fill(col, price, qty)
+        builder.close_minute(reference)
+    return builder
+
+def rows(frame, stock):
+    columns = ['minute', 'open', 'high', 'low', 'close', 'volume', 'vwap', 'trades']
+    return frame[frame['stock'] == stock][columns].values.tolist()
+
+def test_minute_bars(bars):
+    assert rows(bars.frame(1), 0) == [
+        [0, 10.0, 12.0, 9.0, 9.0, 6, 59 / 6, 3],
+        [1, 9.2, 9.2, 9.2, 9.2, 0, 9.2, 0],
+        [2, 11.0, 11.0, 11.0, 11.0, 5, 11.0, 1],
+        [3, 8.0, 13.0, 8.0, 13.0, 3, 34 / 3, 2]
+    ]
+    assert rows(bars.frame(1), 1)[:2] == [
+        [0, 50.0, 50.0, 50.0, 50.0, 0, 50.0, 0],
+        [1, 51.0, 51.0, 51.0, 51.0, 4, 51.0, 1]
+    ]
+
+def test_longer_bars_and_day_bar(bars):
+    assert rows(bars.frame(3), 0) == [
+        [0, 10.0, 12.0, 9.0, 11.0, 11, 114 / 11, 4],
+        [3, 8.0, 13.0, 8.0, 13.0, 3, 34 / 3, 2]
+    ]
+    #A bar's open is its first trade, even after flat minutes
+    assert rows(bars.frame(3), 1) == [
+        [0, 51.0, 51.0, 51.0, 51.0, 4, 51.0, 1],
+        [3, 51.3, 51.3, 51.3, 51.3, 0, 51.3, 0]
+    ]
+    assert bars.day_bar(0) == {'open': 10.0, 'high': 13.0, 'low': 8.0, 'close': 13.0,
+                               'volume': 14, 'vwap': pytest.approx(148 / 14), 'trades': 6}
+
+def test_reset_day_starts_empty(bars):
+    bars.reset_day()
+    bars.add_fill(0, 20.0, 1)
+    bars.close_minute([20.0, 50.0])
+    assert rows(bars.frame(3), 0) == [[0, 20.0, 20.0, 20.0, 20.0, 1, 20.0, 1]]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from modules.runner import run_simulation
+from conftest import small_config
+
+def checkpoint_config(**checkpoint):
+    config = small_config()
+    config['checkpoint'] = dict(config.get('checkpoint') or {}, **checkpoint)
+    return config
+
+def state(sim):
+    return (sim.store.cash.copy(), sim.store.holdings.copy(), dict(sim.exchange.prices))
+
+def test_resumed_run_matches_uninterrupted_run(tmp_path):
+    uninterrupted = run_simulation(checkpoint_config(), output_dir = str(tmp_path / "full"), api_url = None)
+    checkpointed = run_simulation(checkpoint_config(every_days = 2), output_dir = str(tmp_path / "ckpt"), api_url = None)
+
+    #Continue the checkpointed run from day 2, in the same directory
+    checkpoint = tmp_path / "ckpt" / "checkpoints" / "day_0002.npz"
+    assert checkpoint.exists()
+    resumed = run_simulation(checkpoint_config(resume_from = str(checkpoint)), output_dir = str(tmp_path / "ckpt"),
+                             api_url = None)
+
+    for sim in (checkpointed, resumed):
+        cash, holdings, prices = state(sim)
+        expected_cash, expected_holdings, expected_prices = state(uninterrupted)
+        assert np.array_equal(cash, expected_cash)
+        assert np.array_equal(holdings, expected_holdings)
+        assert prices == expected_prices
+
+    expected = pd.read_csv(tmp_path / "full" / "trade_log.csv")
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "ckpt" / "trade_log.csv"), expected)
@@ -0,0 +1,29 @@
+import io
+
+import pyarrow as pa
+import pytest
+
+from api.columnar import iter_arrow
+
+def read_stream(chunks):
+    return pa.ipc.open_stream(io.BytesIO(b"".join(chunks))).read_all()
+
+def test_iter_arrow_streams_one_batch_per_chunk():
+    rows = [{'day': i // 3, 'stock': "AAA", 'sentiment': i / 10} for i in range(7)]
+    chunks = list(iter_arrow(rows, chunk_size = 3))
+    #Three batches, then the end-of-stream marker
+    assert len(chunks) == 4
+    table = read_stream(chunks)
+    assert table.to_pylist() == rows
+    assert [len(batch) for batch in table.to_batches()] == [3, 3, 1]
+
+def test_iter_arrow_builds_batches_lazily():
+    rows = [{'day': 0, 'wealth': 1.0}, {'day': 1, 'wealth': 2.0}, {'day': "bad", 'wealth': 3.0}]
+    chunks = iter_arrow(rows, chunk_size = 2)
+    assert next(chunks)
+    #Only the chunk after the first has to convert the bad row, to the first batch's schema
+    with pytest.raises(pa.ArrowInvalid):
+        next(chunks)
+
+def test_iter_arrow_of_no_rows_is_an_empty_stream():
+    assert read_stream(iter_arrow([])).num_rows == 0
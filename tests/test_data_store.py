@@ -0,0 +1,38 @@
+from api.data_store import DataStore
+
+def wealth(agent_id, day, wealth, strategy = 'momentum', is_market_maker = False):
+    return {'agent_id': agent_id, 'strategy': strategy, 'day': day, 'cash': 0.0,
+            'wealth': wealth, 'is_market_maker': is_market_maker}
+
+def test_wealth_rows_are_upserted_by_agent_and_day():
+    store = DataStore()
+    store.update_wealth([wealth(1, 0, 100.0), wealth(2, 0, 200.0), wealth(1, 1, 110.0)])
+    assert store.top_wealth(day = 0, n = 1) == [wealth(2, 0, 200.0)]
+
+    #The same day pushed again replaces rows, including their strategy index
+    store.update_wealth([wealth(1, 0, 300.0, strategy = 'value'), wealth(1, 0, 300.0, strategy = 'value')])
+    assert len(store.wealth_data) == 3
+    assert store.get_wealth(day_from = 0, day_to = 0) == [wealth(1, 0, 300.0, 'value'), wealth(2, 0, 200.0)]
+    assert store.get_wealth(strategy = 'momentum', day_to = 0) == [wealth(2, 0, 200.0)]
+    assert store.get_wealth(strategy = 'value') == [wealth(1, 0, 300.0, 'value')]
+    assert store.get_wealth(agent_id = 1) == [wealth(1, 0, 300.0, 'value'), wealth(1, 1, 110.0)]
+    #The cached top list of the updated day is rebuilt
+    assert store.top_wealth(day = 0, n = 1) == [wealth(1, 0, 300.0, 'value')]
+
+def bar(day, close, vwap, trades):
+    return {'day': day, 'open': close, 'high': close, 'low': close, 'close': close,
+            'volume': 10 * trades, 'vwap': vwap, 'trades': trades}
+
+def test_ohlc_and_sentiment_deduplicate_by_key():
+    store = DataStore()
+    store.update_ohlc({'AAA': [bar(1, 10.0, 10.2, 3), bar(0, 9.0, 9.1, 2)]})
+    store.update_ohlc({'AAA': [bar(1, 11.0, 10.8, 4)], 'BBB': [bar(0, 5.0, 5.0, 0)]})
+    assert store.get_ohlc('AAA') == {'AAA': [bar(0, 9.0, 9.1, 2), bar(1, 11.0, 10.8, 4)]}
+    assert store.get_ohlc(day_from = 1) == {'AAA': [bar(1, 11.0, 10.8, 4)], 'BBB': []}
+
+    rows = [{'day': 0, 'minute': m, 'stock': s, 'sentiment': 0.0} for m in range(3) for s in ('AAA', 'BBB')]
+    store.update_sentiment(rows)
+    store.update_sentiment([{'day': 0, 'minute': 1, 'stock': 'AAA', 'sentiment': 0.5}])
+    assert len(store.sentiment_data) == 6
+    assert [r['sentiment'] for r in store.get_sentiment(stock = 'AAA')] == [0.0, 0.5, 0.0]
+    assert len(store.get_sentiment(limit = 2, offset = 5)) == 1
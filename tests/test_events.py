@@ -0,0 +1,38 @@
+import numpy as np
+
+from modules.events import EventCalendar
+from modules.news import NewsGenerator
+
+def news_config():
+    return {
+        'news': {'mode': 'neutral'},
+        'stocks': [{'symbol': 'AAA'}, {'symbol': 'BBB'}],
+        'minutes_per_day': 10
+    }
+
+def test_breaking_events_apply_in_minute_order(tmp_path):
+    path = tmp_path / "events.csv"
+    #Later minute first: applied in file order, the minute 2 event would overwrite minutes 6+
+    path.write_text("kind,day,minute,stock,impact\n"
+                    "breaking,0,6,AAA,0.8\n"
+                    "breaking,0,2,AAA,-0.5\n"
+                    "breaking,0,2,BBB,0.3\n")
+    calendar = EventCalendar()
+    calendar.load(str(path))
+
+    assert [e['minute'] for e in calendar.on_day(0, 'breaking')] == [2, 2, 6]
+    news = NewsGenerator(1, config_override = news_config(), rng = np.random.default_rng(0), calendar = calendar)
+    series = news.day_sentiment(0)
+    assert series[:2, 0].tolist() == [0.0, 0.0]
+    assert series[2:6, 0].tolist() == [-0.5] * 4
+    assert series[6:, 0].tolist() == [0.8] * 4
+    assert series[2:, 1].tolist() == [0.3] * 8
+
+def test_same_minute_events_keep_file_order():
+    calendar = EventCalendar()
+    calendar.extend([
+        {'day': 1, 'minute': 3, 'stock': 'AAA', 'impact': 0.1},
+        {'day': 1, 'stock': 'AAA', 'impact': 0.2},
+        {'day': 1, 'minute': 3, 'stock': 'AAA', 'impact': 0.4}
+    ], 'breaking')
+    assert [e['impact'] for e in calendar.on_day(1, 'breaking')] == [0.2, 0.1, 0.4]
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from modules.agent_factory import Agent, distribute_initial_holdings
+from modules.agent_state import AgentStateStore
+from modules.agent_strategies import MomentumStrategy
+
+def population(cash):
+    stocks = [{'symbol': s} for s in ('AAA', 'BBB', 'CCC')]
+    agents = [Agent(i + 1, 'momentum', MomentumStrategy(), stocks, cash = c) for i, c in enumerate(cash)]
+    AgentStateStore.from_agents(agents, ['AAA', 'BBB', 'CCC'])
+    return agents
+
+def stock_config(floats, prices):
+    return [{'symbol': s, 'float': f, 'initial_price': p} for s, f, p in zip(('AAA', 'BBB', 'CCC'), floats, prices)]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_floats_are_allocated_exactly_within_budgets(seed):
+    rng = np.random.default_rng(seed)
+    cash = rng.choice([0.0, 0.7, 33.3, 1_000.0, 25_000.0], 400)
+    agents = population(cash)
+    store = agents[0]._store
+    stocks = stock_config([5_000, 20_000, 777], [9.99, 0.1, 101.3])
+
+    distribute_initial_holdings(agents, stocks, rng = rng)
+    assert store.holdings.sum(axis = 0).tolist() == [5_000, 20_000, 777]
+    assert np.all(store.cash >= 0)
+    spent = cash - store.cash
+    assert np.allclose(spent, store.holdings @ np.array([9.99, 0.1, 101.3]))
+    assert agents[0].portfolio['AAA'] == store.holdings[0, 0]
+
+def test_tight_budgets_are_filled_by_the_final_pass():
+    #Total capacity exceeds the float by one share, so the random passes cannot place it all
+    cash = np.full(50, 300.0)
+    agents = population(cash)
+    store = agents[0]._store
+    distribute_initial_holdings(agents, stock_config([149, 0, 0], [100.0, 1.0, 1.0]), rng = np.random.default_rng(0),
+                                max_passes = 1)
+    assert store.holdings[:, 0].sum() == 149
+    assert store.holdings[:, 0].max() == 3
+    assert np.all(store.cash >= 0)
+
+def test_unaffordable_float_is_rejected():
+    agents = population(np.full(10, 100.0))
+    with pytest.raises(ValueError, match = "cannot afford the float of AAA"):
+        distribute_initial_holdings(agents, stock_config([11, 0, 0], [100.0, 1.0, 1.0]))
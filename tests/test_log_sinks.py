@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from modules.log_sinks import expand_sentiment, run_starts
+
+def sentiment_frame(day, series, minutes, cols):
+    return pd.DataFrame({
+        'day': day,
+        'minute': minutes,
+        'stock': pd.Categorical.from_codes(cols, ['AAA', 'BBB']),
+        'sentiment': series[minutes, cols]
+    })
+
+def test_run_length_sentiment_expands_to_every_minute():
+    series = np.array([[0.1, 0.0], [0.1, 0.0], [0.4, 0.0], [0.4, -0.2], [0.1, -0.2]])
+    rle = pd.concat([sentiment_frame(day, series, *run_starts(series)) for day in (0, 1)], ignore_index = True)
+    assert len(rle) == 5 * 2
+
+    full_minutes, full_cols = np.divmod(np.arange(series.size), series.shape[1])
+    full = pd.concat([sentiment_frame(day, series, full_minutes, full_cols) for day in (0, 1)], ignore_index = True)
+    pd.testing.assert_frame_equal(expand_sentiment(rle, len(series)), full)
@@ -0,0 +1,52 @@
+import copy
+
+import numpy as np
+import pytest
+
+from modules.exchange import Exchange
+from modules.orders import ORDER_DTYPE, SIDE_BUY, SIDE_SELL
+from conftest import make_store
+
+def random_orders(rng, num_agents, num_symbols, count):
+    orders = np.zeros(count, dtype = ORDER_DTYPE)
+    orders['agent_id'] = rng.integers(1, num_agents + 1, count)
+    orders['symbol'] = rng.integers(0, num_symbols, count)
+    orders['side'] = rng.integers(0, 2, count)
+    orders['quantity'] = rng.integers(1, 30, count)
+    #Half market orders, half limits around the initial price
+    limits = np.round(100 + rng.normal(0, 2, count), 2)
+    orders['price'] = np.where(rng.random(count) < 0.5, np.nan, limits)
+    return orders
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_partitioned_matches_serial_with_tight_cash(stock_config, workers):
+    num_agents = 60
+    rng = np.random.default_rng(7)
+    store = make_store(num_agents, holdings = 20)
+    #Agents 1-30 can afford only a few shares and trade one pair of symbols
+    #each (AAA/BBB or CCC/DDD); the rest are rich and trade everything
+    poor = np.arange(1, num_agents + 1) <= 30
+    store.cash[:] = np.where(poor, rng.uniform(0, 3_000, num_agents), 1e7)
+
+    serial = Exchange(stock_config, rng = np.random.default_rng(1), minutes_per_day = 50)
+    partitioned = Exchange(stock_config, rng = np.random.default_rng(1), minutes_per_day = 50,
+                           matching = 'partitioned', match_workers = workers)
+    serial.attach_store(copy.deepcopy(store))
+    partitioned.attach_store(copy.deepcopy(store))
+
+    for minute in range(50):
+        orders = random_orders(rng, num_agents, len(stock_config), 80)
+        poor_orders = orders['agent_id'] <= 30
+        pair = 2 * (orders['agent_id'] % 2)
+        orders['symbol'] = np.where(poor_orders, pair + orders['symbol'] % 2, orders['symbol'])
+        for exchange in (serial, partitioned):
+            exchange.submit_orders(orders)
+            exchange.match_all()
+        assert np.array_equal(serial.trades.view(), partitioned.trades.view())
+        assert np.array_equal(serial.store.cash, partitioned.store.cash)
+        assert np.array_equal(serial.store.holdings, partitioned.store.holdings)
+        assert serial.prices == partitioned.prices
+    partitioned.close_match_pool()
+
+    assert len(serial.trades) > 0
+    assert (serial.store.cash >= 0).all()
@@ -0,0 +1,113 @@
+import numpy as np
+
+from modules.exchange import Exchange
+from modules.order_book import OrderBook
+from modules.orders import SIDE_BUY, SIDE_SELL, RestingOrder
+from modules.runner import run_simulation
+from conftest import make_store, small_config
+
+def make_exchange(stock_config, **kwargs):
+    exchange = Exchange(stock_config, transaction_cost_rate = 0.0, rng = np.random.default_rng(0), **kwargs)
+    exchange.attach_store(make_store(6))
+    return exchange
+
+def order(agent_id, side, quantity, price = None):
+    return {'agent_id': agent_id, 'type': side, 'quantity': quantity, 'price': price}
+
+def trades(exchange):
+    return exchange.trades.view()[['price', 'quantity', 'buyer_id', 'seller_id']].tolist()
+
+def resting(book):
+    return sorted((o.agent_id, o.side, o.quantity, o.price) for o in book.orders.values())
+
+def test_price_time_priority_and_partial_fills(stock_config):
+    exchange = make_exchange(stock_config)
+    exchange.submit_order('AAA', order(1, 'sell', 10, 101.0))
+    exchange.submit_order('AAA', order(2, 'sell', 10, 100.0))
+    exchange.submit_order('AAA', order(3, 'sell', 10, 100.0))
+
+    #Best price first, then the older order at that price; the rest stays on the book
+    exchange.submit_order('AAA', order(4, 'buy', 15))
+    assert trades(exchange) == [(100.0, 10, 4, 2), (100.0, 5, 4, 3)]
+    book = exchange.order_books['AAA']
+    assert resting(book) == [(1, SIDE_SELL, 10, 101.0), (3, SIDE_SELL, 5, 100.0)]
+
+    #A limit order fills up to its price and rests the remainder
+    exchange.submit_order('AAA', order(5, 'buy', 20, 101.0))
+    assert trades(exchange)[2:] == [(100.0, 5, 5, 3), (101.0, 10, 5, 1)]
+    assert resting(book) == [(5, SIDE_BUY, 5, 101.0)]
+
+    store = exchange.store
+    assert store.holdings[store.row_of[4], 0] == 115
+    assert store.cash[store.row_of[5]] == 10_000.0 - 5 * 100.0 - 10 * 101.0
+    assert store.holdings[store.row_of[1], 0] == 90
+
+def test_limit_orders_that_do_not_cross_rest(stock_config):
+    exchange = make_exchange(stock_config)
+    exchange.submit_order('AAA', order(1, 'sell', 10, 100.0))
+    exchange.submit_order('AAA', order(2, 'buy', 5, 99.5))
+    assert len(exchange.trades) == 0
+    book = exchange.order_books['AAA']
+    assert book.best(SIDE_BUY)[0] == 99.5
+    assert book.best(SIDE_SELL)[0] == 100.0
+
+def test_cancel_skips_the_order_lazily():
+    book = OrderBook('AAA')
+    book.add(1, RestingOrder(11, SIDE_SELL, 5, 100.0))
+    book.add(2, RestingOrder(12, SIDE_SELL, 5, 100.0))
+    book.add(3, RestingOrder(13, SIDE_SELL, 5, 101.0))
+
+    assert book.cancel(1)
+    assert not book.cancel(1)
+    price, level = book.best(SIDE_SELL)
+    assert (price, level[0]) == (100.0, 2)
+
+    #An emptied level gives way to the next price
+    book.cancel(2)
+    price, level = book.best(SIDE_SELL)
+    assert (price, level[0]) == (101.0, 3)
+    assert len(book) == 1
+    assert book.best(SIDE_BUY) is None
+
+def test_resting_orders_expire_after_ttl(stock_config):
+    exchange = make_exchange(stock_config, order_ttl = 2)
+    exchange.submit_order('AAA', order(1, 'sell', 10, 100.0))
+    book = exchange.order_books['AAA']
+
+    exchange.match_all()
+    assert len(book) == 1
+    exchange.match_all()
+    assert len(book) == 0
+
+def test_market_order_leftovers_last_one_minute(stock_config):
+    exchange = make_exchange(stock_config)
+    book = exchange.order_books['AAA']
+    reference = exchange.prices['AAA']
+    exchange.submit_order('AAA', order(1, 'buy', 10))
+    assert resting(book) == [(1, SIDE_BUY, 10, reference)]
+
+    #Later orders of the same minute can still meet it
+    exchange.submit_order('AAA', order(2, 'sell', 4))
+    assert trades(exchange) == [(reference, 4, 1, 2)]
+    exchange.match_all()
+    assert len(book) == 0
+    assert exchange.minute_orders == []
+
+def test_prices_keep_moving_over_a_multi_day_run(tmp_path):
+    sim = run_simulation(small_config(num_days = 3, minutes_per_day = 30), output_dir = str(tmp_path), api_url = None)
+    history = sim.exchange.price_history
+    assert len(history) == 90
+    for col in range(len(sim.exchange.symbols)):
+        prices = history.window(col)
+        #Every minute moves the price, traded or not, and later days are not frozen
+        assert np.all(np.diff(prices) != 0)
+        assert len(np.unique(prices[30:])) == 60
+
+def test_self_trade_prevention_cancels_the_resting_order(stock_config):
+    exchange = make_exchange(stock_config)
+    exchange.submit_order('AAA', order(1, 'sell', 10, 100.0))
+    exchange.submit_order('AAA', order(2, 'sell', 10, 101.0))
+
+    exchange.submit_order('AAA', order(1, 'buy', 5, 101.0))
+    assert trades(exchange) == [(101.0, 5, 1, 2)]
+    assert resting(exchange.order_books['AAA']) == [(2, SIDE_SELL, 5, 101.0)]
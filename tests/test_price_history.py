@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from modules.price_history import PriceHistory
+
+def filled(minutes, capacity = 8, track_early = False):
+    rng = np.random.default_rng(minutes)
+    history = PriceHistory(['AAA', 'BBB', 'CCC'], capacity = capacity)
+    rows = rng.uniform(10.0, 200.0, (minutes, 3))
+    for minute, row in enumerate(rows):
+        history.append(row)
+        if track_early and minute == 0:
+            history.ratio_mean(0, 1, 1)
+    return history, rows.T.tolist()
+
+@pytest.mark.parametrize('minutes', [3, 8, 9, 21, 64])
+def test_window_and_mean_match_a_plain_list(minutes):
+    history, prices = filled(minutes)
+    held = min(minutes, 8)
+    assert len(history) == held
+    for col in range(3):
+        assert history.window(col).tolist() == prices[col][-held:]
+        for n in range(1, held + 1):
+            assert history.window(col, n).tolist() == prices[col][-n:]
+            assert history.mean(col, n) == pytest.approx(np.mean(prices[col][-n:]))
+
+@pytest.mark.parametrize('track_early', [False, True])
+def test_ratio_mean_matches_a_plain_list(track_early):
+    #Pairs tracked from the start and pairs backfilled after wrapping agree
+    history, prices = filled(29, track_early = track_early)
+    for n in range(1, 9):
+        ratios = [a / b for a, b in zip(prices[0][-n:], prices[1][-n:])]
+        assert history.ratio_mean(0, 1, n) == pytest.approx(np.mean(ratios))
+
+def test_lookback_beyond_the_held_prices_is_rejected():
+    history, _ = filled(5)
+    with pytest.raises(ValueError, match = "exceeds the 5 prices held"):
+        history.mean(0, 6)
+    history, _ = filled(20)
+    with pytest.raises(ValueError):
+        history.window(0, 9)
+    assert not history.window(0).flags.writeable
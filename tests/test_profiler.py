@@ -0,0 +1,17 @@
+import modules.profiler as profiler_module
+from modules.profiler import PhaseProfiler
+
+def test_nested_phases_are_not_counted_twice(monkeypatch, tmp_path):
+    #One clock reading per phase entered or left
+    clock = iter([0.0, 1.0, 3.0, 3.5, 4.0, 4.5, 5.0, 7.0])
+    monkeypatch.setattr(profiler_module.time, 'perf_counter', lambda: next(clock))
+    profiler = PhaseProfiler(output_dir = str(tmp_path))
+    with profiler.phase('log'):
+        with profiler.phase('persist'):
+            with profiler.phase('persist'):
+                pass
+    with profiler.phase('log'):
+        pass
+    #log: 0-1, 4-4.5 and 5-7; persist: 1-4
+    assert dict(profiler.totals) == {'log': 3.5, 'persist': 3.0}
+    assert profiler.active == []
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from modules.publisher import DeltaPublisher
+
+@pytest.fixture
+def api():
+    '''Local endpoint that answers 503 to its first `failures` posts and records the rest.'''
+    state = {'failures': 0, 'posts': 0, 'received': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            state['posts'] += 1
+            status = 503 if state['posts'] <= state['failures'] else 200
+            if status == 200:
+                state['received'].append((self.path, json.loads(body)))
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    state['url'] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+
+def test_failed_posts_keep_their_place(api, tmp_path):
+    api['failures'] = 7
+    stale = tmp_path / "00000000.spill"
+    stale.write_bytes(b"left by an earlier run")
+
+    publisher = DeltaPublisher(api['url'], queue_size = 2, spill_dir = str(tmp_path), batch_size = 3,
+                               compress_min_bytes = None, retries = 2, backoff = 0.01, backoff_max = 0.05)
+    assert not stale.exists()
+    for day in range(20):
+        publisher.publish('/update/wealth', [day])
+        publisher.publish('/update/ohlc', {'AAA': [day]})
+    publisher.close(timeout = 30)
+
+    wealth = [day for path, body in api['received'] if path == '/update/wealth' for day in body]
+    ohlc = [day for path, body in api['received'] if path == '/update/ohlc' for day in body['AAA']]
+    assert wealth == list(range(20))
+    assert ohlc == list(range(20))
+    assert os.listdir(tmp_path) == []
+
+def test_spill_files_hold_json_or_arrow(tmp_path):
+    publisher = DeltaPublisher("http://127.0.0.1:9", spill_dir = str(tmp_path))
+    for payload in ({'columns': {'day': [0, 1]}}, b"ARROW"):
+        path = publisher._spill('/update/wealth', payload)
+        header, body = open(path, 'rb').read().split(b"\n", 1)
+        assert json.loads(header) == {'endpoint': '/update/wealth',
+                                      'kind': 'arrow' if isinstance(payload, bytes) else 'json'}
+        assert publisher._load(path) == ('/update/wealth', payload)
+        assert not os.path.exists(path)
+    publisher.close()
+
+def test_requeued_updates_stay_within_the_memory_bound(api, tmp_path):
+    api['failures'] = 3
+    publisher = DeltaPublisher(api['url'], queue_size = 2, spill_dir = str(tmp_path), batch_size = 4,
+                               compress_min_bytes = None, retries = 0, backoff_max = 0.1)
+    #Distinct endpoints, so no two updates are merged into one post
+    for i in range(6):
+        publisher.publish(f"/update/e{i}", [i])
+
+    #Failed batches go back with spilled entries spilled again
+    while len(api['received']) < 6:
+        with publisher.ready:
+            held = sum(not isinstance(entry, str) for entry in publisher.backlog)
+            assert held <= publisher.in_memory <= 2
+        time.sleep(0.001)
+    publisher.close(timeout = 5)
+
+    assert api['posts'] == 9
+    assert [body for _, body in api['received']] == [[i] for i in range(6)]
+    assert publisher.in_memory == 0
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.scheduler import AgentScheduler
+
+def agents(counts):
+    types = [strategy for strategy, n in counts.items() for _ in range(n)]
+    return [SimpleNamespace(agent_id = i, strategy_type = strategy) for i, strategy in enumerate(types)]
+
+def test_pool_draws_the_activation_rate_of_all_agents():
+    population = agents({'noise': 85, 'momentum': 10, 'hft': 5})
+    scheduler = AgentScheduler(population, rng = np.random.default_rng(0), activation_rate = 0.1)
+    scheduler.plan_day(20)
+    for minute in range(20):
+        active = scheduler.active_agents(minute)
+        types = [agent.strategy_type for agent in active]
+        #int(0.1 * 100) drawn from the 95 non-HFT agents, then every HFT
+        assert len(active) == 10 + 5
+        assert types[-5:] == ['hft'] * 5 and 'hft' not in types[:-5]
+        assert len({agent.agent_id for agent in active}) == len(active)
+
+def test_own_rates_apply_to_their_strategy():
+    population = agents({'noise': 50, 'momentum': 50})
+    scheduler = AgentScheduler(population, rng = np.random.default_rng(0), activation_rate = 0.1,
+                               strategy_rates = {'momentum': 0.5})
+    scheduler.plan_day(5)
+    for minute in range(5):
+        types = [agent.strategy_type for agent in scheduler.active_agents(minute)]
+        assert types.count('momentum') == 25
+        assert types.count('noise') == 10
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.runner import run_simulation
+from conftest import small_config
+
+def sharded_run(output_dir):
+    config = small_config(num_agents = 120, num_days = 2, minutes_per_day = 10)
+    config['sharding'] = {'shards': 2}
+    return run_simulation(config, output_dir = str(output_dir), api_url = None)
+
+def test_sharded_run_is_deterministic(tmp_path):
+    first, second = sharded_run(tmp_path / "a"), sharded_run(tmp_path / "b")
+    assert np.array_equal(first.store.agent_ids, second.store.agent_ids)
+    assert np.array_equal(first.store.cash, second.store.cash)
+    assert np.array_equal(first.store.holdings, second.store.holdings)
+    assert first.exchange.prices == second.exchange.prices
+
+    trades = pd.read_csv(tmp_path / "a" / "trade_log.csv")
+    assert len(trades) > 0
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "b" / "trade_log.csv"), trades)
+
+def test_sharded_runs_cannot_be_checkpointed(tmp_path):
+    config = small_config()
+    config['sharding'] = {'shards': 2}
+    config['checkpoint'] = {'every_days': 1}
+    with pytest.raises(ValueError, match = "Sharded runs cannot be checkpointed"):
+        run_simulation(config, output_dir = str(tmp_path), api_url = None)
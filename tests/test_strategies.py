@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from modules.agent_factory import MARKET_MAKER_ID, Agent
+from modules.agent_state import AgentStateStore
+from modules.agent_strategies import (
+    TRADE_FRACTION, ContrarianStrategy, MarketMakerAgent, MomentumStrategy, NoiseStrategy, RiskAverseStrategy
+)
+from modules.orders import SIDE_BUY, OrderBuffer
+from modules.simulation import collect_orders
+from conftest import SYMBOLS
+
+STOCKS = [{'symbol': s} for s in SYMBOLS]
+NAMES = {MomentumStrategy: 'momentum', ContrarianStrategy: 'contrarian', RiskAverseStrategy: 'risk_averse',
+         NoiseStrategy: 'noise'}
+
+def population(strategy_cls, num_agents, rng):
+    '''Agents of one strategy bound to a store, with varied cash and holdings (some zero).'''
+    agents = [Agent(i + 1, NAMES[strategy_cls], strategy_cls(), STOCKS) for i in range(num_agents)]
+    store = AgentStateStore.from_agents(agents, SYMBOLS)
+    store.cash[:] = rng.choice([0.0, 50.0, 1_000.0, 250_000.0], num_agents)
+    store.holdings[:] = rng.choice([0, 5, 9, 10, 400], (num_agents, len(SYMBOLS)))
+    return agents, store
+
+def observation(sentiment):
+    prices = dict(zip(SYMBOLS, [100.0, 37.5, 250.0, 999.0]))
+    return {
+        'prices': prices,
+        'price_vector': np.array(list(prices.values())),
+        'sentiment': dict(zip(SYMBOLS, sentiment)),
+        'sentiment_vector': np.array(sentiment)
+    }
+
+def per_agent(agents, market_obs):
+    orders = OrderBuffer()
+    for agent in agents:
+        agent.decide_action(market_obs, orders)
+    return orders.view()
+
+def batched(strategy_cls, store, market_obs, rng = None):
+    rows = np.arange(len(store))
+    out_rows, symbols, sides, qtys = strategy_cls.decide_batch(market_obs, rows, store.cash[rows],
+                                                               store.holdings[rows], rng = rng)
+    return store.agent_ids[out_rows], symbols, sides, qtys
+
+@pytest.mark.parametrize('strategy_cls', [MomentumStrategy, ContrarianStrategy, RiskAverseStrategy])
+@pytest.mark.parametrize('sentiment', [(0.5, 0.15, -0.15, -0.5), (0.1, -0.1, 0.2, -0.2), (0.0, 0.0, 0.0, 0.0)])
+def test_decide_batch_matches_decide(strategy_cls, sentiment):
+    agents, store = population(strategy_cls, 200, np.random.default_rng(3))
+    market_obs = observation(sentiment)
+
+    expected = per_agent(agents, market_obs)
+    agent_ids, symbols, sides, qtys = batched(strategy_cls, store, market_obs)
+    assert agent_ids.tolist() == expected['agent_id'].tolist()
+    assert symbols.tolist() == expected['symbol'].tolist()
+    assert sides.tolist() == expected['side'].tolist()
+    assert qtys.tolist() == expected['quantity'].tolist()
+
+def test_noise_batch_follows_the_per_agent_rule():
+    #Noise draws differ between paths; every order must still be one `decide` could make
+    agents, store = population(NoiseStrategy, 300, np.random.default_rng(4))
+    market_obs = observation((0.0, 0.0, 0.0, 0.0))
+    agent_ids, symbols, sides, qtys = batched(NoiseStrategy, store, market_obs, rng = np.random.default_rng(5))
+
+    rows = np.array([store.row_of[a] for a in agent_ids.tolist()])
+    buy_qty = (store.cash[rows] * TRADE_FRACTION // market_obs['price_vector'][symbols]).astype(np.int64)
+    sell_qty = (store.holdings[rows, symbols] * TRADE_FRACTION).astype(np.int64)
+    assert np.array_equal(qtys, np.where(sides == SIDE_BUY, buy_qty, sell_qty))
+    assert np.all(qtys > 0)
+    #Agent-major, symbol-minor like the per-agent loop
+    assert np.all(np.diff(rows * len(SYMBOLS) + symbols) > 0)
+    #Roughly 20% of (agent, symbol) pairs act, half of them buying
+    assert 0.05 < len(qtys) / store.holdings.size < 0.2
+
+def test_collect_orders_keeps_activation_order():
+    rng = np.random.default_rng(6)
+    strategies = [MomentumStrategy, ContrarianStrategy, RiskAverseStrategy]
+    agents = [Agent(i + 1, NAMES[strategies[i % 3]], strategies[i % 3](), STOCKS) for i in range(60)]
+    agents.append(MarketMakerAgent(MARKET_MAKER_ID, STOCKS, cash = 1e6, inventory = 100))
+    store = AgentStateStore.from_agents(agents, SYMBOLS)
+    store.cash[:60] = rng.uniform(0, 100_000, 60)
+    store.holdings[:60] = rng.integers(0, 50, (60, len(SYMBOLS)))
+    market_obs = observation((0.5, -0.5, 0.25, -0.05))
+
+    #A random activation order mixing the three batched strategies and the per-agent market maker
+    active = [agents[i] for i in rng.permutation(len(agents))]
+    orders = collect_orders(active, market_obs, store, OrderBuffer())
+    assert len(orders) > 0
+    assert orders.tobytes() == per_agent(active, market_obs).tobytes()
@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+import pytest
+import yaml
+
+from modules.sweep import build_runs, run_all, run_sweep
+from conftest import small_config
+
+BASE = {'seed': 1, 'transaction_cost': {'rate': 0.0005}, 'news': {'mode': 'random'}}
+
+def test_grid_expands_every_combination_per_replication():
+    spec = {'output_dir': "out", 'seed': 7, 'replications': 2,
+            'parameters': {'transaction_cost.rate': [0.001, 0.002], 'news.mode': ['neutral', 'random', 'scripted']}}
+    runs = build_runs(spec, BASE)
+
+    assert len(runs) == 2 * 3 * 2
+    combos = [(run['params']['transaction_cost.rate'], run['params']['news.mode'], run['replication']) for run in runs]
+    assert sorted(combos) == sorted((r, m, rep) for r in (0.001, 0.002) for m in ('neutral', 'random', 'scripted')
+                                    for rep in (0, 1))
+    for run in runs:
+        assert run['config']['transaction_cost']['rate'] == run['params']['transaction_cost.rate']
+        assert run['config']['news']['mode'] == run['params']['news.mode']
+    assert BASE['transaction_cost']['rate'] == 0.0005
+
+def test_runs_get_distinct_seeds_and_output_dirs():
+    spec = {'output_dir': "out", 'seed': 7, 'replications': 3, 'parameters': {'transaction_cost.rate': [0.001, 0.002]}}
+    runs = build_runs(spec, BASE)
+    assert len({run['seed'] for run in runs}) == len(runs)
+    assert len({run['output_dir'] for run in runs}) == len(runs)
+    assert all(os.path.dirname(run['output_dir']) == "out" for run in runs)
+    #A sweep seed fixes every run's seed
+    assert [run['seed'] for run in build_runs(spec, BASE)] == [run['seed'] for run in runs]
+    assert [run['seed'] for run in build_runs(dict(spec, seed = 8), BASE)] != [run['seed'] for run in runs]
+
+def test_random_mode_samples_within_the_spec():
+    spec = {'mode': 'random', 'runs': 20, 'seed': 3,
+            'parameters': {'transaction_cost.rate': {'low': 0.001, 'high': 0.002}, 'news.mode': ['neutral', 'random']}}
+    runs = build_runs(spec, BASE)
+    assert len(runs) == 20
+    rates = [run['params']['transaction_cost.rate'] for run in runs]
+    assert all(0.001 <= rate <= 0.002 for rate in rates)
+    assert len(set(rates)) == 20
+    assert {run['params']['news.mode'] for run in runs} == {'neutral', 'random'}
+    assert [run['params'] for run in build_runs(spec, BASE)] == [run['params'] for run in runs]
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match = "Unknown sweep mode"):
+        build_runs({'mode': 'latin'}, BASE)
+
+def test_run_all_rejects_an_empty_sweep(tmp_path):
+    with pytest.raises(ValueError, match = "no runs"):
+        run_all([], str(tmp_path))
+
+def test_run_sweep_merges_run_summaries(tmp_path):
+    base_config = tmp_path / "config.yml"
+    with open(base_config, 'w') as f:
+        yaml.safe_dump(small_config(num_agents = 200, num_days = 2, minutes_per_day = 10), f)
+    spec = {'base_config': str(base_config), 'output_dir': str(tmp_path / "sweep"), 'seed': 5,
+            'parameters': {'transaction_cost.rate': [0.0005, 0.002]}}
+
+    summary = run_sweep(spec, workers = 2)
+    merged = pd.read_csv(tmp_path / "sweep" / "summary.csv")
+    assert len(merged) == len(summary)
+    assert sorted(merged['run_id'].unique()) == ['run_0000', 'run_0001']
+    assert sorted(merged['transaction_cost.rate'].unique()) == [0.0005, 0.002]
+    assert {'strategy', 'mean', 'std', 'min', 'max', 'seed', 'replication'} <= set(merged.columns)
+    for run_id, rows in merged.groupby('run_id'):
+        assert rows['seed'].nunique() == 1
+        assert 'market_maker' in set(rows['strategy'])
+        assert (tmp_path / "sweep" / run_id / "run.log").exists()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from modules import wire
+from modules.orders import ORDER_DTYPE, TRADE_DTYPE
+
+def test_pack_unpack_round_trip():
+    fills = np.zeros(3, dtype = TRADE_DTYPE)
+    fills['symbol'] = [0, 2, 1]
+    fills['price'] = [100.5, 99.25, 101.0]
+    fills['quantity'] = [5, 1, 7]
+    fills['buyer_id'] = [1, 2, 3]
+    fills['seller_id'] = [4, 5, 6]
+    arrays = (np.array([100.5, 99.0]), np.array([0.1, -0.3]), np.arange(4, dtype = np.int64),
+              np.array([10.0, 20.0, 30.0, 40.0]), fills)
+
+    kind, header, decoded = wire.unpack(wire.pack(wire.MINUTE, (3, 17, 42), *arrays))
+    assert (kind, header) == (wire.MINUTE, (3, 17, 42))
+    for sent, received in zip(arrays, decoded):
+        assert received.dtype == sent.dtype
+        assert np.array_equal(received, sent)
+
+    orders = np.zeros(2, dtype = ORDER_DTYPE)
+    orders['agent_id'] = [7, 8]
+    orders['price'] = [np.nan, 99.5]
+    kind, header, (received,) = wire.unpack(wire.pack(wire.ORDERS, (), orders))
+    assert (kind, header) == (wire.ORDERS, ())
+    assert received.tobytes() == orders.tobytes()
+
+    #Empty arrays and header-only messages
+    kind, header, (codes,) = wire.unpack(wire.pack(wire.DAY_DONE, (), np.array([], dtype = np.int16)))
+    assert kind == wire.DAY_DONE and len(codes) == 0
+    assert wire.unpack(wire.pack(wire.STOP)) == (wire.STOP, (), [])
+
+def test_pack_checks_the_array_count():
+    with pytest.raises(ValueError):
+        wire.pack(wire.ORDERS, ())